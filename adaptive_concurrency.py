@@ -0,0 +1,130 @@
+import time
+import threading
+import collections
+
+from pipeline_metrics import get_metrics
+
+# --- AIMD Settings ---
+# Operations allowed in flight on an endpoint when a run starts
+AIMD_INITIAL_LIMIT = 2
+
+# The limit never drops below this
+AIMD_MIN_LIMIT = 1
+
+# Added to the limit after every full round of successful submissions (one
+# per operation allowed in flight), while the limit is actually used
+AIMD_INCREASE = 1
+
+# The limit is multiplied by this on a quota or 429 error
+AIMD_DECREASE_FACTOR = 0.5
+
+# Errors within this many seconds of a cut belong to the same burst and do
+# not cut the limit again
+AIMD_DECREASE_COOLDOWN_SECONDS = 30
+
+# Limit changes kept in memory per endpoint (every change is also logged)
+AIMD_HISTORY_LENGTH = 1000
+
+
+def starting_limit(maximum: int, adaptive: bool = True):
+    """Operations an endpoint with ceiling ``maximum`` may run when a run starts (module settings)."""
+    if not adaptive:
+        return maximum
+    return min(maximum, max(min(maximum, AIMD_MIN_LIMIT), AIMD_INITIAL_LIMIT))
+
+
+class AimdLimit:
+    """
+    Additive-increase / multiplicative-decrease limit on operations in flight.
+
+    Every successful submission made while the limit is fully used raises
+    it by ``increase / limit``, so it grows by ``increase`` per round of
+    submissions; a quota error cuts it to ``decrease_factor`` times the
+    operations in flight (at most once per cool-down). The limit stays
+    between ``minimum`` and ``maximum``.
+
+    Every change of the whole-number limit is kept in ``history`` and written
+    to the metrics log as a "concurrency_limit" event.
+    """
+
+    def __init__(self, name: str, maximum: int, initial: int = None, minimum: int = None,
+                 increase: float = None, decrease_factor: float = None, cooldown_seconds: float = None,
+                 adaptive: bool = True):
+        # Defaults to the module settings at construction time
+        self.name = name
+        self.maximum = maximum
+        self.minimum = min(maximum, AIMD_MIN_LIMIT if minimum is None else minimum)
+        self.increase_step = AIMD_INCREASE if increase is None else increase
+        self.decrease_factor = AIMD_DECREASE_FACTOR if decrease_factor is None else decrease_factor
+        self.cooldown_seconds = AIMD_DECREASE_COOLDOWN_SECONDS if cooldown_seconds is None else cooldown_seconds
+        self.adaptive = adaptive
+        if not adaptive:
+            initial = maximum
+        elif initial is None:
+            initial = AIMD_INITIAL_LIMIT
+        self._limit = float(min(maximum, max(self.minimum, initial)))
+        self._last_decrease = None
+        self.increases = 0
+        self.decreases = 0
+        self.history = collections.deque(maxlen=AIMD_HISTORY_LENGTH)
+        self._lock = threading.Lock()
+        self._record("start")
+
+    @property
+    def limit(self):
+        """Operations currently allowed in flight."""
+        return int(self._limit)
+
+    def _record(self, reason: str, previous: int = None):
+        self.history.append((time.time(), self.limit, reason))
+        get_metrics().event("concurrency_limit", endpoint=self.name, limit=self.limit,
+                            previous=previous, reason=reason)
+
+    def _set(self, value: float, reason: str):
+        previous = self.limit
+        self._limit = min(self.maximum, max(self.minimum, value))
+        if self.limit != previous:
+            self._record(reason, previous)
+            return True
+        return False
+
+    def increase(self, in_flight: int):
+        """
+        Record a successful submission made with ``in_flight`` operations running.
+
+        Returns:
+            bool: True if the whole-number limit went up.
+        """
+        with self._lock:
+            # A limit that is not used says nothing about whether more would fit
+            if not self.adaptive or in_flight < self.limit:
+                return False
+            raised = self._set(self._limit + self.increase_step / max(1.0, self._limit), "success")
+            if raised:
+                self.increases += 1
+            return raised
+
+    def decrease(self, in_flight: int):
+        """
+        Record a quota error hit with ``in_flight`` operations running.
+
+        Returns:
+            bool: True if the limit was cut.
+        """
+        with self._lock:
+            now = time.monotonic()
+            if not self.adaptive or (self._last_decrease is not None
+                                     and now - self._last_decrease < self.cooldown_seconds):
+                return False
+            self._last_decrease = now
+            cut = self._set(min(self._limit, max(1, in_flight)) * self.decrease_factor, "quota error")
+            if cut:
+                self.decreases += 1
+            return cut
+
+    def describe_history(self, last: int = 20):
+        """Return the last limits taken, e.g. "2 → 3 → 5 → 2 → 3"."""
+        limits = [str(limit) for _, limit, _ in self.history]
+        if len(limits) > last:
+            limits = ["…"] + limits[-last:]
+        return " → ".join(limits)
@@ -0,0 +1,193 @@
+import os
+import re
+import tempfile
+import collections
+import concurrent.futures
+from dataclasses import dataclass, field
+
+from output_catalog import resolve_book_shards, shard_index
+from shard_text import PageTextWriter, ShardText
+
+# Assembled books live next to the outputs:
+# {output_prefix}_text/{book}.txt and {output_prefix}_text/{book}.pages.jsonl
+TEXT_DIRECTORY = "_text/"
+
+# Shards downloaded and parsed at the same time (per book)
+ASSEMBLY_WORKERS = 16
+
+# Parsed shards allowed to wait for the writer, per worker; each one holds a
+# spooled temporary file, so this bounds local disk use on large books
+ASSEMBLY_LOOKAHEAD_PER_WORKER = 2
+
+# Books assembled at the same time by assemble_books
+BOOK_ASSEMBLY_WORKERS = 4
+
+_FLATTENED_FILE_PATTERN = r"_file(\d+)_"
+
+
+@dataclass
+class BookShards:
+    """The shards of one source file (or one part of it), in shard order."""
+    file_index: int
+    page_offset: int = 0
+    shard_names: list = field(default_factory=list)
+
+
+def book_text_object_names(output_prefix: str, english_book_name: str):
+    """Return the object names of a book's text and page table."""
+    base = f"{output_prefix}{TEXT_DIRECTORY}{english_book_name}"
+    return f"{base}.txt", f"{base}.pages.jsonl"
+
+
+def _object_name(bucket_name: str, uri: str):
+    return uri[len(f"gs://{bucket_name}/"):]
+
+
+# --- Resolving Shards ---
+def catalogued_book_shards(bucket, output_prefix: str, english_book_name: str):
+    """
+    Return a book's shards in reading order from its catalog.
+
+    Parts of split files keep their own page numbering, so each part carries
+    the page offset its page numbers are shifted by.
+
+    Returns:
+        list: BookShards ordered by file number, then page.
+    """
+    return [
+        BookShards(file_index, (page_start or 1) - 1, [_object_name(bucket.name, uri) for uri in shard_uris])
+        for file_index, page_start, _, shard_uris in resolve_book_shards(bucket, output_prefix, english_book_name)
+    ]
+
+
+def flattened_book_shards(bucket, output_prefix: str, english_book_name: str):
+    """
+    Return a book's shards in reading order from their flattened names
+    ({book}_file{NNN}_{stem}-{shard}.json); files without a number go last.
+
+    Returns:
+        list: BookShards ordered by file number, then shard index.
+    """
+    pattern = re.compile(re.escape(english_book_name) + _FLATTENED_FILE_PATTERN)
+    files = collections.defaultdict(list)
+    book_prefix = f"{output_prefix}{english_book_name}_"
+    for blob in bucket.list_blobs(prefix=book_prefix):
+        name = blob.name
+        if '/' in name[len(output_prefix):] or not name.endswith('.json'):
+            continue
+        match = pattern.match(name[len(output_prefix):])
+        files[int(match.group(1)) if match else None].append(name)
+
+    ordered = sorted(files, key=lambda file_index: (file_index is None, file_index or 0))
+    return [
+        BookShards(file_index, 0, sorted(files[file_index], key=lambda name: (shard_index(name), name)))
+        for file_index in ordered
+    ]
+
+
+# --- Assembling ---
+def _parse_shard(bucket, name: str):
+    # The download is parsed as it streams in; only the spool touches disk
+    with bucket.blob(name).open("rb") as stream:
+        shard = ShardText(stream)
+    shard.pages.sort(key=lambda page: page.page_number)
+    return shard
+
+
+def assemble_book_text(bucket, output_prefix: str, english_book_name: str, layout: str = "catalog",
+                       max_workers: int = ASSEMBLY_WORKERS, local_dir: str = None):
+    """
+    Write one continuous text of a book, in reading order, and its page table.
+
+    Shards are downloaded and parsed concurrently (at most
+    ``max_workers * ASSEMBLY_LOOKAHEAD_PER_WORKER`` ahead of the writer) and
+    written strictly in order: source file number, shard index, page. Pages
+    are separated by form feeds; the page table has one JSON line per page
+    with its file number, page number and byte/character offsets (see
+    shard_text.PageTextWriter).
+
+    Args:
+        bucket: Output bucket.
+        output_prefix (str): Base output prefix.
+        english_book_name (str): English name of the book.
+        layout (str): "catalog" or "flatten", the layout the outputs are in.
+        max_workers (int): Shards downloaded and parsed at the same time.
+        local_dir (str): Keep the assembled files in this directory as well;
+                         by default they are only uploaded.
+
+    Returns:
+        dict: "text_uri", "pages_uri", "files", "shards" and "pages", or
+              None if the book has no outputs.
+    """
+    if layout == "catalog":
+        book_shards = catalogued_book_shards(bucket, output_prefix, english_book_name)
+    else:
+        book_shards = flattened_book_shards(bucket, output_prefix, english_book_name)
+    work = [(part, name) for part in book_shards for name in part.shard_names]
+    if not work:
+        return None
+
+    text_name, pages_name = book_text_object_names(output_prefix, english_book_name)
+    with tempfile.TemporaryDirectory() as work_dir:
+        directory = local_dir or work_dir
+        os.makedirs(directory, exist_ok=True)
+        text_path = os.path.join(directory, f"{english_book_name}.txt")
+        pages_path = os.path.join(directory, f"{english_book_name}.pages.jsonl")
+
+        with open(text_path, "wb") as text_file, open(pages_path, "wb") as pages_file, \
+                concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as pool:
+            writer = PageTextWriter(text_file, pages_file)
+            lookahead = max(1, max_workers * ASSEMBLY_LOOKAHEAD_PER_WORKER)
+            pending = collections.deque()
+            next_item = 0
+            try:
+                while pending or next_item < len(work):
+                    while next_item < len(work) and len(pending) < lookahead:
+                        part, name = work[next_item]
+                        pending.append((part, pool.submit(_parse_shard, bucket, name)))
+                        next_item += 1
+                    part, future = pending.popleft()
+                    with future.result() as shard:
+                        writer.write_shard(shard, part.page_offset, fields={"file": part.file_index})
+            finally:
+                # Close the spools of shards parsed ahead of a failure
+                for _, future in pending:
+                    future.cancel()
+                    if not future.cancelled() and future.exception() is None:
+                        future.result().close()
+
+        bucket.blob(text_name).upload_from_filename(text_path, content_type="text/plain; charset=utf-8")
+        bucket.blob(pages_name).upload_from_filename(pages_path, content_type="application/x-ndjson")
+
+    return {
+        "text_uri": f"gs://{bucket.name}/{text_name}",
+        "pages_uri": f"gs://{bucket.name}/{pages_name}",
+        "files": len(book_shards),
+        "shards": len(work),
+        "pages": writer.pages_written,
+    }
+
+
+def assemble_books(bucket, output_prefix: str, english_book_names, layout: str = "catalog",
+                   book_workers: int = BOOK_ASSEMBLY_WORKERS, max_workers: int = ASSEMBLY_WORKERS,
+                   local_dir: str = None):
+    """
+    Assemble several books at the same time (see assemble_book_text).
+
+    Returns:
+        tuple: (book name -> result dict or None, [(book name, exception)] failures)
+    """
+    results = {}
+    failures = []
+    with concurrent.futures.ThreadPoolExecutor(max_workers=book_workers) as pool:
+        futures = {
+            pool.submit(assemble_book_text, bucket, output_prefix, name, layout, max_workers, local_dir): name
+            for name in english_book_names
+        }
+        for future in concurrent.futures.as_completed(futures):
+            name = futures[future]
+            try:
+                results[name] = future.result()
+            except Exception as e:
+                failures.append((name, e))
+    return results, failures
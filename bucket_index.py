@@ -0,0 +1,152 @@
+import os
+import json
+import time
+import threading
+import unicodedata
+
+# Local cache of the directory prefixes found in a bucket
+BUCKET_INDEX_CACHE_PATH = ".bucket_index_cache.json"
+
+# Cached prefixes older than this are listed again (seconds). The directories
+# under a prefix are always listed afresh (see BucketIndex.subdirectories);
+# the cache only spares the walk down to that prefix.
+BUCKET_INDEX_MAX_AGE = 6 * 60 * 60
+
+
+def normalize_name(name: str):
+    """
+    Normalize an object name to NFC.
+
+    Files uploaded from macOS arrive with decomposed (NFD) Hangul, while names
+    typed in this script are composed (NFC). Comparing NFC forms makes both match.
+    """
+    return unicodedata.normalize('NFC', name)
+
+
+class BucketIndex:
+    """
+    NFC-normalized index of the directory prefixes in a GCS bucket.
+
+    Directories are discovered with delimiter='/' listings, one level at a
+    time, instead of walking every object in the bucket. The index maps the
+    NFC form of each prefix to the prefix actually stored in GCS and is
+    cached locally. Adding objects does not change anything a cache could
+    be checked against (the bucket metageneration only follows bucket
+    metadata), so subdirectories() always lists its own level again; only
+    the prefixes above it come from the cache.
+
+    Usage:
+        index = BucketIndex(storage_client, "theologpt")
+        books = index.subdirectories("주석/")
+    """
+
+    def __init__(self, storage_client, bucket_name: str,
+                 cache_path: str = BUCKET_INDEX_CACHE_PATH, max_age: float = BUCKET_INDEX_MAX_AGE):
+        self.client = storage_client
+        self.bucket_name = bucket_name
+        self.cache_path = cache_path
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        # NFC prefix -> {"actual": str, "subdirs": [actual prefixes]}
+        self._prefixes = {}
+        self._load_cache()
+
+    # --- Cache ---
+    def _load_cache(self):
+        if not self.cache_path or not os.path.exists(self.cache_path):
+            return
+        try:
+            with open(self.cache_path, 'r', encoding='utf-8') as f:
+                cache = json.load(f).get(self.bucket_name)
+        except (OSError, ValueError):
+            return
+        if not cache or time.time() - cache.get("created_at", 0) > self.max_age:
+            return
+        self._prefixes = cache.get("prefixes", {})
+
+    def save(self):
+        """Write the index to the local cache file."""
+        if not self.cache_path:
+            return
+        with self._lock:
+            entry = {
+                "created_at": time.time(),
+                "prefixes": dict(self._prefixes),
+            }
+        cache = {}
+        if os.path.exists(self.cache_path):
+            try:
+                with open(self.cache_path, 'r', encoding='utf-8') as f:
+                    cache = json.load(f)
+            except (OSError, ValueError):
+                cache = {}
+        cache[self.bucket_name] = entry
+        temp_path = f"{self.cache_path}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(cache, f, ensure_ascii=False)
+        os.replace(temp_path, self.cache_path)
+
+    def invalidate(self):
+        """Forget every cached listing."""
+        with self._lock:
+            self._prefixes = {}
+
+    # --- Listing ---
+    def _list_level(self, actual_prefix: str):
+        """List the direct subdirectories under one prefix."""
+        iterator = self.client.list_blobs(self.bucket_name, prefix=actual_prefix, delimiter='/')
+        # Prefixes are only populated once every page has been consumed
+        for _ in iterator:
+            pass
+        subdirs = sorted(iterator.prefixes)
+        with self._lock:
+            self._prefixes[normalize_name(actual_prefix)] = {
+                "actual": actual_prefix,
+                "subdirs": subdirs,
+            }
+        return subdirs
+
+    def _entry(self, actual_prefix: str):
+        entry = self._prefixes.get(normalize_name(actual_prefix))
+        if entry is None:
+            self._list_level(actual_prefix)
+            entry = self._prefixes[normalize_name(actual_prefix)]
+        return entry
+
+    def resolve_prefix(self, prefix: str):
+        """
+        Find the prefix actually stored in the bucket for a (possibly NFC) prefix.
+
+        Walks the path one directory at a time, matching NFC forms.
+
+        Returns:
+            str: The stored prefix, or None if no such directory exists.
+        """
+        if not prefix:
+            return ""
+        actual = ""
+        for segment in prefix.strip('/').split('/'):
+            wanted = normalize_name(f"{actual}{segment}/")
+            matches = [p for p in self._entry(actual)["subdirs"] if normalize_name(p) == wanted]
+            if not matches:
+                return None
+            actual = matches[0]
+        return actual
+
+    def subdirectories(self, prefix: str):
+        """
+        Return the stored prefixes of the directories directly under ``prefix``.
+
+        The level under ``prefix`` is always listed again (one delimiter
+        listing), so directories uploaded since the cache was written show up.
+
+        Args:
+            prefix (str): Directory prefix in any Unicode normalization form.
+
+        Returns:
+            list: Actual subdirectory prefixes, sorted.
+        """
+        actual = self.resolve_prefix(prefix)
+        if actual is None:
+            return []
+        return self._list_level(actual)
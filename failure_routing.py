@@ -0,0 +1,152 @@
+import re
+
+# --- Failure Classes ---
+# retryable: transient server-side or quota problems; resubmit the file
+# oversize:  the file is over a processor limit; split it into parts
+# permanent: the file can never succeed as it is; dead-letter it
+FAILURE_RETRYABLE = "retryable"
+FAILURE_OVERSIZE = "oversize"
+FAILURE_PERMANENT = "permanent"
+
+# Submissions of one file before a retryable failure is recorded as failed
+MAX_SUBMISSION_ATTEMPTS = 3
+
+# Patterns are matched case-insensitively against the error message, in this
+# order; the messages come from BatchProcessMetadata statuses and API errors
+_OVERSIZE_PATTERNS = [
+    r"file too large",
+    r"too many pages",
+    r"page limit",
+    r"(file size|pages?) .*exceed",
+]
+_RETRYABLE_PATTERNS = [
+    r"internal error",
+    r"deadline exceeded",
+    r"timed? ?out",
+    r"unavailable",
+    r"try again",
+    r"quota",
+    r"resource exhausted",
+    r"rate limit",
+    r"too many requests",
+    r"\b(429|500|502|503|504)\b",
+]
+_PERMANENT_PATTERNS = [
+    r"unsupported",
+    r"invalid",
+    r"password",
+    r"encrypt",
+    r"corrupt",
+    r"malformed",
+    r"not found",
+    r"permission",
+    r"empty object",
+]
+
+# Status codes of google.api_core exceptions (HTTP codes)
+_RETRYABLE_CODES = {408, 429, 500, 502, 503, 504}
+_PERMANENT_CODES = {400, 401, 403, 404, 415}
+
+_ACTUAL_SIZE_PATTERN = re.compile(r"actual size:\s*(\d+)", re.IGNORECASE)
+_PAGE_COUNT_PATTERN = re.compile(r"(\d+)\s+pages", re.IGNORECASE)
+
+
+def _matches(patterns, message: str):
+    return any(re.search(pattern, message) for pattern in patterns)
+
+
+def classify_failure(error):
+    """
+    Sort a failure into retryable, oversize or permanent.
+
+    Args:
+        error: The exception raised by a request, or the error message of one
+               document in a batch operation.
+
+    Returns:
+        str: FAILURE_RETRYABLE, FAILURE_OVERSIZE or FAILURE_PERMANENT.
+    """
+    message = str(error).lower()
+    if _matches(_OVERSIZE_PATTERNS, message):
+        return FAILURE_OVERSIZE
+    if _matches(_RETRYABLE_PATTERNS, message):
+        return FAILURE_RETRYABLE
+
+    code = getattr(error, "code", None)
+    if isinstance(code, int):
+        if code in _RETRYABLE_CODES:
+            return FAILURE_RETRYABLE
+        if code in _PERMANENT_CODES:
+            return FAILURE_PERMANENT
+
+    if _matches(_PERMANENT_PATTERNS, message):
+        return FAILURE_PERMANENT
+    # Unknown errors get the benefit of the doubt; the attempt limit bounds them
+    return FAILURE_RETRYABLE
+
+
+def apply_oversize_details(pdf, message: str, limits):
+    """
+    Update a PdfInfo from an oversize error so it no longer passes the limits.
+
+    The processor reports the real size ("actual size: N"), which beats our
+    estimates; if the message gives no usable number, the page count is
+    raised just past the per-document limit so the file gets split.
+    """
+    size_match = _ACTUAL_SIZE_PATTERN.search(message)
+    if size_match:
+        pdf.size = max(pdf.size, int(size_match.group(1)))
+    page_match = _PAGE_COUNT_PATTERN.search(message)
+    if page_match and int(page_match.group(1)) > limits.max_pages_per_document:
+        pdf.page_count = max(pdf.page_count, int(page_match.group(1)))
+    if limits.document_fits(pdf):
+        pdf.page_count = limits.max_pages_per_document + 1
+    return pdf
+
+
+# --- Pre-flight ---
+def preflight_check(pdf, limits):
+    """
+    Check one PDF against the processor limits without calling Document AI.
+
+    Args:
+        pdf (PdfInfo): The file to check.
+        limits (ProcessorLimits): Limits to respect.
+
+    Returns:
+        tuple: (failure class, reason), or (None, None) if the file can be
+               submitted as it is.
+    """
+    if pdf.size == 0:
+        return FAILURE_PERMANENT, "empty object"
+    if pdf.problem:
+        return FAILURE_PERMANENT, pdf.problem
+    if limits.document_fits(pdf):
+        return None, None
+    if pdf.page_count == 1 and not pdf.page_count_estimated:
+        # A single page cannot be split any further
+        return FAILURE_PERMANENT, (f"single page of {pdf.size} bytes is over the "
+                                   f"{limits.max_bytes_per_document} byte limit")
+    return FAILURE_OVERSIZE, (f"{pdf.size} bytes, {pdf.page_count} pages is over the limits of "
+                              f"{limits.max_bytes_per_document} bytes, {limits.max_pages_per_document} pages")
+
+
+def preflight_pdfs(pdfs, limits):
+    """
+    Sort PDFs into ready to submit, to be split, and doomed.
+
+    Returns:
+        tuple: (ready PdfInfos, oversize PdfInfos, [(PdfInfo, reason)] doomed)
+    """
+    ready = []
+    oversize = []
+    doomed = []
+    for pdf in pdfs:
+        failure, reason = preflight_check(pdf, limits)
+        if failure is None:
+            ready.append(pdf)
+        elif failure == FAILURE_OVERSIZE:
+            oversize.append(pdf)
+        else:
+            doomed.append((pdf, reason))
+    return ready, oversize, doomed
@@ -0,0 +1,124 @@
+import threading
+
+from google.cloud import storage
+from google.cloud import documentai_v1beta3 as documentai
+from google.api_core.client_options import ClientOptions
+
+# --- Connection Pool Configuration ---
+# Size of the HTTP connection pool of each storage client. Should be at least
+# the number of threads that list, copy or delete objects at the same time.
+STORAGE_POOL_SIZE = 32
+
+_lock = threading.Lock()
+_storage_clients = {}
+_documentai_clients = {}
+_storage_pool_size = STORAGE_POOL_SIZE
+# Clients served for every project / region instead of real ones (see install_clients)
+_installed_storage_client = None
+_installed_documentai_client = None
+
+
+def configure_client_pools(storage_pool_size: int = STORAGE_POOL_SIZE):
+    """
+    Set the connection-pool size used for storage clients created from now on.
+
+    Args:
+        storage_pool_size (int): Maximum number of pooled HTTP connections per client.
+    """
+    global _storage_pool_size
+    with _lock:
+        _storage_pool_size = storage_pool_size
+
+
+def _mount_connection_pool(client, pool_size: int):
+    # The default requests adapter keeps only 10 connections, so with more
+    # worker threads connections are thrown away and re-negotiated all the time
+    import requests
+
+    adapter = requests.adapters.HTTPAdapter(
+        pool_connections=pool_size, pool_maxsize=pool_size, max_retries=3
+    )
+    client._http.mount("https://", adapter)
+
+
+def get_storage_client(project_id: str):
+    """
+    Return the process-wide storage client for a project, creating it once.
+
+    The client (and its authorized HTTP session) is shared by every worker
+    thread, so credentials are loaded and TLS connections set up only once.
+
+    Args:
+        project_id (str): Your Google Cloud Project ID.
+
+    Returns:
+        google.cloud.storage.Client: The shared client.
+    """
+    if _installed_storage_client is not None:
+        return _installed_storage_client
+    client = _storage_clients.get(project_id)
+    if client is not None:
+        return client
+    with _lock:
+        client = _storage_clients.get(project_id)
+        if client is None:
+            client = storage.Client(project=project_id)
+            _mount_connection_pool(client, _storage_pool_size)
+            _storage_clients[project_id] = client
+    return client
+
+
+def get_bucket(project_id: str, bucket_name: str):
+    """Return a bucket handle backed by the shared storage client."""
+    return get_storage_client(project_id).bucket(bucket_name)
+
+
+def get_documentai_client(location: str):
+    """
+    Return the process-wide Document AI client for a region, creating it once.
+
+    gRPC channels multiplex concurrent calls, so one client per regional
+    endpoint serves every submitting and polling thread.
+
+    Args:
+        location (str): The region of the processor (e.g. "us").
+
+    Returns:
+        documentai.DocumentProcessorServiceClient: The shared client.
+    """
+    if _installed_documentai_client is not None:
+        return _installed_documentai_client
+    client = _documentai_clients.get(location)
+    if client is not None:
+        return client
+    with _lock:
+        client = _documentai_clients.get(location)
+        if client is None:
+            opts = ClientOptions(api_endpoint=f"{location}-documentai.googleapis.com")
+            client = documentai.DocumentProcessorServiceClient(client_options=opts)
+            _documentai_clients[location] = client
+    return client
+
+
+def install_clients(storage_client=None, documentai_client=None):
+    """
+    Serve the given clients for every project and region instead of real ones.
+
+    Used by the offline simulator to run the pipeline against stand-ins for
+    GCS and Document AI. Passing None for a client restores the real one.
+
+    Args:
+        storage_client: Object with the google.cloud.storage.Client interface.
+        documentai_client: Object with the DocumentProcessorServiceClient interface.
+    """
+    global _installed_storage_client, _installed_documentai_client
+    with _lock:
+        _installed_storage_client = storage_client
+        _installed_documentai_client = documentai_client
+
+
+def reset_clients():
+    """Drop every cached client (e.g. after credentials change)."""
+    with _lock:
+        _storage_clients.clear()
+        _documentai_clients.clear()
@@ -0,0 +1,44 @@
+from ocr_cache import blob_content_key
+from output_flattening import delete_in_batches
+
+
+def source_listing(blobs, bucket_name: str):
+    """
+    Describe the current version of every listed PDF for JobManifest.sync_book.
+
+    Only the listing is needed (generation and hashes come with it), so an
+    unchanged corpus costs one listing per book and nothing else.
+
+    Returns:
+        list: (source URI, generation, content key) tuples in listing order.
+    """
+    return [
+        (f"gs://{bucket_name}/{blob.name}", blob.generation, blob_content_key(blob))
+        for blob in blobs
+    ]
+
+
+def prune_output_uris(storage_client, output_uris):
+    """
+    Delete the outputs recorded for a source file.
+
+    Output URIs are either single objects (flattened or catalogued shards)
+    or directories ending in '/' (raw Document AI output), whose contents
+    are listed and deleted.
+
+    Returns:
+        int: Number of objects deleted.
+    """
+    names_by_bucket = {}
+    for uri in output_uris:
+        bucket_name, name = uri.replace("gs://", "", 1).split("/", 1)
+        names = names_by_bucket.setdefault(bucket_name, [])
+        if name.endswith('/'):
+            names.extend(blob.name for blob in storage_client.bucket(bucket_name).list_blobs(prefix=name))
+        else:
+            names.append(name)
+
+    deleted = 0
+    for bucket_name, names in names_by_bucket.items():
+        deleted += delete_in_batches(storage_client, storage_client.bucket(bucket_name), sorted(set(names)))
+    return deleted
@@ -0,0 +1,307 @@
+import json
+import time
+import sqlite3
+import threading
+
+# --- File States ---
+STATE_PENDING = "pending"
+STATE_SUBMITTED = "submitted"
+STATE_DONE = "done"
+STATE_FAILED = "failed"
+# Files that can never succeed as they are; later runs skip them
+STATE_DEAD_LETTER = "dead_letter"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    output_base TEXT NOT NULL,
+    source_uri TEXT NOT NULL,
+    book TEXT NOT NULL,
+    file_index INTEGER,
+    state TEXT NOT NULL,
+    operation_name TEXT,
+    output_uris TEXT,
+    reason TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    updated_at REAL NOT NULL,
+    generation INTEGER,
+    content_key TEXT,
+    PRIMARY KEY (output_base, source_uri)
+);
+CREATE INDEX IF NOT EXISTS files_by_book ON files (output_base, book, state);
+"""
+
+# Columns added after the first release; older manifests are upgraded in place
+_ADDED_COLUMNS = {
+    "generation": "INTEGER",
+    "content_key": "TEXT",
+}
+
+
+class JobManifest:
+    """
+    Local SQLite record of every input PDF and how far it got.
+
+    A file is ``pending`` until its request is submitted, ``submitted`` (with
+    the operation name) while Document AI works on it, then ``done`` (with its
+    output URIs) or ``failed`` (with a reason). Files that are known to be
+    unprocessable are ``dead_letter`` and are not submitted again. Each row
+    also keeps the generation and content key of the object version its
+    state refers to, so incremental runs can tell changed sources apart. Rows are scoped to one output
+    base URI, so runs writing to different output prefixes do not interfere.
+
+    The connection is shared between worker threads and guarded by a lock.
+    """
+
+    def __init__(self, path: str, output_base_uri: str):
+        self.path = path
+        self.output_base = output_base_uri
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock, self._conn:
+            self._conn.executescript(_SCHEMA)
+            columns = {row[1] for row in self._conn.execute("PRAGMA table_info(files)")}
+            for column, column_type in _ADDED_COLUMNS.items():
+                if column not in columns:
+                    self._conn.execute(f"ALTER TABLE files ADD COLUMN {column} {column_type}")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+    # --- Writes ---
+    def register_file(self, source_uri: str, book: str, file_index: int,
+                      generation: int = None, content_key: str = None):
+        """Add a file as pending unless it is already known."""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR IGNORE INTO files"
+                " (output_base, source_uri, book, file_index, state, updated_at, generation, content_key)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (self.output_base, source_uri, book, file_index, STATE_PENDING, time.time(),
+                 generation, content_key),
+            )
+            # Keep the file number current if the directory listing changed
+            self._conn.execute(
+                "UPDATE files SET book = ?, file_index = ? WHERE output_base = ? AND source_uri = ?",
+                (book, file_index, self.output_base, source_uri),
+            )
+            # Files still to be processed take the version that will be processed;
+            # finished files keep the version their outputs were made from
+            if generation is not None:
+                self._conn.execute(
+                    "UPDATE files SET generation = ?, content_key = ?"
+                    " WHERE output_base = ? AND source_uri = ? AND (state != ? OR generation IS NULL)",
+                    (generation, content_key, self.output_base, source_uri, STATE_DONE),
+                )
+
+    def sync_book(self, book: str, listing):
+        """
+        Reconcile the recorded files of a book with a fresh listing.
+
+        Known files keep their file number; new files are numbered after the
+        highest number used so far, so the outputs of unchanged files never
+        need renaming. A known file whose object has a new generation and
+        different content is reset to pending.
+
+        Args:
+            book (str): English name of the book.
+            listing (list): (source URI, generation, content key) per PDF, in
+                            listing order.
+
+        Returns:
+            dict: "indexes" (source URI -> file number), "changed" (records
+                  of changed files as they were before the reset), "added"
+                  (source URIs of new files) and "deleted" (records of files
+                  no longer listed; their rows are left for remove_files).
+        """
+        now = time.time()
+        with self._lock, self._conn:
+            rows = self._conn.execute(
+                "SELECT * FROM files WHERE output_base = ? AND book = ?", (self.output_base, book)
+            ).fetchall()
+            known = {row["source_uri"]: self._row_to_dict(row) for row in rows}
+            next_index = max([record["file_index"] or 0 for record in known.values()], default=0) + 1
+
+            indexes = {}
+            changed = []
+            added = []
+            for source_uri, generation, content_key in listing:
+                record = known.get(source_uri)
+                if record is None:
+                    indexes[source_uri] = next_index
+                    added.append(source_uri)
+                    self._conn.execute(
+                        "INSERT INTO files"
+                        " (output_base, source_uri, book, file_index, state, updated_at, generation, content_key)"
+                        " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                        (self.output_base, source_uri, book, next_index, STATE_PENDING, now,
+                         generation, content_key),
+                    )
+                    next_index += 1
+                    continue
+
+                indexes[source_uri] = record["file_index"]
+                same_generation = record["generation"] is None or record["generation"] == generation
+                same_content = record["content_key"] is not None and record["content_key"] == content_key
+                if not same_generation and not same_content and record["state"] != STATE_PENDING:
+                    changed.append(record)
+                    self._conn.execute(
+                        "UPDATE files SET state = ?, operation_name = NULL, output_uris = NULL, reason = NULL,"
+                        " attempts = 0, generation = ?, content_key = ?, updated_at = ?"
+                        " WHERE output_base = ? AND source_uri = ?",
+                        (STATE_PENDING, generation, content_key, now, self.output_base, source_uri),
+                    )
+                else:
+                    # Same bytes, a file not processed yet, or a version never
+                    # recorded before: adopt the current version
+                    self._conn.execute(
+                        "UPDATE files SET generation = ?, content_key = ?"
+                        " WHERE output_base = ? AND source_uri = ?",
+                        (generation, content_key, self.output_base, source_uri),
+                    )
+
+        listed = {source_uri for source_uri, _, _ in listing}
+        deleted = [record for source_uri, record in known.items() if source_uri not in listed]
+        return {"indexes": indexes, "changed": changed, "added": added, "deleted": deleted}
+
+    def remove_files(self, source_uris):
+        """Forget files whose sources were deleted."""
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "DELETE FROM files WHERE output_base = ? AND source_uri = ?",
+                [(self.output_base, uri) for uri in source_uris],
+            )
+
+    def mark_submitted(self, source_uris, operation_name: str, count_attempt: bool = True):
+        """
+        Record the operation that is now processing the given files.
+
+        With ``count_attempt`` the files' submission attempts go up by one;
+        split files, whose parts travel in several requests, pass False and
+        have their attempts counted per part by the caller.
+        """
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "UPDATE files SET state = ?, operation_name = ?, reason = NULL,"
+                " attempts = attempts + ?, updated_at = ?"
+                " WHERE output_base = ? AND source_uri = ?",
+                [(STATE_SUBMITTED, operation_name, int(count_attempt), time.time(), self.output_base, uri)
+                 for uri in source_uris],
+            )
+
+    def mark_done(self, source_uri: str, output_uris):
+        """Record a finished file and where its outputs live."""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE files SET state = ?, output_uris = ?, reason = NULL, updated_at = ?"
+                " WHERE output_base = ? AND source_uri = ?",
+                (STATE_DONE, json.dumps(list(output_uris), ensure_ascii=False), time.time(),
+                 self.output_base, source_uri),
+            )
+
+    def mark_failed(self, source_uri: str, reason: str):
+        """Record a failed file and why it failed."""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE files SET state = ?, reason = ?, updated_at = ?"
+                " WHERE output_base = ? AND source_uri = ?",
+                (STATE_FAILED, reason, time.time(), self.output_base, source_uri),
+            )
+
+    def mark_dead_letter(self, source_uri: str, reason: str):
+        """Record a file that can never be processed, so later runs skip it."""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE files SET state = ?, reason = ?, updated_at = ?"
+                " WHERE output_base = ? AND source_uri = ?",
+                (STATE_DEAD_LETTER, reason, time.time(), self.output_base, source_uri),
+            )
+
+    def reset_files(self, source_uris, states=(STATE_DONE, STATE_FAILED)):
+        """
+        Move files back to pending, dropping their recorded outputs, so the
+        next run submits them again.
+
+        Args:
+            source_uris: Files to reset.
+            states: Only files in one of these states are reset; submitted
+                    files are left to reattach and dead letters stay skipped.
+
+        Returns:
+            int: Number of files reset.
+        """
+        placeholders = ", ".join("?" for _ in states)
+        reset = 0
+        with self._lock, self._conn:
+            for uri in source_uris:
+                cursor = self._conn.execute(
+                    "UPDATE files SET state = ?, output_uris = NULL, operation_name = NULL, reason = NULL,"
+                    f" updated_at = ? WHERE output_base = ? AND source_uri = ? AND state IN ({placeholders})",
+                    (STATE_PENDING, time.time(), self.output_base, uri, *states),
+                )
+                reset += cursor.rowcount
+        return reset
+
+    # --- Reads ---
+    def _row_to_dict(self, row):
+        record = dict(row)
+        record["output_uris"] = json.loads(record["output_uris"]) if record["output_uris"] else []
+        return record
+
+    def get(self, source_uri: str):
+        """Return the record of one file, or None if it is unknown."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT * FROM files WHERE output_base = ? AND source_uri = ?",
+                (self.output_base, source_uri),
+            ).fetchone()
+        return self._row_to_dict(row) if row else None
+
+    def books(self):
+        """Return the names of every book with recorded files."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT DISTINCT book FROM files WHERE output_base = ? ORDER BY book", (self.output_base,)
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def files(self, book: str = None, state: str = None):
+        """Return file records, optionally filtered by book and state."""
+        query = "SELECT * FROM files WHERE output_base = ?"
+        params = [self.output_base]
+        if book is not None:
+            query += " AND book = ?"
+            params.append(book)
+        if state is not None:
+            query += " AND state = ?"
+            params.append(state)
+        query += " ORDER BY book, file_index"
+        with self._lock:
+            rows = self._conn.execute(query, params).fetchall()
+        return [self._row_to_dict(row) for row in rows]
+
+    def summary(self):
+        """
+        Count files and outputs per book and state.
+
+        Returns:
+            dict: Book -> {"pending": n, "submitted": n, "done": n,
+                  "failed": n, "dead_letter": n, "outputs": n}
+        """
+        books = {}
+        for record in self.files():
+            counts = books.setdefault(record["book"], {
+                STATE_PENDING: 0, STATE_SUBMITTED: 0, STATE_DONE: 0, STATE_FAILED: 0,
+                STATE_DEAD_LETTER: 0, "outputs": 0,
+            })
+            counts[record["state"]] += 1
+            counts["outputs"] += len(record["output_uris"])
+        return books
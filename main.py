@@ -1,8 +1,39 @@
 import os
 import time
+import random
+import argparse
+import threading
+import concurrent.futures
 from google.cloud import documentai_v1beta3 as documentai
-from google.cloud import storage
-from google.api_core.client_options import ClientOptions
+from google.api_core import exceptions as google_exceptions
+from google.longrunning import operations_pb2
+from operation_executor import OperationExecutor, configure_project_operation_limit
+from pdf_info import describe_pdf_blobs
+from request_packing import ProcessorLimits, pack_pdfs, summarize_batch_metadata
+from pdf_splitter import split_pdf_to_gcs, stitch_part_outputs, delete_split_parts
+from job_manifest import JobManifest, STATE_DEAD_LETTER, STATE_DONE, STATE_FAILED, STATE_SUBMITTED
+from failure_routing import (
+    FAILURE_OVERSIZE, FAILURE_PERMANENT, FAILURE_RETRYABLE, MAX_SUBMISSION_ATTEMPTS,
+    apply_oversize_details, classify_failure, preflight_check, preflight_pdfs,
+)
+from operation_poller import OperationPoller
+from bucket_index import BucketIndex
+from gcp_clients import configure_client_pools, get_bucket, get_documentai_client, get_storage_client
+from output_flattening import delete_in_batches, flatten_book_outputs
+from book_assembly import assemble_book_text, assemble_books
+from output_catalog import build_file_entry, catalog_object_name, list_output_shards, write_book_catalog
+from quota_limiter import ONLINE_RESOURCE, QUOTA_DB_PATH, configure_quota_limiter, get_quota_limiter
+from processor_pool import ProcessorEndpoint, ProcessorPool
+from online_processing import OnlineProcessor, is_online_candidate
+from ocr_cache import OCR_CACHE_PATH, OcrResultCache, blob_content_key, forget_content, link_cached_result, ocr_config_key
+from incremental_sync import prune_output_uris, source_listing
+from request_scheduling import POLICY_LARGEST_FIRST, SCHEDULING_POLICIES, request_priority
+from run_planner import estimate_run, plan_book
+from pipeline_stages import PipelineStage
+from adaptive_concurrency import AIMD_INCREASE, starting_limit
+from reconciliation import RECONCILIATION_REPORT_PATH, STATUS_PARTIAL, reconcile_outputs
+from operation_deadlines import configure_operation_latencies, get_operation_latencies, size_class
+from pipeline_metrics import METRICS_LOG_PATH, METRICS_PROMETHEUS_PATH, configure_metrics, get_metrics
 
 # --- Bible Book Name Mapping ---
 KOREAN_TO_ENGLISH_BOOKS = {
@@ -107,99 +138,1522 @@ GCS_OUTPUT_PREFIX = "annotations/" # Ensure this ends with a slash for a directo
 GCS_INPUT_URI = f"gs://{GCS_BUCKET_NAME}/{GCS_INPUT_PREFIX}"
 GCS_OUTPUT_URI = f"gs://{GCS_BUCKET_NAME}/{GCS_OUTPUT_PREFIX}"
 
+# Maximum number of Document AI batch operations in flight on one processor.
+# The project quota is 5 concurrent batch operations; lower this if other jobs
+# share the project.
+MAX_CONCURRENT_OPERATIONS = 5
+
+# Batch submissions allowed per minute on one processor, shared (through
+# QUOTA_DB_PATH) by every process on this host, so parallel runs queue for
+# quota instead of hitting 429s
+MAX_SUBMISSIONS_PER_MINUTE = 30
+
+# Processors to spread batch operations over, each with its own concurrency
+# and submission-rate limits; every operation goes to the least-loaded one,
+# and one whose submissions keep failing is skipped for a while. Leave empty
+# to use PROCESSOR_ID in PROCESSOR_LOCATION with the limits above. The first
+# endpoint also serves online requests and keys the OCR cache, so every
+# endpoint should run the same processor version.
+#   PROCESSOR_ENDPOINTS = [
+#       ProcessorEndpoint("786384a4117ccb51", "us", max_concurrent=5, requests_per_minute=30),
+#       ProcessorEndpoint("<second processor id>", "eu", max_concurrent=5, requests_per_minute=30),
+#   ]
+PROCESSOR_ENDPOINTS = []
+
+# First delay before resubmitting after a quota error; doubles on every retry (seconds)
+QUOTA_RETRY_DELAY_SECONDS = 30
+
+# Operations allowed in flight on each processor adapt to what the project
+# currently sustains: the limit starts low, grows by one per round of accepted
+# submissions and is halved on a quota or 429 error (see adaptive_concurrency),
+# never above the processor's max_concurrent. Every change is logged to
+# METRICS_LOG_PATH. False keeps every processor at max_concurrent.
+ADAPTIVE_CONCURRENCY = True
+
+# Longest we keep polling a single operation before giving up on it (seconds).
+# Operations are polled with growing intervals, so long waits cost few calls.
+# Each batch request gets its own deadline below this, derived from its page
+# count and the throughput of the run's finished operations (see
+# operation_deadlines); an operation past its deadline is cancelled and retried.
+OPERATION_TIMEOUT_SECONDS = 6 * 60 * 60
+
+# An operation still running past the p95 latency of its size class gets a
+# duplicate on a free slot, if there is one; the first to succeed wins and the
+# other is cancelled (its outputs are deleted)
+HEDGE_OPERATIONS = True
+
+# Limits used when packing several PDFs into one BatchProcessRequest.
+# max_bytes_per_document matches the processor's 50 MB "File too large" limit.
+PROCESSOR_LIMITS = ProcessorLimits(
+    max_documents_per_request=50,
+    max_pages_per_request=2000,
+    max_bytes_per_request=1024 * 1024 * 1024,
+    max_pages_per_document=500,
+    max_bytes_per_document=52428800,
+)
+
+# Staging prefix (in the input bucket) for the page-range parts of oversize PDFs
+GCS_SPLIT_PREFIX = "_split_parts/"
+
+# Synchronous fast path: PDFs with at most ONLINE_MAX_PAGES pages and
+# ONLINE_MAX_BYTES bytes go through process_document instead of a batch
+# operation, ONLINE_WORKERS at a time and at most ONLINE_REQUESTS_PER_MINUTE
+ONLINE_PROCESSING = True
+ONLINE_MAX_PAGES = 15
+ONLINE_MAX_BYTES = 20 * 1024 * 1024
+ONLINE_WORKERS = 8
+ONLINE_REQUESTS_PER_MINUTE = 120
+
+# Directory (under a book's output prefix) for the results of online requests
+ONLINE_OUTPUT_DIRECTORY = "online/"
+
+# Order in which queued requests of all books take free operation slots (see
+# request_scheduling.SCHEDULING_POLICIES). largest_first starts the big
+# volumes early so they do not become the tail of the run.
+SCHEDULING_POLICY = POLICY_LARGEST_FIRST
+
+# Local SQLite file recording the state of every PDF, used to resume a run
+MANIFEST_PATH = "ocr_manifest.sqlite"
+
+# Incremental mode: compare every PDF's generation and MD5 with the version the
+# last successful run processed, submit only new or changed files, keep the file
+# numbers of known files stable, and prune outputs whose source was deleted
+INCREMENTAL_MODE = False
+
+# Files that can never be processed as they are (dead letters) are listed here
+# after every run, in the same "URI / reason" line pairs as the failures file
+DEAD_LETTER_PATH = "dead_letter.txt"
+
+# HTTP connections kept open per storage client; every listing, copy and
+# delete thread draws from this pool
+STORAGE_CONNECTION_POOL_SIZE = 32
+
+# Number of output shards copied at the same time while flattening a book
+FLATTEN_WORKERS = 16
+
+# How finished outputs are made available per book:
+#   "catalog" - leave Document AI outputs where they land and write one index
+#               object per book ({output prefix}_catalog/{book}.json)
+#   "flatten" - physically move every shard to {book}_file{NNN}_{shard}.json
+OUTPUT_LAYOUT = "catalog"
+
+# Once a book is published, join its shards into one text in reading order
+# ({output prefix}_text/{book}.txt) with a page table ({book}.pages.jsonl);
+# ASSEMBLY_WORKERS shards are downloaded and parsed at the same time
+ASSEMBLE_BOOK_TEXT = True
+ASSEMBLY_WORKERS = 16
+
+# A run is a pipeline of stages joined by bounded queues, each with its own
+# workers, so GCS listing, splitting and post-processing overlap the OCR:
+#   discover    - list, describe, split and queue a book (DISCOVERY_WORKERS)
+#   submit/wait - the executor and poller, bounded by the processor quota;
+#                 at most MAX_QUEUED_REQUESTS requests wait for a slot (None
+#                 queues every book, so the scheduling policy sees all of them)
+#   publish     - catalog or flatten a finished book (PUBLISH_WORKERS)
+#   assemble    - join a published book's text (ASSEMBLY_STAGE_WORKERS)
+# A stage whose queue (STAGE_QUEUE_SIZE items) is full holds back the one feeding it
+DISCOVERY_WORKERS = 4
+MAX_QUEUED_REQUESTS = None
+PUBLISH_WORKERS = 4
+ASSEMBLY_STAGE_WORKERS = 2
+STAGE_QUEUE_SIZE = 8
+
+# Timing spans (per file and per stage) and counters are appended to
+# METRICS_LOG_PATH as JSON lines and exported in the Prometheus text format to
+# METRICS_PROMETHEUS_PATH; set METRICS_PORT to also serve them on
+# http://127.0.0.1:{METRICS_PORT}/metrics while the run lasts
+METRICS_PORT = None
+
 # --- Helper Function to List Subdirectories ---
+_bucket_indexes = {}
+
+def run_endpoints(endpoints, processor_id: str, location: str, max_concurrent: int = None):
+    """
+    Return the processor endpoints a run spreads its operations over:
+    ``endpoints``, or processor_id in location with max_concurrent
+    (MAX_CONCURRENT_OPERATIONS by default) and MAX_SUBMISSIONS_PER_MINUTE.
+    """
+    if endpoints:
+        return list(endpoints)
+    if max_concurrent is None:
+        max_concurrent = MAX_CONCURRENT_OPERATIONS
+    return [ProcessorEndpoint(processor_id, location, max_concurrent, MAX_SUBMISSIONS_PER_MINUTE)]
+
+def get_bucket_index(project_id: str, bucket_name: str):
+    """
+    Return the (cached) NFC-normalized listing index for a bucket.
+
+    Args:
+        project_id (str): Your Google Cloud Project ID.
+        bucket_name (str): The GCS bucket name.
+
+    Returns:
+        BucketIndex: Index shared by every caller in this process.
+    """
+    if bucket_name not in _bucket_indexes:
+        _bucket_indexes[bucket_name] = BucketIndex(get_storage_client(project_id), bucket_name)
+    return _bucket_indexes[bucket_name]
+
 def list_subdirectories_in_gcs(project_id: str, bucket_name: str, prefix: str):
     """
-    Lists all subdirectories under a given GCS prefix.
-    
+    Lists all subdirectories under a given GCS prefix.
+
+    The prefix may be written in any Unicode normalization form (e.g. NFC
+    "주석/" while the objects were uploaded with NFD names); the returned
+    paths are the prefixes actually stored in the bucket.
+    
+    Args:
+        project_id (str): Your Google Cloud Project ID.
+        bucket_name (str): The GCS bucket name.
+        prefix (str): The prefix to search under.
+    
+    Returns:
+        list: List of subdirectory paths.
+    """
+    index = get_bucket_index(project_id, bucket_name)
+
+    with get_metrics().span("list_subdirectories", prefix=prefix):
+        actual_prefix = index.resolve_prefix(prefix)
+        if actual_prefix is None:
+            print(f"⚠️  Prefix not found in gs://{bucket_name}: {prefix}")
+            return []
+        if actual_prefix != prefix:
+            print(f"🔤 Resolved {prefix} to the stored (differently normalized) prefix")
+
+        subdirectories = index.subdirectories(actual_prefix)
+        index.save()
+
+    return subdirectories
+
+# --- Helper Function to List PDF Files in a Subdirectory ---
+def list_pdf_blobs_in_directory(project_id: str, bucket_name: str, prefix: str):
+    """
+    Lists the PDF blobs in a specific GCS directory, in listing order.
+
+    Args:
+        project_id (str): Your Google Cloud Project ID.
+        bucket_name (str): The GCS bucket name.
+        prefix (str): The directory prefix to search in.
+
+    Returns:
+        list: List of google.cloud.storage.Blob objects.
+    """
+    bucket = get_bucket(project_id, bucket_name)
+
+    # List all blobs with the prefix
+    with get_metrics().span("list_pdfs", prefix=prefix):
+        blobs = bucket.list_blobs(prefix=prefix)
+        return [blob for blob in blobs if blob.name.lower().endswith('.pdf')]
+
+def list_pdf_files_in_directory(project_id: str, bucket_name: str, prefix: str):
+    """
+    Lists all PDF files in a specific GCS directory.
+    
+    Args:
+        project_id (str): Your Google Cloud Project ID.
+        bucket_name (str): The GCS bucket name.
+        prefix (str): The directory prefix to search in.
+    
+    Returns:
+        list: List of PDF file URIs.
+    """
+    return [
+        f"gs://{bucket_name}/{blob.name}"
+        for blob in list_pdf_blobs_in_directory(project_id, bucket_name, prefix)
+    ]
+
+# --- Helper Functions to Build and Run Document AI Operations ---
+def build_batch_process_request(processor_name: str, pdf_uris: list, output_uri: str):
+    """
+    Build a BatchProcessRequest for the given PDFs with Korean OCR hints.
+
+    Args:
+        processor_name (str): Full resource name of the processor.
+        pdf_uris (list): GCS URIs of the PDFs to include in the request.
+        output_uri (str): GCS URI prefix where Document AI writes its output.
+
+    Returns:
+        documentai.BatchProcessRequest: The request ready to be submitted.
+    """
+    gcs_documents = [
+        documentai.GcsDocument(gcs_uri=pdf_uri, mime_type="application/pdf")
+        for pdf_uri in pdf_uris
+    ]
+
+    input_config = documentai.BatchDocumentsInputConfig(
+        gcs_documents=documentai.GcsDocuments(documents=gcs_documents)
+    )
+
+    output_config = documentai.DocumentOutputConfig(
+        gcs_output_config=documentai.DocumentOutputConfig.GcsOutputConfig(
+            gcs_uri=output_uri
+        )
+    )
+
+    return documentai.BatchProcessRequest(
+        name=processor_name,
+        input_documents=input_config,
+        document_output_config=output_config,
+        process_options=build_process_options(),
+    )
+
+def build_process_options():
+    """Return the OCR options (Korean language hints) used for every request."""
+    ocr_config = documentai.OcrConfig(
+        hints=documentai.OcrConfig.Hints(language_hints=["ko"])
+    )
+    return documentai.ProcessOptions(ocr_config=ocr_config)
+
+def get_processor_version(client, processor_name: str):
+    """
+    Return the processor version that requests to the processor use.
+
+    Part of the OCR cache key: a new default version means new results.
+    """
+    try:
+        return client.get_processor(name=processor_name).default_processor_version or "default"
+    except Exception as e:
+        print(f"⚠️  Could not read the processor version ({e}); cached results are keyed as 'unknown'")
+        return "unknown"
+
+def open_ocr_cache(client, processor_name: str, path: str = OCR_CACHE_PATH):
+    """Open the OCR result cache for the processor version and OCR options of this run."""
+    processor = f"{processor_name}@{get_processor_version(client, processor_name)}"
+    return OcrResultCache(path, processor, ocr_config_key(build_process_options()))
+
+def reuse_cached_result(project_id: str, cache: OcrResultCache, pdf, book_output_uri: str):
+    """
+    Copy the cached result of identical bytes into the book's output directory.
+
+    Args:
+        project_id (str): Your Google Cloud Project ID.
+        cache (OcrResultCache): The OCR result cache.
+        pdf (PdfInfo): The file about to be processed.
+        book_output_uri (str): GCS URI of the book's output directory.
+
+    Returns:
+        str: GCS URI of the output directory holding the copied shards, or
+             None if there is no (usable) cached result.
+    """
+    shard_uris = cache.lookup(pdf.content_key)
+    if not shard_uris:
+        return None
+
+    bucket_name, book_prefix = book_output_uri.replace("gs://", "", 1).split("/", 1)
+    destination_prefix = f"{book_prefix}cached/{pdf.file_index:03d}/"
+    try:
+        link_cached_result(
+            get_storage_client(project_id), shard_uris, get_bucket(project_id, bucket_name),
+            destination_prefix, os.path.splitext(pdf.filename)[0],
+        )
+    except Exception as e:
+        print(f"    ⚠️  Cached result for {pdf.filename} is no longer usable: {e}")
+        cache.forget(pdf.content_key)
+        return None
+    return f"gs://{bucket_name}/{destination_prefix}"
+
+def create_online_processor(client, processor_name: str, project_id: str, output_base_uri: str):
+    """
+    Create the synchronous processor for small PDFs, or None if the fast
+    path is disabled.
+    """
+    if not ONLINE_PROCESSING:
+        return None
+    output_bucket = get_bucket(project_id, output_base_uri.replace("gs://", "").split("/")[0])
+    limiter = configure_quota_limiter(
+        QUOTA_DB_PATH, ONLINE_WORKERS, ONLINE_REQUESTS_PER_MINUTE, resource=ONLINE_RESOURCE
+    )
+    return OnlineProcessor(
+        client, processor_name, output_bucket, limiter,
+        process_options=build_process_options(), max_workers=ONLINE_WORKERS,
+    )
+
+# Errors of a get_operation call that only mean this poll failed; the
+# operation keeps running and is polled again (see OperationPoller)
+TRANSIENT_POLL_ERRORS = (
+    google_exceptions.ServiceUnavailable,
+    google_exceptions.DeadlineExceeded,
+    google_exceptions.InternalServerError,
+    google_exceptions.TooManyRequests,
+    google_exceptions.RetryError,
+    ConnectionError,
+    TimeoutError,
+)
+
+def fetch_operation_status(client, operation_name: str):
+    """
+    Fetch the current state of a batch operation by name.
+
+    Returns:
+        dict: "done", "error" (message or None) and "metadata"
+              (documentai.BatchProcessMetadata or None).
+    """
+    operation = client.get_operation(operations_pb2.GetOperationRequest(name=operation_name))
+    metadata = None
+    if operation.metadata.value:
+        metadata = documentai.BatchProcessMetadata.deserialize(operation.metadata.value)
+    error = None
+    if operation.HasField("error"):
+        error = operation.error.message or f"status code {operation.error.code}"
+    return {"done": operation.done, "error": error, "metadata": metadata}
+
+def open_operation_poller(pool: ProcessorPool):
+    """Start the poller that watches this run's operations, each through the client of its region."""
+    return OperationPoller(
+        lambda name: fetch_operation_status(pool.client_for_operation(name), name),
+        transient_errors=TRANSIENT_POLL_ERRORS,
+    )
+
+def wait_for_operation(poller: OperationPoller, operation_name: str, timeout: int = OPERATION_TIMEOUT_SECONDS):
+    """
+    Wait for a batch operation through the shared poller.
+
+    Works for operations started by this process and for operations started
+    by an earlier run that are being reattached by name.
+
+    Returns:
+        dict: Operation name, source URI -> output directory URI for every
+              document that succeeded, and source URI -> error message for
+              every document that failed.
+    """
+    status = poller.watch(operation_name).result(timeout=timeout)
+    return operation_result(operation_name, status)
+
+def operation_result(operation_name: str, status: dict):
+    """Turn the final status of a batch operation into a result dict (see wait_for_operation)."""
+    outputs, failures = summarize_batch_metadata(status["metadata"])
+    # A packed request can partially succeed; keep the documents that made it
+    if status["error"] and not outputs:
+        raise RuntimeError(status["error"])
+
+    return {
+        "operation_name": operation_name,
+        "outputs": outputs,
+        "failures": failures,
+    }
+
+def watch_operation_result(poller: OperationPoller, operation_name: str):
+    """
+    Watch an already running operation without tying up a worker thread.
+
+    Returns:
+        concurrent.futures.Future: Resolved with the operation's result dict.
+    """
+    result_future = concurrent.futures.Future()
+
+    def _finish(status_future):
+        try:
+            result_future.set_result(operation_result(operation_name, status_future.result()))
+        except Exception as e:
+            result_future.set_exception(e)
+
+    poller.watch(operation_name).add_done_callback(_finish)
+    return result_future
+
+def reattach_unfinished_operations(executor: OperationExecutor, manifest: JobManifest, poller: OperationPoller,
+                                   pool: ProcessorPool = None):
+    """
+    Start watching every operation an earlier run left unfinished.
+
+    Those operations keep running server-side and use project quota, so each
+    one holds a slot of the executor (and of a processor endpoint in its
+    region) until it completes. Their results are collected per book by
+    submit_subdirectory_files.
+
+    Returns:
+        int: Number of operations reattached.
+    """
+    operation_names = sorted({
+        record["operation_name"] for record in manifest.files(state=STATE_SUBMITTED)
+        if record["operation_name"]
+    })
+    for operation_name in operation_names:
+        future = poller.watch(operation_name)
+        executor.reserve_slot_until(future)
+        if pool is not None:
+            pool.reserve_until(operation_name, future)
+    if operation_names:
+        print(f"🔗 Reattaching to {len(operation_names)} operations started by a previous run")
+    return len(operation_names)
+
+def submit_batch_process_with_retry(client, request, label: str, limiter=None, max_retries: int = 3,
+                                    concurrency=None):
+    """
+    Submit a batch process request once the shared quota limiter allows it.
+
+    The limiter paces submissions for every process on the host, so quota
+    errors only happen when something outside it uses the project; those are
+    retried with exponential backoff. Every outcome is also reported to the
+    endpoint's adaptive concurrency limit, which grows while submissions are
+    accepted and is cut on quota errors.
+
+    Args:
+        client: Document AI client.
+        request: The BatchProcessRequest to submit.
+        label (str): Name of the request (for logging).
+        limiter (QuotaLimiter): Shared limiter; defaults to the process-wide one.
+        max_retries (int): Maximum number of retries after a quota error.
+        concurrency (processor_pool.EndpointState): Endpoint whose
+                     concurrency limit the outcomes are reported to, or None.
+
+    Returns:
+        The google.api_core.operation.Operation that was started.
+    """
+    limiter = limiter or get_quota_limiter()
+    metrics = get_metrics()
+    for attempt in range(max_retries + 1):
+        with metrics.span("quota_wait", request=label):
+            limiter.acquire_request()
+        try:
+            with metrics.span("submit", request=label, attempt=attempt + 1):
+                operation = client.batch_process_documents(request)
+        except (google_exceptions.TooManyRequests, google_exceptions.ResourceExhausted) as e:
+            metrics.inc("quota_errors", path="batch")
+            if concurrency is not None and concurrency.record_overload():
+                print(f"  📉 Concurrency limit of {concurrency.endpoint.key} cut to "
+                      f"{concurrency.concurrency.limit} after a quota error")
+            if attempt == max_retries:
+                raise
+            metrics.inc("submission_retries", path="batch")
+            # Longer delay for quota limits (starts at QUOTA_RETRY_DELAY_SECONDS)
+            delay = (QUOTA_RETRY_DELAY_SECONDS * (2 ** attempt)) + random.uniform(0, QUOTA_RETRY_DELAY_SECONDS / 3)
+            print(f"  ⚠️  Quota limit exceeded for {label} (attempt {attempt + 1}/{max_retries + 1}): {e}")
+            print(f"     Retrying in {delay:.1f} seconds...")
+            time.sleep(delay)
+            continue
+        if concurrency is not None:
+            concurrency.record_success()
+        return operation
+
+def submit_to_endpoint(pool: ProcessorPool, endpoint, pdf_uris: list, output_uri: str, label: str,
+                       max_retries: int = 3):
+    """
+    Submit a batch request to an endpoint taken from the pool and record the
+    outcome in the endpoint's health.
+
+    Returns:
+        str: Name of the operation that was started.
+    """
+    metrics = get_metrics()
+    request = build_batch_process_request(endpoint.processor_name, pdf_uris, output_uri)
+    try:
+        operation = submit_batch_process_with_retry(endpoint.client, request, label, endpoint.limiter, max_retries,
+                                                    concurrency=endpoint)
+    except Exception as e:
+        metrics.inc("endpoint_errors", endpoint=endpoint.endpoint.key)
+        if pool.record_result(endpoint, e):
+            print(f"  ⛔ Processor {endpoint.endpoint.key} failed {pool.failure_threshold} submissions in a row; "
+                  f"skipping it for {pool.cooldown_seconds:.0f} seconds")
+        raise
+    pool.record_result(endpoint)
+    metrics.inc("endpoint_submissions", endpoint=endpoint.endpoint.key)
+    return operation.operation.name
+
+def cancel_operation(client, operation_name: str):
+    """Ask Document AI to stop an operation; a failed request is only reported."""
+    try:
+        client.cancel_operation(operations_pb2.CancelOperationRequest(name=operation_name))
+    except Exception as e:
+        print(f"  ⚠️  Could not cancel {operation_name}: {e}")
+
+def operation_output_prefix(output_uri: str, operation_name: str):
+    """Return the object prefix an operation writes its shards under ({output_uri}{operation id}/)."""
+    prefix = "/".join(output_uri.replace("gs://", "").split("/")[1:])
+    return f"{prefix}{operation_name.rsplit('/', 1)[-1]}/"
+
+# Output prefixes of cancelled operations whose outputs are not deleted yet;
+# flattening leaves them alone so their partial shards are never published
+_abandoned_prefixes = set()
+_abandoned_lock = threading.Lock()
+
+def abandoned_output_prefixes():
+    """Return the output prefixes of cancelled operations still awaiting cleanup."""
+    with _abandoned_lock:
+        return set(_abandoned_prefixes)
+
+def discard_operation_outputs(project_id: str, output_uri: str, operation_name: str):
+    """
+    Delete what a cancelled operation wrote ({output_uri}{operation id}/), so
+    no partial shards are left behind.
+
+    Returns:
+        int: Number of objects deleted.
+    """
+    bucket_name = output_uri.replace("gs://", "").split("/")[0]
+    prefix = operation_output_prefix(output_uri, operation_name)
+    bucket = get_bucket(project_id, bucket_name)
+    names = [blob.name for blob in bucket.list_blobs(prefix=prefix)]
+    if names:
+        delete_in_batches(get_storage_client(project_id), bucket, names)
+    return len(names)
+
+def abandon_operation(pool: ProcessorPool, attempt: dict, project_id: str, output_uri: str):
+    """
+    Cancel an operation nobody waits for any more. Its slot is held, and its
+    outputs are deleted, only once Document AI reports it done; until then
+    flattening skips its output directory (see abandoned_output_prefixes).
+    """
+    prefix = operation_output_prefix(output_uri, attempt["operation_name"])
+    with _abandoned_lock:
+        _abandoned_prefixes.add(prefix)
+    cancel_operation(attempt["endpoint"].client, attempt["operation_name"])
+
+    def _cleanup():
+        try:
+            if project_id is not None:
+                discard_operation_outputs(project_id, output_uri, attempt["operation_name"])
+                with _abandoned_lock:
+                    _abandoned_prefixes.discard(prefix)
+        except Exception as e:
+            print(f"  ⚠️  Could not delete the outputs of {attempt['operation_name']}: {e}")
+        finally:
+            pool.release(attempt["endpoint"], attempt["lease_id"])
+
+    # The watch resolves on the poller's loop; GCS calls run on their own thread
+    attempt["watch"].add_done_callback(
+        lambda _: threading.Thread(target=_cleanup, name="docai-abandon", daemon=True).start()
+    )
+
+def run_batch_operation(pool: ProcessorPool, pdf_uris: list, output_uri: str, poller: OperationPoller,
+                        timeout: int = None, on_submitted=None, label: str = "", pages: int = 0,
+                        project_id: str = None, slot: tuple = None):
+    """
+    Submit a batch request to the least-loaded processor endpoint and wait
+    until the operation finishes.
+
+    Runs inside an OperationExecutor worker, so the calling thread holds one
+    of the run's operation slots, and one slot of the chosen endpoint, for
+    the whole call. The endpoint slot is normally taken by the executor
+    before it picks the request (``slot``), so requests start in priority
+    order however the endpoints' concurrency limits change.
+
+    The wait ends at a deadline derived from the request's page count and
+    the throughput of the operations finished so far; an operation still
+    running then is cancelled and the request fails with a (retryable)
+    timeout. With HEDGE_OPERATIONS, an operation running longer than the p95
+    latency of its size class is duplicated on a free endpoint slot: the
+    first of the two to succeed wins and the other is cancelled.
+
+    Args:
+        pool (ProcessorPool): Endpoints the request can be sent to.
+        pdf_uris (list): GCS URIs of the PDFs in the request.
+        output_uri (str): GCS URI prefix where Document AI writes its output.
+        poller (OperationPoller): Shared poller that watches the operation.
+        timeout (int): Seconds to wait for the operation; by default the
+                       deadline is derived from ``pages``.
+        on_submitted: Optional callback receiving the operation name as soon
+                      as the operation has been accepted.
+        label (str): Name of the request (for logging).
+        pages (int): Pages in the request.
+        project_id (str): Your Google Cloud Project ID, used to delete the
+                          outputs of cancelled operations.
+        slot (tuple): (endpoint, lease id) from pool.acquire(), owned by this
+                      call from now on; taken here when not given.
+
+    Returns:
+        dict: See wait_for_operation.
+    """
+    metrics = get_metrics()
+    latencies = get_operation_latencies()
+    request_class = size_class(pages)
+    deadline = latencies.deadline(pages) if timeout is None else timeout
+    hedge_after = latencies.hedge_after(pages) if HEDGE_OPERATIONS else None
+
+    endpoint, lease_id = slot if slot is not None else pool.acquire()
+    try:
+        operation_name = submit_to_endpoint(pool, endpoint, pdf_uris, output_uri, label)
+    except Exception:
+        pool.release(endpoint, lease_id)
+        raise
+    if on_submitted is not None:
+        on_submitted(operation_name)
+
+    started = time.monotonic()
+    primary = {"endpoint": endpoint, "lease_id": lease_id, "operation_name": operation_name,
+               "submitted_at": started, "watch": poller.watch(operation_name)}
+    attempts = [primary]
+    running = {primary["watch"]: primary}
+    hedge_at = started + hedge_after if hedge_after is not None and hedge_after < deadline else None
+    first_error = None
+    try:
+        with metrics.span("operation_wait", request=label, operation=operation_name):
+            while running:
+                now = time.monotonic()
+                if now >= started + deadline:
+                    break
+                wake = started + deadline if hedge_at is None else min(started + deadline, hedge_at)
+                done, _ = concurrent.futures.wait(
+                    list(running), timeout=wake - now, return_when=concurrent.futures.FIRST_COMPLETED
+                )
+                for watch in done:
+                    attempt = running.pop(watch)
+                    try:
+                        result = operation_result(attempt["operation_name"], watch.result())
+                    except Exception as e:
+                        first_error = first_error or e
+                        continue
+                    # The first success wins; the other attempt is abandoned below
+                    now = time.monotonic()
+                    latencies.record(pages, now - attempt["submitted_at"])
+                    if attempt is not primary:
+                        # The slow primary counts too (as the time it ran before it was
+                        # cancelled), or the fit would only ever see the fast attempts
+                        latencies.record(pages, now - started)
+                        metrics.inc("hedges_won", size_class=request_class)
+                        print(f"  🏁 {label}: the duplicate finished first")
+                    return result
+
+                if hedge_at is not None and running and time.monotonic() >= hedge_at:
+                    hedge_at = None
+                    hedge = start_hedge(pool, pdf_uris, output_uri, poller, label, hedge_after)
+                    metrics.inc("hedges", size_class=request_class,
+                                outcome="submitted" if hedge is not None else "no_slot")
+                    if hedge is not None:
+                        attempts.append(hedge)
+                        running[hedge["watch"]] = hedge
+
+            if not running and first_error is not None:
+                raise first_error
+            # At least this long; leaving expired operations out would bias the fit toward fast ones
+            latencies.record(pages, time.monotonic() - started)
+            metrics.inc("deadlines_expired", size_class=request_class)
+            raise TimeoutError(f"Operation {operation_name} timed out after {deadline:.0f} seconds "
+                               f"({pages} pages); it was cancelled")
+    finally:
+        for attempt in attempts:
+            if attempt["watch"].done():
+                pool.release(attempt["endpoint"], attempt["lease_id"])
+            else:
+                abandon_operation(pool, attempt, project_id, output_uri)
+
+def start_hedge(pool: ProcessorPool, pdf_uris: list, output_uri: str, poller: OperationPoller,
+                label: str, hedge_after: float):
+    """
+    Submit a duplicate of a slow request if an endpoint slot is free right now.
+
+    Returns:
+        dict: The duplicate attempt, or None if no slot was free or the
+              submission failed.
+    """
+    try:
+        endpoint, lease_id = pool.acquire(timeout=0)
+    except TimeoutError:
+        return None
+    try:
+        # A duplicate is not worth waiting out quota errors for
+        operation_name = submit_to_endpoint(pool, endpoint, pdf_uris, output_uri, f"{label} (duplicate)",
+                                            max_retries=0)
+    except Exception as e:
+        pool.release(endpoint, lease_id)
+        print(f"  ⚠️  {label}: could not submit a duplicate: {e}")
+        return None
+    print(f"  🔁 {label}: still running after {hedge_after:.0f} seconds (p95 of its size); "
+          f"submitted a duplicate to {endpoint.endpoint.key}")
+    return {"endpoint": endpoint, "lease_id": lease_id, "operation_name": operation_name,
+            "submitted_at": time.monotonic(), "watch": poller.watch(operation_name)}
+
+def record_submitted_documents(documents: list, path: str):
+    """
+    Count the documents, pages and bytes of one accepted request.
+
+    Args:
+        documents (list): PdfInfo objects in the request.
+        path (str): "batch" or "online".
+    """
+    metrics = get_metrics()
+    metrics.inc("requests_submitted", path=path)
+    metrics.inc("documents_submitted", len(documents), path=path)
+    metrics.inc("pages_submitted", sum(pdf.page_count for pdf in documents), path=path)
+    metrics.inc("bytes_submitted", sum(pdf.size for pdf in documents), path=path)
+
+def mark_request_submitted(manifest: JobManifest, documents: list, operation_name: str,
+                           book: dict = None, path: str = "batch"):
+    """
+    Record an accepted request in the manifest and the metrics.
+
+    A whole file's submission attempts are counted in the manifest. The
+    parts of a split file travel in several requests, so their attempts are
+    counted per part in the book state (book["part_attempts"]) instead.
+    """
+    parts = [pdf for pdf in documents if pdf.source_uri]
+    manifest.mark_submitted(sorted({pdf.uri for pdf in documents if not pdf.source_uri}), operation_name)
+    if parts:
+        manifest.mark_submitted(sorted({pdf.source_uri for pdf in parts}), operation_name, count_attempt=False)
+        if book is not None:
+            for pdf in parts:
+                book["part_attempts"][pdf.uri] = book["part_attempts"].get(pdf.uri, 0) + 1
+    record_submitted_documents(documents, path)
+
+def submit_subdirectory_files(
+    executor: OperationExecutor,
+    pool: ProcessorPool,
+    project_id: str,
+    subdirectory_uri: str,
+    output_base_uri: str,
+    manifest: JobManifest,
+    poller: OperationPoller,
+    online: OnlineProcessor = None,
+    cache: OcrResultCache = None,
+    incremental: bool = False,
+):
+    """
+    List the PDFs of one book, pack the ones not yet processed into requests and
+    queue one Document AI operation per packed request.
+
+    Files whose operation was started by an earlier run are not resubmitted;
+    the executor reattaches to those operations by name instead. Files whose
+    exact bytes were OCR'd before reuse that result, and files that fail the
+    pre-flight checks are dead-lettered; neither uses any quota.
+
+    Args:
+        executor (OperationExecutor): Executor that bounds operations in flight.
+        pool (ProcessorPool): Processor endpoints requests are sent to.
+        project_id (str): Your Google Cloud Project ID.
+        subdirectory_uri (str): GCS URI of the book directory.
+        output_base_uri (str): Base GCS URI for OCR outputs.
+        manifest (JobManifest): Record of which files are already done.
+        poller (OperationPoller): Shared poller that waits for operations.
+        online (OnlineProcessor): Synchronous processor for small PDFs, or None.
+        cache (OcrResultCache): Results of earlier runs keyed by content, or None.
+        incremental (bool): Reconcile the book with the manifest first: reset
+                            changed files and prune outputs of deleted ones.
+
+    Returns:
+        dict: Book state used by collect_completed_operations, or None if the
+              directory has no PDFs.
+    """
+    korean_subdir_name = subdirectory_uri.split('/')[-2]  # Get the subdirectory name
+    english_subdir_name = get_english_book_name(korean_subdir_name)
+    # Create a temporary subdirectory for this book
+    output_uri = f"{output_base_uri}{english_subdir_name}/"
+    output_bucket_prefix = f"gs://{output_base_uri.replace('gs://', '').split('/')[0]}/"
+
+    # Extract bucket name and prefix from subdirectory URI
+    bucket_name = subdirectory_uri.replace("gs://", "").split("/")[0]
+    directory_prefix = "/".join(subdirectory_uri.replace("gs://", "").split("/")[1:])
+
+    # List all PDF files in this directory
+    pdf_blobs = list_pdf_blobs_in_directory(project_id, bucket_name, directory_prefix)
+
+    if incremental:
+        sync = manifest.sync_book(english_subdir_name, source_listing(pdf_blobs, bucket_name))
+        file_indexes = [sync["indexes"][f"gs://{bucket_name}/{blob.name}"] for blob in pdf_blobs]
+        if sync["added"] or sync["changed"] or sync["deleted"]:
+            print(f"  🔄 {korean_subdir_name}: {len(sync['added'])} new, {len(sync['changed'])} changed, "
+                  f"{len(sync['deleted'])} deleted since the last run")
+            prune_stale_outputs(project_id, output_base_uri, english_subdir_name,
+                                sync["changed"], sync["deleted"], manifest)
+    else:
+        file_indexes = range(1, len(pdf_blobs) + 1)
+
+    if not pdf_blobs:
+        print(f"  ⚠️  No PDF files found in {subdirectory_uri}")
+        return None
+
+    # Register every file and skip the ones a previous run already finished
+    sources = {}
+    pending_blobs = []
+    pending_indexes = []
+    shard_sources = {}
+    in_flight_operations = {}
+    done_count = 0
+    dead_letter_count = 0
+    for i, blob in zip(file_indexes, pdf_blobs):
+        pdf_uri = f"gs://{bucket_name}/{blob.name}"
+        sources[i] = pdf_uri
+        manifest.register_file(pdf_uri, english_subdir_name, i, blob.generation, blob_content_key(blob))
+        record = manifest.get(pdf_uri)
+        if record["state"] == STATE_DONE:
+            done_count += 1
+            # Outputs that are still a raw Document AI directory need flattening
+            for output in record["output_uris"]:
+                if output.endswith('/'):
+                    shard_sources[output[len(output_bucket_prefix):]] = i
+            continue
+        if record["state"] == STATE_DEAD_LETTER:
+            dead_letter_count += 1
+            continue
+        if record["state"] == STATE_SUBMITTED and record["operation_name"]:
+            in_flight_operations[i] = record["operation_name"]
+        pending_blobs.append(blob)
+        pending_indexes.append(i)
+
+    if done_count:
+        print(f"  ⏭️  {korean_subdir_name}: skipping {done_count} files already done")
+    if dead_letter_count:
+        print(f"  ⏭️  {korean_subdir_name}: skipping {dead_letter_count} dead-lettered files")
+
+    # Read the size and page count of every file still to process
+    pdf_files = describe_pdf_blobs(pending_blobs, bucket_name, pending_indexes)
+    page_counts = {pdf.file_index: pdf.page_count for pdf in pdf_files}
+    content_keys = {pdf.file_index: pdf.content_key for pdf in pdf_files if pdf.content_key}
+
+    # Identical bytes OCR'd before (under another name, prefix or run) reuse that result
+    cached_count = 0
+    if cache is not None:
+        for pdf in list(pdf_files):
+            if pdf.file_index in in_flight_operations:
+                continue
+            output_dir = reuse_cached_result(project_id, cache, pdf, output_uri)
+            if output_dir is None:
+                continue
+            shard_sources[output_dir[len(output_bucket_prefix):]] = pdf.file_index
+            manifest.mark_done(pdf.uri, [output_dir])
+            pdf_files.remove(pdf)
+            cached_count += 1
+    if cached_count:
+        get_metrics().inc("cache_hits", cached_count)
+        print(f"  ♻️  {korean_subdir_name}: reused {cached_count} cached OCR results")
+
+    # Pre-flight: files that can never succeed do not take an operation slot
+    _, _, doomed = preflight_pdfs(pdf_files, PROCESSOR_LIMITS)
+    for pdf, reason in doomed:
+        print(f"    🚫 Dead-lettered before submission: {pdf.filename}: {reason}")
+        get_metrics().inc("failures", stage="preflight", failure_class=FAILURE_PERMANENT)
+        manifest.mark_dead_letter(pdf.uri, reason)
+        pdf_files.remove(pdf)
+
+    # Reattach to operations a previous run started. Split files are redone,
+    # because their parts cannot be matched back from the manifest.
+    reattached = {}
+    for pdf in list(pdf_files):
+        operation_name = in_flight_operations.get(pdf.file_index)
+        if operation_name and PROCESSOR_LIMITS.document_fits(pdf):
+            reattached.setdefault(operation_name, []).append(pdf)
+            pdf_files.remove(pdf)
+
+    for operation_name, reattached_files in reattached.items():
+        executor.track(
+            watch_operation_result(poller, operation_name),
+            tag=(english_subdir_name, "reattached", reattached_files),
+        )
+    if reattached:
+        print(f"  🔗 {korean_subdir_name}: reattached to {len(reattached)} running operations")
+
+    book = {
+        "korean_name": korean_subdir_name,
+        "english_name": english_subdir_name,
+        "total": len(pdf_blobs),
+        "remaining": len(reattached),
+        "succeeded": done_count + cached_count,
+        "failed": dead_letter_count + len(doomed),
+        "sources": sources,
+        "page_counts": page_counts,
+        "content_keys": content_keys,
+        "shard_sources": shard_sources,
+        "split_files": {},
+        "input_bucket": bucket_name,
+        "output_uri": output_uri,
+        "packs_submitted": 0,
+        # Split part URI -> requests it was submitted in (see mark_request_submitted)
+        "part_attempts": {},
+        # Document URI -> time.monotonic() when it was queued, for per-file spans
+        "queued_at": {pdf.uri: time.monotonic() for files in reattached.values() for pdf in files},
+    }
+    book["remaining"] += queue_book_documents(
+        executor, pool, project_id, poller, manifest, book, pdf_files, online
+    )
+    return book
+
+def prune_stale_outputs(project_id: str, output_base_uri: str, english_book_name: str,
+                        changed: list, deleted: list, manifest: JobManifest):
+    """
+    Delete the outputs of changed and deleted source files.
+
+    Outputs of changed files are replaced once the new version is processed;
+    deleted files are also dropped from the book's catalog and the manifest.
+
+    Args:
+        changed (list): Manifest records (before reset) of changed files.
+        deleted (list): Manifest records of files whose source is gone.
+
+    Returns:
+        int: Number of output objects deleted.
+    """
+    bucket_name_output = output_base_uri.replace("gs://", "").split("/")[0]
+    output_prefix = "/".join(output_base_uri.replace("gs://", "").split("/")[1:])
+
+    stale_uris = [uri for record in changed + deleted for uri in record["output_uris"]]
+    pruned = prune_output_uris(get_storage_client(project_id), stale_uris) if stale_uris else 0
+
+    if OUTPUT_LAYOUT == "catalog":
+        removed_files = [record["file_index"] for record in changed + deleted if record["file_index"]]
+        if removed_files:
+            write_book_catalog(get_bucket(project_id, bucket_name_output), output_prefix,
+                               english_book_name, {}, removed_files=removed_files)
+    if deleted:
+        manifest.remove_files([record["source_uri"] for record in deleted])
+    if pruned:
+        print(f"  🧹 {english_book_name}: pruned {pruned} stale output files")
+    return pruned
+
+def prune_deleted_books(project_id: str, output_base_uri: str, manifest: JobManifest, listed_books):
+    """
+    Prune every book recorded in the manifest whose input directory is gone.
+
+    Args:
+        listed_books: English names of the books found in the input listing.
+
+    Returns:
+        list: English names of the books that were pruned.
+    """
+    bucket_name_output = output_base_uri.replace("gs://", "").split("/")[0]
+    output_prefix = "/".join(output_base_uri.replace("gs://", "").split("/")[1:])
+
+    pruned_books = []
+    for english_name in manifest.books():
+        if english_name in listed_books:
+            continue
+        print(f"  🧹 {english_name}: input directory deleted, pruning its outputs")
+        prune_stale_outputs(project_id, output_base_uri, english_name, [],
+                            manifest.files(book=english_name), manifest)
+        if OUTPUT_LAYOUT == "catalog":
+            try:
+                get_bucket(project_id, bucket_name_output).blob(
+                    catalog_object_name(output_prefix, english_name)
+                ).delete()
+            except Exception:
+                pass  # No catalog was written for this book
+        pruned_books.append(english_name)
+    return pruned_books
+
+def queue_book_documents(
+    executor: OperationExecutor,
+    pool: ProcessorPool,
+    project_id: str,
+    poller: OperationPoller,
+    manifest: JobManifest,
+    book: dict,
+    pdf_files: list,
+    online: OnlineProcessor = None,
+):
+    """
+    Split, pack and queue PDFs of one book; used for first submissions and
+    for files sent back by the failure classifier.
+
+    Args:
+        pdf_files (list): PdfInfo objects (whole files or split parts) that
+                          passed the pre-flight checks.
+        online (OnlineProcessor): Synchronous processor for small PDFs, or None.
+
+    Returns:
+        int: Number of requests (batch operations and online calls) queued.
+    """
+    english_subdir_name = book["english_name"]
+    queued_at = time.monotonic()
+    for pdf in pdf_files:
+        book["queued_at"].setdefault(pdf.uri, queued_at)
+
+    # Small PDFs are processed synchronously; their results are collected
+    # through the executor like batch operations but use no batch slot
+    online_files = []
+    if online is not None:
+        online_files = [
+            pdf for pdf in pdf_files if is_online_candidate(pdf, ONLINE_MAX_PAGES, ONLINE_MAX_BYTES)
+        ]
+    if online_files:
+        output_bucket_prefix = f"gs://{online.output_bucket.name}/"
+        book_output_prefix = book["output_uri"][len(output_bucket_prefix):]
+        for pdf in online_files:
+            output_dir = f"{book_output_prefix}{ONLINE_OUTPUT_DIRECTORY}{pdf.file_index:03d}/"
+            # No operation name: nothing to reattach to if the run is interrupted
+            mark_request_submitted(manifest, [pdf], None, book, "online")
+            executor.track(
+                online.submit(pdf, output_dir),
+                tag=(english_subdir_name, f"online {pdf.file_index:3d}", [pdf]),
+            )
+        print(f"  ⚡ {book['korean_name']}: processing {len(online_files)} small PDF files synchronously")
+        pdf_files = [pdf for pdf in pdf_files if pdf not in online_files]
+
+    # Split PDFs over the processor limits into page-range parts
+    documents, split_files, unsplittable = split_oversize_pdfs(
+        project_id, book["input_bucket"], pdf_files, f"{GCS_SPLIT_PREFIX}{english_subdir_name}/"
+    )
+    book["split_files"].update(split_files)
+    for pdf, failure_class, reason in unsplittable:
+        get_metrics().inc("failures", stage="split", failure_class=failure_class)
+        if failure_class == FAILURE_PERMANENT:
+            manifest.mark_dead_letter(pdf.uri, reason)
+        else:
+            manifest.mark_failed(pdf.uri, reason)
+        book["failed"] += 1
+
+    packed_requests = pack_pdfs(documents, PROCESSOR_LIMITS)
+    if packed_requests:
+        print(f"  📄 {book['korean_name']}: queued {len(pdf_files)} PDF files "
+              f"({len(documents)} documents) in {len(packed_requests)} requests")
+
+    first_pack = book["packs_submitted"] + 1
+    last_pack = book["packs_submitted"] + len(packed_requests)
+    book_pages = sum(book["page_counts"].values())
+    for i, packed in enumerate(packed_requests, first_pack):
+        # One output directory per request; Document AI adds <operation>/<index>/ below it
+        pack_output_uri = f"{book['output_uri']}pack_{i:03d}/"
+        request_label = f"request {i:3d}/{last_pack:3d}"
+        executor.submit(
+            run_batch_operation, pool, packed.uris, pack_output_uri, poller,
+            on_submitted=lambda name, documents=packed.documents: mark_request_submitted(
+                manifest, documents, name, book),
+            label=f"{english_subdir_name} {request_label.strip()}",
+            pages=packed.total_pages,
+            project_id=project_id,
+            tag=(english_subdir_name, request_label, packed.documents),
+            priority=request_priority(SCHEDULING_POLICY, packed.documents, book_pages),
+        )
+    book["packs_submitted"] = last_pack
+
+    return len(online_files) + len(packed_requests)
+
+def split_oversize_pdfs(project_id: str, bucket_name: str, pdf_files: list, staging_prefix: str):
+    """
+    Replace every PDF over the per-document limits with page-range parts.
+
+    Args:
+        project_id (str): Your Google Cloud Project ID.
+        bucket_name (str): The input GCS bucket name.
+        pdf_files (list): PdfInfo objects of one book.
+        staging_prefix (str): Object prefix where the parts are uploaded.
+
+    Returns:
+        tuple: (documents to submit, split state keyed by file number,
+                [(PdfInfo, failure class, reason)] for files that could not be split)
+    """
+    documents = []
+    split_files = {}
+    unsplittable = []
+    bucket = get_bucket(project_id, bucket_name)
+
+    for pdf in pdf_files:
+        if PROCESSOR_LIMITS.document_fits(pdf):
+            documents.append(pdf)
+            continue
+
+        print(f"    ✂️  Splitting oversize file: {pdf.filename} "
+              f"({pdf.size / 1024 / 1024:.1f} MB, {pdf.page_count} pages)")
+        try:
+            parts = split_pdf_to_gcs(bucket, pdf, PROCESSOR_LIMITS, staging_prefix)
+        except Exception as e:
+            # Submitting it whole would only fail again with "File too large"
+            print(f"    ❌ Could not split {pdf.filename}: {e}")
+            unsplittable.append((pdf, FAILURE_OVERSIZE, f"could not split: {e}"))
+            continue
+
+        # A part over the limits is a single page that cannot be split further
+        part_checks = [preflight_check(part, PROCESSOR_LIMITS) for part in parts]
+        doomed_parts = [check for check in part_checks if check[0] is not None]
+        if doomed_parts:
+            failure_class, reason = doomed_parts[0]
+            print(f"    🚫 {pdf.filename}: {reason}")
+            delete_split_parts(bucket, parts)
+            unsplittable.append((pdf, failure_class, reason))
+            continue
+
+        print(f"       -> {len(parts)} parts")
+        documents.extend(parts)
+        split_files[pdf.file_index] = {
+            "pdf": pdf,
+            "parts": parts,
+            "outputs": [],
+            "failed": False,
+        }
+
+    return documents, split_files, unsplittable
+
+def stitch_split_files(project_id: str, bucket_name: str, output_prefix: str, book: dict, manifest: JobManifest):
+    """
+    Stitch the part outputs of every split PDF of a book into one document each.
+
+    The stitched shards are written to {book}/split_{NNN}/ and registered in
+    the book's shard_sources, so flattening names them like any other file.
+    """
+    if not book["split_files"]:
+        return
+
+    bucket = get_bucket(project_id, bucket_name)
+    input_bucket = get_bucket(project_id, book["input_bucket"])
+    english_name = book["english_name"]
+
+    for file_index, split in sorted(book["split_files"].items()):
+        pdf = split["pdf"]
+        if split["failed"] or len(split["outputs"]) != len(split["parts"]):
+            print(f"  ❌ Not all parts of {pdf.filename} were processed; skipping stitch")
+            manifest.mark_failed(pdf.uri, "not all split parts were processed")
+            book["failed"] += 1
+            continue
+
+        destination_prefix = f"{output_prefix}{english_name}/split_{file_index:03d}/"
+        stem = os.path.splitext(pdf.filename)[0]
+        try:
+            stitched = stitch_part_outputs(bucket, split["outputs"], destination_prefix, stem)
+        except Exception as e:
+            print(f"  ❌ Error stitching {pdf.filename}: {e}")
+            manifest.mark_failed(pdf.uri, f"stitching failed: {e}")
+            book["failed"] += 1
+            continue
+
+        print(f"  🧵 Stitched {len(split['parts'])} parts of {pdf.filename} into {len(stitched)} shards")
+        book["shard_sources"][destination_prefix] = file_index
+        book["succeeded"] += 1
+        manifest.mark_done(pdf.uri, [f"gs://{bucket_name}/{destination_prefix}"])
+        delete_split_parts(input_bucket, split["parts"])
+
+def route_failed_document(book: dict, pdf, failure, manifest: JobManifest):
+    """
+    Send a document that failed to the retry queue, the split path or the dead letters.
+
+    Args:
+        book (dict): Book state from submit_subdirectory_files.
+        pdf (PdfInfo): The failed document (a whole file or a split part).
+        failure: The exception raised by its request, or its error message.
+        manifest (JobManifest): Manifest to update.
+
+    Returns:
+        bool: True if the document should be queued again.
+    """
+    error_msg = str(failure)
+    failure_class = classify_failure(failure)
+    source_uri = pdf.source_uri or pdf.uri
+    split = book["split_files"].get(pdf.file_index) if pdf.source_uri else None
+    if split is not None:
+        attempts = book["part_attempts"].get(pdf.uri, 0)
+    else:
+        attempts = (manifest.get(source_uri) or {}).get("attempts", 0)
+    get_metrics().inc("failures", stage="operation", failure_class=failure_class)
+
+    if failure_class == FAILURE_OVERSIZE and split is None:
+        # The processor knows the real size; split the file on the next pass
+        apply_oversize_details(pdf, error_msg, PROCESSOR_LIMITS)
+        print(f"    ✂️  Oversize, sending to split: {pdf.filename}")
+        return True
+    if failure_class == FAILURE_RETRYABLE and attempts < MAX_SUBMISSION_ATTEMPTS:
+        get_metrics().inc("submission_retries", path="requeue")
+        print(f"    🔁 Retrying {pdf.filename} (attempt {attempts + 1}/{MAX_SUBMISSION_ATTEMPTS}): {error_msg[:100]}")
+        return True
+
+    if split is not None:
+        # Counted (and recorded) once for the whole file when the book is finalized
+        split["failed"] = True
+        return False
+    if failure_class == FAILURE_PERMANENT:
+        print(f"    🚫 Dead-lettered: {pdf.filename}: {error_msg[:100]}")
+        manifest.mark_dead_letter(pdf.uri, error_msg)
+    else:
+        print(f"    ❌ Failed: {pdf.filename}: {error_msg[:100]}")
+        manifest.mark_failed(pdf.uri, error_msg)
+    book["failed"] += 1
+    return False
+
+def record_operation_result(book: dict, documents: list, result, error, output_bucket: str, manifest: JobManifest):
+    """
+    Record the outcome of one finished request in the book state and the manifest.
+
     Args:
-        project_id (str): Your Google Cloud Project ID.
-        bucket_name (str): The GCS bucket name.
-        prefix (str): The prefix to search under.
-    
+        book (dict): Book state from submit_subdirectory_files.
+        documents (list): PdfInfo objects that were in the request.
+        result (dict): Return value of run_batch_operation, or None on error.
+        error (Exception): The error raised by the request, if any.
+        output_bucket (str): Output GCS bucket name.
+        manifest (JobManifest): Manifest to update.
+
     Returns:
-        list: List of subdirectory paths.
+        list: Documents the failure classifier sent back to be queued again.
     """
-    storage_client = storage.Client(project=project_id)
-    bucket = storage_client.bucket(bucket_name)
-    
-    # For the Korean directories, we need to extract the actual directory prefixes
-    # from the blob names due to Unicode normalization issues
-    if prefix == "주석/":
-        print("🔍 Extracting actual Korean directory prefixes from blob names...")
-        
-        # List all blobs and extract unique directory prefixes
-        all_blobs = bucket.list_blobs()
-        subdirectories = set()
-        blob_count = 0
-        
-        for blob in all_blobs:
-            blob_count += 1
-            # Debug: show first few blobs
-            if blob_count <= 5:
-                print(f"  Debug - Blob {blob_count}: {blob.name}")
-            
-            if '주' in blob.name:  # Look for blobs containing Korean characters
-                # Debug: show Korean files found
-                if len(subdirectories) < 5:
-                    print(f"  Korean file found: {blob.name}")
-                
-                # Extract directory path (first two levels: 주석/XX_name/)
-                parts = blob.name.split('/')
-                if len(parts) >= 3 and parts[0] and parts[1]:  # Has at least 주석/directory/file
-                    subdir_path = '/'.join(parts[:2]) + '/'
-                    subdirectories.add(subdir_path)
-                    if len(subdirectories) <= 3:
-                        print(f"  Adding subdirectory: {subdir_path}")
-        
-        result = sorted(list(subdirectories))
-        print(f"📁 Found {len(result)} subdirectories with actual Korean prefixes")
-        print(f"📊 Total blobs checked: {blob_count}")
-        return result
-    
-    # For other prefixes, use the general approach
-    blobs = bucket.list_blobs(prefix=prefix)
-    
-    subdirectories = set()
-    
-    for blob in blobs:
-        # Extract the directory path from the file path
-        relative_path = blob.name[len(prefix):]  # Remove the prefix
-        if '/' in relative_path:
-            # Get the first directory level after the prefix
-            first_dir = relative_path.split('/')[0]
-            if first_dir:  # Make sure it's not empty
-                subdir_path = prefix + first_dir + '/'
-                subdirectories.add(subdir_path)
-    
-    return sorted(list(subdirectories))
+    bucket_prefix = f"gs://{output_bucket}/"
+    requeue = []
+    metrics = get_metrics()
+    for pdf in documents:
+        split = book["split_files"].get(pdf.file_index) if pdf.source_uri else None
+        if error is not None:
+            output_dir = None
+            failure = error
+        else:
+            output_dir = result["outputs"].get(pdf.uri)
+            failure = result["failures"].get(pdf.uri, "no output reported")
 
-# --- Helper Function to List PDF Files in a Subdirectory ---
-def list_pdf_files_in_directory(project_id: str, bucket_name: str, prefix: str):
+        # Per-file span: from queueing to the result (including retries)
+        queued_at = book["queued_at"].pop(pdf.uri, None)
+        if output_dir is None:
+            retry = route_failed_document(book, pdf, failure, manifest)
+            if retry:
+                requeue.append(pdf)
+            outcome = "retry" if retry else "failed"
+        else:
+            outcome = "ok"
+        if queued_at is not None:
+            metrics.record_span(
+                "file", time.monotonic() - queued_at, outcome=outcome, book=book["english_name"],
+                file=pdf.filename, pages=pdf.page_count, bytes=pdf.size,
+            )
+        if output_dir is None:
+            continue
+
+        if split is not None:
+            # Parts are counted once the whole file has been stitched
+            split["outputs"].append((pdf.page_offset, output_dir[len(bucket_prefix):]))
+            continue
+
+        # Remember which source file each output directory belongs to
+        book["shard_sources"][output_dir[len(bucket_prefix):]] = pdf.file_index
+        manifest.mark_done(pdf.uri, [output_dir])
+        book["succeeded"] += 1
+
+    return requeue
+
+def catalog_book_outputs(project_id: str, bucket_name: str, output_prefix: str, book: dict, manifest: JobManifest):
     """
-    Lists all PDF files in a specific GCS directory.
-    
+    Record where a book's outputs live in its catalog instead of moving them.
+
+    Whole files map to their output directory's shards; split files keep
+    their per-part outputs, each tagged with the page range of the original
+    PDF it covers, so no stitching is needed.
+
+    Returns:
+        dict: Source file number -> shard URIs written to the catalog.
+    """
+    bucket = get_bucket(project_id, bucket_name)
+    input_bucket = get_bucket(project_id, book["input_bucket"])
+    english_name = book["english_name"]
+
+    # (output directory, first page, last page) per source file
+    file_parts = {}
+    for output_dir, file_index in book["shard_sources"].items():
+        page_count = book["page_counts"].get(file_index)
+        file_parts.setdefault(file_index, []).append((output_dir, 1 if page_count else None, page_count))
+
+    for file_index, split in sorted(book["split_files"].items()):
+        pdf = split["pdf"]
+        if split["failed"] or len(split["outputs"]) != len(split["parts"]):
+            print(f"  ❌ Not all parts of {pdf.filename} were processed")
+            manifest.mark_failed(pdf.uri, "not all split parts were processed")
+            book["failed"] += 1
+            continue
+        part_pages = {part.page_offset: part.page_count for part in split["parts"]}
+        file_parts[file_index] = [
+            (output_dir, page_offset + 1, page_offset + part_pages[page_offset])
+            for page_offset, output_dir in split["outputs"]
+        ]
+        book["succeeded"] += 1
+
+    if not file_parts:
+        return {}
+
+    shards = list_output_shards(bucket, sorted({part[0] for parts in file_parts.values() for part in parts}))
+    entries = {
+        file_index: build_file_entry(bucket_name, book["sources"][file_index], parts, shards)
+        for file_index, parts in file_parts.items()
+    }
+    catalog_uri = write_book_catalog(bucket, output_prefix, english_name, entries)
+    print(f"  🗂️  Catalogued {len(entries)} files for {english_name}: {catalog_uri}")
+
+    cataloged = {}
+    for file_index, entry in entries.items():
+        cataloged[file_index] = [uri for part in entry["parts"] for uri in part["shards"]]
+    for file_index, split in book["split_files"].items():
+        if file_index in entries:
+            delete_split_parts(input_bucket, split["parts"])
+    return cataloged
+
+def finalize_book(book: dict, project_id: str, output_base_uri: str, manifest: JobManifest,
+                  cache: OcrResultCache = None, assemble: bool = None):
+    """
+    Publish the outputs of a book whose files are all finished, either by
+    writing its catalog or by stitching split files and flattening, and
+    record each published single-document result in the OCR cache.
+
+    The book's text is assembled afterwards if ``assemble`` is set
+    (ASSEMBLE_BOOK_TEXT by default); the staged run assembles it in its own
+    stage instead.
+
+    Returns:
+        bool: True if at least one file of the book succeeded.
+    """
+    bucket_name_output = output_base_uri.replace("gs://", "").split("/")[0]
+    output_prefix = "/".join(output_base_uri.replace("gs://", "").split("/")[1:])
+    korean_name = book["korean_name"]
+    english_name = book["english_name"]
+    metrics = get_metrics()
+
+    if OUTPUT_LAYOUT == "catalog":
+        with metrics.span("catalog", book=english_name):
+            published = catalog_book_outputs(project_id, bucket_name_output, output_prefix, book, manifest)
+    else:
+        with metrics.span("stitch", book=english_name):
+            stitch_split_files(project_id, bucket_name_output, output_prefix, book, manifest)
+        published = None
+    metrics.inc("books_finished")
+
+    if book["succeeded"] == 0:
+        print(f"  ❌ All files failed for {korean_name}")
+        return False
+
+    print(f"✅ Document AI processing completed: {korean_name} -> {english_name}")
+    print(f"   📊 Successfully processed {book['succeeded']}/{book['total']} files")
+
+    if published is None:
+        if not book["shard_sources"]:
+            print(f"  ⏭️  Outputs for {english_name} are already flattened")
+            return True
+
+        # Post-process: flatten directory structure and rename files
+        print(f"  🔄 Post-processing: flattening outputs and adding prefixes...")
+        with metrics.span("flatten", book=english_name):
+            published = flatten_and_rename_outputs(
+                project_id=project_id,
+                bucket_name=bucket_name_output,
+                output_prefix=output_prefix,
+                english_book_name=english_name,
+                shard_sources=book["shard_sources"],
+            )
+
+    for file_index, output_uris in published.items():
+        if file_index in book["sources"] and output_uris:
+            manifest.mark_done(book["sources"][file_index], output_uris)
+            # Catalogued split files are several part documents, not one cacheable result
+            if cache is not None and not (OUTPUT_LAYOUT == "catalog" and file_index in book["split_files"]):
+                cache.record(book["content_keys"].get(file_index), book["sources"][file_index], output_uris)
+
+    if ASSEMBLE_BOOK_TEXT if assemble is None else assemble:
+        assemble_book(project_id, bucket_name_output, output_prefix, english_name)
+
+    print(f"✅ Completed processing: {korean_name} -> {english_name}")
+    return True
+
+def assemble_book(project_id: str, bucket_name: str, output_prefix: str, english_book_name: str):
+    """
+    Assemble a book's published outputs into one text and page table.
+
+    Returns:
+        dict: Result of book_assembly.assemble_book_text, or None if the
+              book has no outputs or assembly failed.
+    """
+    try:
+        with get_metrics().span("assemble", book=english_book_name):
+            assembled = assemble_book_text(
+                get_bucket(project_id, bucket_name), output_prefix, english_book_name,
+                layout=OUTPUT_LAYOUT, max_workers=ASSEMBLY_WORKERS,
+            )
+    except Exception as e:
+        print(f"  ❌ Error assembling the text of {english_book_name}: {e}")
+        return None
+    if assembled is None:
+        print(f"  ⚠️  No outputs to assemble for {english_book_name}")
+        return None
+    print(f"  📖 Assembled {assembled['pages']} pages from {assembled['shards']} shards: {assembled['text_uri']}")
+    return assembled
+
+# Request label of the executor tag that announces a book discovered while
+# operations are being collected; its future holds the book state
+BOOK_QUEUED = "book queued"
+
+def track_queued_book(executor: OperationExecutor, book: dict):
+    """Hand a book whose requests are all queued to collect_completed_operations."""
+    future = concurrent.futures.Future()
+    future.set_result(book)
+    executor.track(future, tag=(book["english_name"], BOOK_QUEUED, []))
+
+def collect_completed_operations(
+    executor: OperationExecutor,
+    books: dict,
+    project_id: str,
+    output_base_uri: str,
+    manifest: JobManifest,
+    requeue=None,
+    cache: OcrResultCache = None,
+    publish=None,
+):
+    """
+    Collect operations as they finish and flatten each book once all its files are done.
+
+    Books may also arrive while collecting (see track_queued_book); results
+    of their operations that finish first are held until the book arrives.
+    Futures tracked with the tag None only keep the collection going until
+    they are done (e.g. until discovery has finished).
+
     Args:
+        executor (OperationExecutor): Executor holding the queued operations.
+        books (dict): English book name -> book state from submit_subdirectory_files.
         project_id (str): Your Google Cloud Project ID.
-        bucket_name (str): The GCS bucket name.
-        prefix (str): The directory prefix to search in.
-    
+        output_base_uri (str): Base GCS URI for OCR outputs.
+        manifest (JobManifest): Manifest updated as files finish.
+        requeue: Callable (book, documents) -> number of requests queued, used
+                 for documents the failure classifier sends back; without it
+                 those documents are recorded as failed.
+        cache (OcrResultCache): Cache that finished results are recorded in, or None.
+        publish: Callable taking each finished book (e.g. a pipeline stage's
+                 put); by default books are finalized on the collecting thread.
+
     Returns:
-        list: List of PDF file URIs.
+        dict: English book name -> True if at least one file succeeded, for
+              the books finalized here.
     """
-    storage_client = storage.Client(project=project_id)
-    bucket = storage_client.bucket(bucket_name)
-    
-    # List all blobs with the prefix
-    blobs = bucket.list_blobs(prefix=prefix)
-    
-    pdf_files = []
-    for blob in blobs:
-        if blob.name.lower().endswith('.pdf'):
-            pdf_uri = f"gs://{bucket_name}/{blob.name}"
-            pdf_files.append(pdf_uri)
-    
-    return pdf_files
+    results = {}
+    bucket_name_output = output_base_uri.replace("gs://", "").split("/")[0]
+    # Results of operations whose book has not arrived yet
+    early_results = {}
+
+    def book_finished(book):
+        if publish is not None:
+            publish(book)
+        else:
+            results[book["english_name"]] = finalize_book(book, project_id, output_base_uri, manifest, cache)
+
+    def record_result(book, request_label, documents, future):
+        label = f"[{book['english_name']} {request_label}]"
+        try:
+            result = future.result()
+            error = None
+        except Exception as e:
+            result = None
+            error = e
+            error_msg = str(error)
+            if len(error_msg) > 100:
+                error_msg = error_msg[:100] + "..."
+            print(f"  ❌ {label} Failed ({len(documents)} files): {error_msg}")
+            get_metrics().inc("requests_finished", outcome="error")
+        else:
+            get_metrics().inc("requests_finished", outcome="ok")
+            print(f"  ✅ {label} Completed {len(documents)} files"
+                  f" (in flight: {executor.in_flight})")
+
+        retry_documents = record_operation_result(book, documents, result, error, bucket_name_output, manifest)
+        if retry_documents and requeue is not None:
+            book["remaining"] += requeue(book, retry_documents)
+        else:
+            for pdf in retry_documents:
+                manifest.mark_failed(pdf.source_uri or pdf.uri, "not retried")
+                book["failed"] += 1
+
+        book["remaining"] -= 1
+
+    # Books with nothing left to submit only need their leftover outputs flattened
+    for book in list(books.values()):
+        if book["remaining"] == 0:
+            book_finished(book)
+
+    for tag, future in executor.as_completed():
+        if tag is None:
+            continue
+        english_name, request_label, documents = tag
+        if request_label == BOOK_QUEUED:
+            book = books[english_name] = future.result()
+            for early in early_results.pop(english_name, []):
+                record_result(book, *early)
+        elif english_name not in books:
+            early_results.setdefault(english_name, []).append((request_label, documents, future))
+            continue
+        else:
+            book = books[english_name]
+            record_result(book, request_label, documents, future)
+
+        if book["remaining"] == 0:
+            # Every file of this book has finished; post-process it right away
+            book_finished(book)
+
+    for english_name, early in early_results.items():
+        print(f"  ⚠️  {len(early)} finished requests of {english_name} were not recorded;"
+              f" the book was never fully queued (its files are retried next run)")
+
+    return results
 
 # --- Helper Function to Process Individual Subdirectories ---
 def batch_transcribe_subdirectory(
@@ -208,121 +1662,52 @@ def batch_transcribe_subdirectory(
     processor_id: str,
     subdirectory_uri: str,
     output_base_uri: str,
+    max_in_flight: int = MAX_CONCURRENT_OPERATIONS,
+    manifest_path: str = MANIFEST_PATH,
+    incremental: bool = INCREMENTAL_MODE,
+    endpoints: list = None,
 ):
     """
-    Process a single subdirectory for batch OCR (file-by-file to avoid timeouts).
+    Process a single subdirectory for batch OCR, keeping up to max_in_flight
+    file operations running at once and skipping files already done.
+
+    With ``endpoints`` the operations are spread over those processors
+    (each with its own limits) instead of processor_id in location.
     """
+    # Before the first client is created: the pool size only applies to new clients
+    configure_client_pools(STORAGE_CONNECTION_POOL_SIZE)
     try:
-        # Initialize Document AI client
-        opts = ClientOptions(api_endpoint=f"{location}-documentai.googleapis.com")
-        client = documentai.DocumentProcessorServiceClient(client_options=opts)
-
-        # Get the full resource name of the processor
-        processor_name = client.processor_path(project_id, location, processor_id)
-
-        # Create output URI for this subdirectory (Document AI will create its own structure)
-        korean_subdir_name = subdirectory_uri.split('/')[-2]  # Get the subdirectory name
-        english_subdir_name = get_english_book_name(korean_subdir_name)
-        # Create a temporary subdirectory for this book
-        output_uri = f"{output_base_uri}{english_subdir_name}/"
-
-        # Extract bucket name and prefix from subdirectory URI
-        bucket_name = subdirectory_uri.replace("gs://", "").split("/")[0]
-        directory_prefix = "/".join(subdirectory_uri.replace("gs://", "").split("/")[1:])
-        
-        # List all PDF files in this directory
-        pdf_files = list_pdf_files_in_directory(project_id, bucket_name, directory_prefix)
-        
-        if not pdf_files:
-            print(f"  ⚠️  No PDF files found in {subdirectory_uri}")
-            return False
-        
-        print(f"  📄 Found {len(pdf_files)} PDF files")
-
-        # Process files individually to avoid timeouts
-        success_count = 0
-        failed_count = 0
-        
-        for i, pdf_file in enumerate(pdf_files, 1):
-            filename = pdf_file.split('/')[-1]
-            print(f"  📄 [{i:3d}/{len(pdf_files):3d}] Processing: {filename}")
-            
-            # Configure the input document (single file)
-            gcs_documents = [
-                documentai.GcsDocument(
-                    gcs_uri=pdf_file,
-                    mime_type="application/pdf"
-                )
-            ]
+        endpoints = run_endpoints(endpoints, processor_id, location, max_in_flight)
 
-            input_config = documentai.BatchDocumentsInputConfig(
-                gcs_documents=documentai.GcsDocuments(documents=gcs_documents)
+        with ProcessorPool(project_id, endpoints, get_documentai_client, QUOTA_DB_PATH,
+                             adaptive=ADAPTIVE_CONCURRENCY) as pool, \
+                JobManifest(manifest_path, output_base_uri) as manifest, \
+                open_ocr_cache(pool.primary.client, pool.primary.processor_name) as cache, \
+                open_operation_poller(pool) as poller, \
+                OperationExecutor(max_in_flight=pool.capacity, slots=pool) as executor:
+            online = create_online_processor(
+                pool.primary.client, pool.primary.processor_name, project_id, output_base_uri
+            )
+            reattach_unfinished_operations(executor, manifest, poller, pool)
+            book = submit_subdirectory_files(
+                executor, pool, project_id, subdirectory_uri,
+                output_base_uri, manifest, poller, online, cache, incremental,
             )
+            if book is None:
+                return False
 
-            # Configure the output location in GCS (individual file output)
-            file_output_uri = f"{output_uri}file_{i:03d}/"
-            output_config = documentai.DocumentOutputConfig(
-                gcs_output_config=documentai.DocumentOutputConfig.GcsOutputConfig(
-                    gcs_uri=file_output_uri
+            def requeue(book, documents):
+                return queue_book_documents(
+                    executor, pool, project_id, poller, manifest, book, documents, online
                 )
-            )
 
-            ocr_config = documentai.OcrConfig(
-                hints=documentai.OcrConfig.Hints(language_hints=["ko"])
-            )
-            process_options = documentai.ProcessOptions(ocr_config=ocr_config)
-            # Create the batch processing request (for single file)
-            request = documentai.BatchProcessRequest(
-                name=processor_name,
-                input_documents=input_config,
-                document_output_config=output_config,
-                process_options=process_options,
+            results = collect_completed_operations(
+                executor, {book["english_name"]: book}, project_id, output_base_uri, manifest, requeue, cache
             )
+            if online is not None:
+                online.shutdown()
 
-            print(f"      🚀 Starting Document AI processing...")
-
-            try:
-                # Send the batch processing request (asynchronous operation)
-                operation = client.batch_process_documents(request)
-
-                print(f"      ⏳ Waiting for completion (timeout: 15 minutes)...")
-
-                # Wait for the operation to complete with timeout (900 seconds = 15 minutes)
-                operation.result(timeout=900)
-                print(f"      ✅ Completed successfully")
-                success_count += 1
-                
-            except Exception as error:
-                error_msg = str(error)
-                if len(error_msg) > 100:
-                    error_msg = error_msg[:100] + "..."
-                print(f"      ❌ Failed: {error_msg}")
-                print(f"      📝 Continuing with next file...")
-                failed_count += 1
-                continue  # Continue with next file
-
-        if success_count == 0:
-            print(f"  ❌ All files failed for {korean_subdir_name}")
-            return False
-
-        print(f"  📊 File processing summary: {success_count} succeeded, {failed_count} failed")
-        print(f"✅ Document AI processing completed: {korean_subdir_name} -> {english_subdir_name}")
-        print(f"   📊 Successfully processed {success_count}/{len(pdf_files)} files")
-        
-        # Post-process: flatten directory structure and rename files
-        print(f"  🔄 Post-processing: flattening outputs and adding prefixes...")
-        bucket_name_output = output_base_uri.replace("gs://", "").split("/")[0]
-        output_prefix = "/".join(output_base_uri.replace("gs://", "").split("/")[1:])
-        
-        flatten_and_rename_outputs(
-            project_id=project_id,
-            bucket_name=bucket_name_output,
-            output_prefix=output_prefix,
-            english_book_name=english_subdir_name
-        )
-        
-        print(f"✅ Completed processing: {korean_subdir_name} -> {english_subdir_name}")
-        return True
+        return results.get(book["english_name"], False)
 
     except Exception as e:
         print(f"❌ Error processing {subdirectory_uri}: {e}")
@@ -333,134 +1718,134 @@ def flatten_and_rename_outputs(
     project_id: str,
     bucket_name: str,
     output_prefix: str,
-    english_book_name: str
+    english_book_name: str,
+    shard_sources: dict = None,
 ):
     """
     Move and rename output files from Document AI to flatten directory structure
     and add English book name prefixes.
+
+    Copies run concurrently (FLATTEN_WORKERS at a time) and resume from saved
+    rewrite tokens if a previous run was interrupted; the originals and empty
+    directory markers are removed with batched deletes.
     
     Args:
         project_id: Google Cloud project ID
         bucket_name: GCS bucket name
         output_prefix: Base output prefix  
         english_book_name: English name of the book to use as prefix
+        shard_sources: Output directory (object prefix) -> source file number,
+                       as reported by the operations that wrote the shards
+
+    Returns:
+        dict: Source file number -> GCS URIs of its flattened output files.
     """
+    flattened = {}
     try:
-        storage_client = storage.Client(project=project_id)
-        bucket = storage_client.bucket(bucket_name)
-        
-        # Find all files in the book's output directory (including file subdirectories)
+        bucket = get_bucket(project_id, bucket_name)
         book_output_prefix = f"{output_prefix}{english_book_name}/"
-        
-        print(f"  📁 Looking for output files in: gs://{bucket_name}/{book_output_prefix}")
-        
-        # List all blobs in the book's output directory and its file subdirectories
-        blobs = list(bucket.list_blobs(prefix=book_output_prefix))
-        
-        if not blobs:
+
+        print(f"  📁 Flattening output files in: gs://{bucket_name}/{book_output_prefix}")
+
+        completed, failed = flatten_book_outputs(
+            get_storage_client(project_id),
+            bucket,
+            output_prefix,
+            english_book_name,
+            shard_sources=shard_sources,
+            max_workers=FLATTEN_WORKERS,
+            exclude_prefixes=abandoned_output_prefixes(),
+        )
+
+        if not completed and not failed:
             print(f"  ⚠️  No output files found in {book_output_prefix}")
-            return
-        
-        print(f"  📄 Found {len(blobs)} items to process")
-        
-        file_count = 0
-        # Move and rename each file
-        for blob in blobs:
-            # Skip if it's a directory marker
-            if blob.name.endswith('/'):
-                continue
-                
-            # Extract the original filename
-            original_filename = blob.name.split('/')[-1]
-            
-            # Skip empty filenames
-            if not original_filename:
-                continue
-            
-            # Create a more descriptive filename with file number
-            file_parts = blob.name.split('/')
-            if len(file_parts) >= 3:
-                # Extract file number from directory name (e.g., file_001)
-                file_dir = file_parts[-2]  # e.g., "file_001"
-                if file_dir.startswith('file_'):
-                    file_num = file_dir.split('_')[1]
-                    # Create new filename with book prefix and file number
-                    new_filename = f"{english_book_name}_file{file_num}_{original_filename}"
-                else:
-                    # Fallback to simple prefix
-                    new_filename = f"{english_book_name}_{original_filename}"
-            else:
-                # Fallback to simple prefix
-                new_filename = f"{english_book_name}_{original_filename}"
-            
-            new_blob_name = f"{output_prefix}{new_filename}"
-            
-            print(f"    📝 Moving: {blob.name} -> {new_blob_name}")
-            
-            # Copy to new location
-            new_blob = bucket.blob(new_blob_name)
-            new_blob.rewrite(blob)
-            
-            # Delete original
-            blob.delete()
-            file_count += 1
-            
-        print(f"  ✅ Flattened {file_count} files for {english_book_name}")
-        
-        # Clean up empty file directories
-        print(f"  🧹 Cleaning up empty file directories...")
-        remaining_blobs = list(bucket.list_blobs(prefix=book_output_prefix))
-        for blob in remaining_blobs:
-            if blob.name.endswith('/'):
-                try:
-                    blob.delete()
-                    print(f"    🗑️  Removed empty directory: {blob.name}")
-                except:
-                    pass  # Ignore errors when removing directories
-        
+            return flattened
+
+        for rename in completed:
+            if rename.file_index is not None:
+                flattened.setdefault(rename.file_index, []).append(
+                    f"gs://{bucket_name}/{rename.destination_name}"
+                )
+        for rename, error in failed:
+            print(f"    ❌ Could not move {rename.source_name}: {error}")
+
+        print(f"  ✅ Flattened {len(completed)} files for {english_book_name}")
+
     except Exception as e:
         print(f"  ❌ Error flattening outputs for {english_book_name}: {e}")
 
+    return flattened
+
 # --- Function to Provide Final Summary of Processed Files ---
-def print_final_summary(project_id: str, gcs_output_uri: str):
+def print_final_summary(manifest: JobManifest, gcs_output_uri: str):
     """
-    Print a final summary of all flattened output files.
+    Print a final summary of all processed files, read from the job manifest.
     """
     try:
-        bucket_name = gcs_output_uri.replace("gs://", "").split("/")[0]
-        output_prefix = "/".join(gcs_output_uri.replace("gs://", "").split("/")[1:])
-        
-        storage_client = storage.Client(project=project_id)
-        bucket = storage_client.bucket(bucket_name)
-        
-        # List all files in the output directory (flattened)
-        blobs = list(bucket.list_blobs(prefix=output_prefix))
-        
-        # Filter out directories
-        files = [blob for blob in blobs if not blob.name.endswith('/')]
-        
-        if files:
+        books = manifest.summary()
+
+        if books:
+            total_files = sum(counts["done"] for counts in books.values())
+            total_outputs = sum(counts["outputs"] for counts in books.values())
+            total_failed = sum(counts["failed"] for counts in books.values())
+            total_dead_letter = sum(counts["dead_letter"] for counts in books.values())
+
             print(f"\n📋 Final Output Summary:")
             print(f"📁 Output location: {gcs_output_uri}")
-            print(f"📄 Total files created: {len(files)}")
-            
-            # Group by book prefix
-            book_counts = {}
-            for file_blob in files:
-                filename = file_blob.name.split('/')[-1]
-                if '_' in filename:
-                    book_prefix = filename.split('_')[0]
-                    book_counts[book_prefix] = book_counts.get(book_prefix, 0) + 1
-            
+            print(f"📄 Total files processed: {total_files} ({total_outputs} output files)")
+            if total_failed:
+                print(f"❌ Total files failed: {total_failed}")
+            if total_dead_letter:
+                print(f"🚫 Total files dead-lettered: {total_dead_letter} (see {DEAD_LETTER_PATH})")
+
             print(f"📚 Files by book:")
-            for book, count in sorted(book_counts.items()):
-                print(f"   {book}: {count} files")
+            for book, counts in sorted(books.items()):
+                line = f"   {book}: {counts['done']} done, {counts['outputs']} outputs"
+                if counts["failed"]:
+                    line += f", {counts['failed']} failed"
+                if counts["dead_letter"]:
+                    line += f", {counts['dead_letter']} dead-lettered"
+                if counts["pending"] or counts["submitted"]:
+                    line += f", {counts['pending'] + counts['submitted']} unfinished"
+                print(line)
+
+            failed_files = manifest.files(state="failed")
+            if failed_files:
+                print(f"\n❌ Failed files:")
+                for record in failed_files:
+                    reason = (record["reason"] or "")[:100]
+                    print(f"   {record['source_uri']}: {reason}")
         else:
-            print(f"\n⚠️  No output files found in {gcs_output_uri}")
-            
+            print(f"\n⚠️  No files recorded for {gcs_output_uri}")
+
     except Exception as e:
         print(f"\n❌ Error generating final summary: {e}")
 
+def print_concurrency_history(pool: ProcessorPool):
+    """Print how the concurrency limit of every processor moved during the run."""
+    print(f"\n🎚️  Concurrency limits:")
+    for state in pool.states:
+        limit = state.concurrency
+        print(f"  {state.endpoint.key}: {limit.describe_history()}"
+              f" ({limit.increases} increases, {limit.decreases} cuts, ceiling {limit.maximum})")
+
+def write_dead_letter_list(manifest: JobManifest, path: str):
+    """
+    Write every dead-lettered file and its reason to a local file.
+
+    Returns:
+        int: Number of dead-lettered files.
+    """
+    records = manifest.files(state=STATE_DEAD_LETTER)
+    if not records:
+        if os.path.exists(path):
+            os.remove(path)
+        return 0
+    with open(path, "w", encoding="utf-8") as f:
+        for record in records:
+            f.write(f"{record['source_uri']}\n{record['reason']}\n")
+    return len(records)
+
 # --- Main Batch Processing Function ---
 def batch_transcribe_gcs_pdfs(
     project_id: str,
@@ -468,10 +1853,18 @@ def batch_transcribe_gcs_pdfs(
     processor_id: str,
     gcs_input_uri: str,
     gcs_output_uri: str,
+    manifest_path: str = MANIFEST_PATH,
+    incremental: bool = INCREMENTAL_MODE,
+    endpoints: list = None,
 ):
     """
     Initiates a batch OCR process for scanned PDFs in GCS using Document AI.
 
+    Progress is recorded per file in a local manifest, so an interrupted run
+    can simply be started again: files already done are skipped. In
+    incremental mode only new or changed PDFs are submitted and outputs of
+    deleted PDFs (and deleted books) are pruned.
+
     Args:
         project_id (str): Your Google Cloud Project ID.
         location (str): The region where your Document AI processor is located.
@@ -480,14 +1873,33 @@ def batch_transcribe_gcs_pdfs(
                               (e.g., "gs://your-bucket/your-folder/").
         gcs_output_uri (str): The GCS URI prefix for where the output will be
                               written (e.g., "gs://your-bucket/output-folder/").
+        manifest_path (str): Path of the local SQLite job manifest.
+        incremental (bool): Sync against the last successful run (see above).
+        endpoints (list): ProcessorEndpoints to spread operations over;
+                          defaults to processor_id in location with
+                          MAX_CONCURRENT_OPERATIONS and MAX_SUBMISSIONS_PER_MINUTE.
     """
+    manifest = None
+    cache = None
+    pool = None
+    # Before the first client is created: the pool size only applies to new clients
+    configure_client_pools(STORAGE_CONNECTION_POOL_SIZE)
+    metrics = configure_metrics(METRICS_LOG_PATH, METRICS_PROMETHEUS_PATH, METRICS_PORT)
+    # Deadlines and hedging learn from this run's operations only
+    configure_operation_latencies(max_deadline=OPERATION_TIMEOUT_SECONDS)
     try:
+        manifest = JobManifest(manifest_path, gcs_output_uri)
+
         print(f"🔍 Discovering subdirectories in: {gcs_input_uri}")
         
         # Extract bucket name and prefix from input URI
         bucket_name = gcs_input_uri.replace("gs://", "").split("/")[0]
         input_prefix = "/".join(gcs_input_uri.replace("gs://", "").split("/")[1:])
         
+        # A sync also walks the directories above the books again instead of trusting the cache
+        if incremental:
+            get_bucket_index(project_id, bucket_name).invalidate()
+
         # List all subdirectories
         subdirectories = list_subdirectories_in_gcs(project_id, bucket_name, input_prefix)
         
@@ -498,28 +1910,114 @@ def batch_transcribe_gcs_pdfs(
         print(f"📁 Found {len(subdirectories)} subdirectories:")
         for subdir in subdirectories:
             print(f"  - {subdir}")
+
+        if incremental:
+            listed_books = {get_english_book_name(subdir.split('/')[-2]) for subdir in subdirectories}
+            prune_deleted_books(project_id, gcs_output_uri, manifest, listed_books)
         
-        print(f"\n🚀 Starting batch OCR processing (file-by-file to avoid timeouts)...")
+        if SCHEDULING_POLICY not in SCHEDULING_POLICIES:
+            raise ValueError(f"Unknown SCHEDULING_POLICY: {SCHEDULING_POLICY}")
+
+        # Shared Document AI clients, one per region, and the per-processor
+        # budgets (shared through QUOTA_DB_PATH with every process on the host)
+        endpoints = run_endpoints(endpoints, processor_id, location)
+        pool = ProcessorPool(project_id, endpoints, get_documentai_client, QUOTA_DB_PATH,
+                             adaptive=ADAPTIVE_CONCURRENCY)
+        configure_project_operation_limit(pool.capacity)
+
+        concurrency = f"adaptive, starting at {pool.concurrency_limit}" if ADAPTIVE_CONCURRENCY else "fixed"
+        print(f"\n🚀 Starting batch OCR processing (up to {pool.capacity} operations in flight across all books"
+              f" on {len(endpoints)} processors ({concurrency}), shared with every process using {QUOTA_DB_PATH};"
+              f" {SCHEDULING_POLICY} scheduling)...")
         print(f"📤 Base output location: {gcs_output_uri}")
         print("=" * 60)
-        
-        successful_count = 0
-        failed_count = 0
-        
-        # Process each subdirectory
-        for i, subdirectory in enumerate(subdirectories, 1):
-            subdir_uri = f"gs://{bucket_name}/{subdirectory}"
-            print(f"\n[{i}/{len(subdirectories)}] Processing: {subdirectory}")
-            
-            success = batch_transcribe_subdirectory(
-                project_id, location, processor_id, subdir_uri, gcs_output_uri
-            )
-            
-            if success:
-                successful_count += 1
-            else:
-                failed_count += 1
-        
+
+        # Small PDFs take the synchronous fast path instead of a batch operation
+        online = create_online_processor(pool.primary.client, pool.primary.processor_name, project_id, gcs_output_uri)
+
+        # Results of identical bytes are reused instead of OCR'd again
+        cache = open_ocr_cache(pool.primary.client, pool.primary.processor_name)
+
+        bucket_name_output = gcs_output_uri.replace("gs://", "").split("/")[0]
+        output_prefix = "/".join(gcs_output_uri.replace("gs://", "").split("/")[1:])
+        books = {}
+        results = {}
+        with open_operation_poller(pool) as poller, \
+                OperationExecutor(max_in_flight=pool.capacity, max_queued=MAX_QUEUED_REQUESTS,
+                                  slots=pool) as executor:
+            # Slots held versus the limit show how much quota sits idle
+            metrics.set_gauge("operation_slots", pool.capacity)
+            metrics.gauge_function("operations_in_flight", lambda: executor.in_flight)
+            metrics.gauge_function("requests_pending", lambda: executor.pending)
+            metrics.gauge_function("requests_queued", lambda: executor.queued)
+            metrics.gauge_function("operations_watched", lambda: poller.watching)
+            for state in pool.states:
+                key = state.endpoint.key
+                metrics.set_gauge("endpoint_operation_slots", state.endpoint.max_concurrent, endpoint=key)
+                metrics.gauge_function("endpoint_operations_in_flight", lambda state=state: state.in_flight, endpoint=key)
+                metrics.gauge_function("endpoint_concurrency_limit", lambda state=state: state.concurrency.limit,
+                                       endpoint=key)
+                metrics.gauge_function("host_operation_slots_in_use", state.limiter.slots_in_use, endpoint=key)
+
+            # Operations still running from a crashed run take their quota slots first
+            reattach_unfinished_operations(executor, manifest, poller, pool)
+
+            # Stages after the OCR: publishing a finished book, then assembling its text
+            def assemble(english_name):
+                assemble_book(project_id, bucket_name_output, output_prefix, english_name)
+
+            assemble_stage = PipelineStage("assemble", assemble, ASSEMBLY_STAGE_WORKERS, STAGE_QUEUE_SIZE)
+
+            def publish(book):
+                english_name = book["english_name"]
+                results[english_name] = finalize_book(book, project_id, gcs_output_uri, manifest, cache,
+                                                      assemble=False)
+                if results[english_name] and ASSEMBLE_BOOK_TEXT:
+                    assemble_stage.put(english_name)
+
+            publish_stage = PipelineStage("publish", publish, PUBLISH_WORKERS, STAGE_QUEUE_SIZE)
+
+            # Discovery queues the requests of several books at a time; the executor
+            # keeps the quota saturated, starting the highest-priority request
+            # whenever a slot frees up, while finished books are published
+            def discover(item):
+                i, subdirectory = item
+                print(f"\n[{i}/{len(subdirectories)}] Queueing: {subdirectory}")
+                book = submit_subdirectory_files(
+                    executor, pool, project_id, f"gs://{bucket_name}/{subdirectory}",
+                    gcs_output_uri, manifest, poller, online, cache, incremental,
+                )
+                if book is not None:
+                    track_queued_book(executor, book)
+
+            discover_stage = PipelineStage("discover", discover, DISCOVERY_WORKERS, STAGE_QUEUE_SIZE)
+            # Collection lasts at least until every book has been queued
+            executor.track(discover_stage.finished, tag=None)
+            discover_stage.feed(enumerate(subdirectories, 1))
+
+            def requeue(book, documents):
+                return queue_book_documents(
+                    executor, pool, project_id, poller, manifest, book, documents, online
+                )
+
+            try:
+                collect_completed_operations(
+                    executor, books, project_id, gcs_output_uri, manifest, requeue, cache,
+                    publish=publish_stage.put,
+                )
+            finally:
+                publish_stage.close()
+                publish_stage.join()
+                assemble_stage.close()
+                assemble_stage.join()
+            if online is not None:
+                online.shutdown()
+            for name in ("operations_in_flight", "requests_pending", "requests_queued", "operations_watched"):
+                metrics.gauge_function(name, None)
+
+        successful_count = sum(1 for success in results.values() if success)
+        failed_count = len(subdirectories) - successful_count
+
         print("\n" + "=" * 60)
         print(f"📊 Processing Summary:")
         print(f"✅ Successfully processed: {successful_count} subdirectories")
@@ -528,7 +2026,11 @@ def batch_transcribe_gcs_pdfs(
         
         if successful_count > 0:
             print(f"\n🎉 OCR results are available in: {gcs_output_uri}")
-            print_final_summary(project_id, gcs_output_uri)
+        print_final_summary(manifest, gcs_output_uri)
+        if ADAPTIVE_CONCURRENCY:
+            print_concurrency_history(pool)
+        print(f"📈 Timings and counters: {METRICS_LOG_PATH}, {METRICS_PROMETHEUS_PATH}")
+        write_dead_letter_list(manifest, DEAD_LETTER_PATH)
         
     except Exception as e:
         print(f"❌ An error occurred: {e}")
@@ -538,9 +2040,277 @@ def batch_transcribe_gcs_pdfs(
         print("3. The service account has 'Document AI Editor' and 'Storage Object Admin' roles.")
         print("4. Processor ID and Region in the script are correct and match your created processor.")
         print("5. Input GCS path is correct and contains subdirectories with PDF files.")
+    finally:
+        if cache is not None:
+            cache.close()
+        if manifest is not None:
+            manifest.close()
+        if pool is not None:
+            pool.close()
+        metrics.close()
+
+# --- Text Assembly of Finished Books ---
+def assemble_all_books(project_id: str, gcs_output_uri: str, manifest_path: str = MANIFEST_PATH):
+    """
+    Assemble the text of every book in the manifest from its existing outputs,
+    several books at a time, without running any OCR.
+
+    Returns:
+        int: Number of books assembled.
+    """
+    configure_client_pools(STORAGE_CONNECTION_POOL_SIZE)
+    bucket_name = gcs_output_uri.replace("gs://", "").split("/")[0]
+    output_prefix = "/".join(gcs_output_uri.replace("gs://", "").split("/")[1:])
+    with JobManifest(manifest_path, gcs_output_uri) as manifest:
+        books = [book for book, counts in manifest.summary().items() if counts[STATE_DONE]]
+
+    print(f"📖 Assembling the text of {len(books)} books from {gcs_output_uri}")
+    with get_metrics().span("assemble_all", books=len(books)):
+        results, failures = assemble_books(
+            get_bucket(project_id, bucket_name), output_prefix, books,
+            layout=OUTPUT_LAYOUT, max_workers=ASSEMBLY_WORKERS,
+        )
+    for english_name, assembled in sorted(results.items()):
+        if assembled is None:
+            print(f"  ⚠️  No outputs to assemble for {english_name}")
+        else:
+            print(f"  📖 {english_name}: {assembled['pages']} pages from {assembled['shards']} shards")
+    for english_name, error in failures:
+        print(f"  ❌ Error assembling the text of {english_name}: {error}")
+    return sum(1 for assembled in results.values() if assembled)
+
+# --- Reconciliation of Inputs and Outputs ---
+def reconcile_gcs_pdfs(
+    project_id: str,
+    gcs_input_uri: str,
+    gcs_output_uri: str,
+    manifest_path: str = MANIFEST_PATH,
+    resubmit: bool = False,
+    report_path: str = RECONCILIATION_REPORT_PATH,
+):
+    """
+    Compare every input PDF with the outputs in the bucket and report the
+    missing, partial and orphaned ones, without running any OCR.
+
+    Both prefixes are listed once, concurrently, and joined in memory (see
+    reconciliation.reconcile_outputs); neither the manifest nor the per-book
+    listings are used to decide what exists.
+
+    Args:
+        project_id (str): Your Google Cloud Project ID.
+        gcs_input_uri (str): The GCS URI prefix of the input documents.
+        gcs_output_uri (str): The GCS URI prefix of the outputs.
+        manifest_path (str): Path of the local SQLite job manifest.
+        resubmit (bool): Delete the outputs of partial files, move missing and
+                         partial files back to pending in the manifest and
+                         drop their cached OCR results, so the next run
+                         submits them again. Files in flight or
+                         dead-lettered are left alone.
+        report_path (str): Where the JSON report is written.
+
+    Returns:
+        ReconciliationReport: Status of every source and the orphaned outputs.
+    """
+    input_bucket_name = gcs_input_uri.replace("gs://", "").split("/")[0]
+    input_prefix = "/".join(gcs_input_uri.replace("gs://", "").split("/")[1:])
+    output_bucket_name = gcs_output_uri.replace("gs://", "").split("/")[0]
+    output_prefix = "/".join(gcs_output_uri.replace("gs://", "").split("/")[1:])
+
+    configure_client_pools(STORAGE_CONNECTION_POOL_SIZE)
+    actual_prefix = get_bucket_index(project_id, input_bucket_name).resolve_prefix(input_prefix)
+    if actual_prefix is None:
+        print(f"⚠️  Prefix not found in gs://{input_bucket_name}: {input_prefix}")
+        actual_prefix = input_prefix
+
+    print(f"🔎 Reconciling {gcs_input_uri} against {gcs_output_uri}")
+    with get_metrics().span("reconcile"):
+        report = reconcile_outputs(
+            get_bucket(project_id, input_bucket_name), actual_prefix,
+            get_bucket(project_id, output_bucket_name), output_prefix,
+            get_english_book_name,
+        )
+
+    for source in report.missing:
+        print(f"  ❓ Missing: {source.source_uri}")
+    for source in report.partial:
+        print(f"  🧩 Partial: {source.source_uri} ({source.reason})")
+    for uri, reason in report.orphans:
+        print(f"  👻 Orphaned: {uri} ({reason})")
+    counts = report.counts()
+    print(f"📋 {counts['ok']} complete, {counts['partial']} partial, {counts['missing']} missing, "
+          f"{counts['orphaned']} orphaned outputs ({report.seconds:.1f}s)")
+    print(f"📝 Reconciliation report written to {report.write(report_path)}")
+
+    if resubmit:
+        incomplete = report.missing + report.partial
+        pruned = 0
+        with JobManifest(manifest_path, gcs_output_uri) as manifest:
+            records = {source.source_uri: manifest.get(source.source_uri) for source in incomplete}
+            resubmitted = [
+                source for source in incomplete
+                if records[source.source_uri] is None
+                or records[source.source_uri]["state"] in (STATE_DONE, STATE_FAILED)
+            ]
+            # Partial outputs would show up as orphans once the file is processed again
+            stale = {}
+            for source in resubmitted:
+                if source.status != STATUS_PARTIAL:
+                    continue
+                record = records[source.source_uri] or {
+                    "source_uri": source.source_uri, "file_index": source.file_index, "output_uris": [],
+                }
+                stale.setdefault(source.book, []).append(
+                    dict(record, output_uris=sorted(set(record["output_uris"]) | set(source.outputs)))
+                )
+            for english_name, stale_records in sorted(stale.items()):
+                pruned += prune_stale_outputs(project_id, gcs_output_uri, english_name, stale_records, [], manifest)
+            reset = manifest.reset_files([source.source_uri for source in resubmitted])
+            content_keys = [records[source.source_uri]["content_key"]
+                            for source in resubmitted if records[source.source_uri]]
+        forgotten = forget_content(OCR_CACHE_PATH, content_keys) if os.path.exists(OCR_CACHE_PATH) else 0
+        print(f"🔁 {len(resubmitted)} files will be submitted again: {reset} moved back to pending, "
+              f"{pruned} partial outputs deleted, {forgotten} cached results dropped; "
+              f"{len(incomplete) - len(resubmitted)} in flight or dead-lettered were left alone")
+    return report
+
+# --- Dry-Run Planning ---
+def plan_gcs_pdfs(
+    project_id: str,
+    gcs_input_uri: str,
+    gcs_output_uri: str,
+    manifest_path: str = MANIFEST_PATH,
+    incremental: bool = INCREMENTAL_MODE,
+    endpoints: list = None,
+):
+    """
+    Work out what batch_transcribe_gcs_pdfs would do, without submitting anything.
+
+    Only bucket listings, object metadata and PDF headers (for page counts)
+    are read. Files the manifest records as done, dead-lettered or in flight
+    are left out like a real run would; the manifest is not modified.
+    Reuse of cached OCR results is not predicted.
+
+    Args:
+        project_id (str): Your Google Cloud Project ID.
+        gcs_input_uri (str): The GCS URI prefix of the input documents.
+        gcs_output_uri (str): The GCS URI prefix the outputs would go to.
+        manifest_path (str): Path of the local SQLite job manifest.
+        incremental (bool): Treat done files whose source changed as pending.
+        endpoints (list): ProcessorEndpoints the run would use (see
+                          batch_transcribe_gcs_pdfs); their concurrency and
+                          submission-rate limits, and the adaptive starting
+                          limit, drive the time estimate.
+
+    Returns:
+        tuple: (list of run_planner.BookPlan, estimate dict from run_planner.estimate_run)
+    """
+    bucket_name = gcs_input_uri.replace("gs://", "").split("/")[0]
+    input_prefix = "/".join(gcs_input_uri.replace("gs://", "").split("/")[1:])
+
+    # A missing manifest means nothing has run yet; do not create one
+    manifest = JobManifest(manifest_path, gcs_output_uri) if os.path.exists(manifest_path) else None
+    plans = []
+    try:
+        subdirectories = list_subdirectories_in_gcs(project_id, bucket_name, input_prefix)
+        for i, subdirectory in enumerate(subdirectories, 1):
+            korean_name = subdirectory.split('/')[-2]
+            print(f"[{i}/{len(subdirectories)}] Reading: {subdirectory}")
+            pdf_blobs = list_pdf_blobs_in_directory(project_id, bucket_name, subdirectory)
+
+            done = dead_letter = in_flight = 0
+            pending_blobs = []
+            for blob in pdf_blobs:
+                record = manifest.get(f"gs://{bucket_name}/{blob.name}") if manifest is not None else None
+                state = record["state"] if record else None
+                changed = incremental and record is not None and record["generation"] not in (None, blob.generation)
+                if state == STATE_DONE and not changed:
+                    done += 1
+                elif state == STATE_DEAD_LETTER and not changed:
+                    dead_letter += 1
+                elif state == STATE_SUBMITTED and record["operation_name"] and not changed:
+                    in_flight += 1
+                else:
+                    pending_blobs.append(blob)
+
+            plan = plan_book(
+                korean_name, get_english_book_name(korean_name),
+                describe_pdf_blobs(pending_blobs, bucket_name), PROCESSOR_LIMITS,
+                ONLINE_MAX_PAGES if ONLINE_PROCESSING else None, ONLINE_MAX_BYTES,
+                files=len(pdf_blobs),
+            )
+            plan.done, plan.dead_letter, plan.in_flight = done, dead_letter, in_flight
+            plans.append(plan)
+    finally:
+        if manifest is not None:
+            manifest.close()
+
+    endpoints = run_endpoints(endpoints, PROCESSOR_ID, PROCESSOR_LOCATION)
+    estimate = estimate_run(
+        plans,
+        sum(endpoint.max_concurrent for endpoint in endpoints),
+        sum(endpoint.requests_per_minute for endpoint in endpoints),
+        SCHEDULING_POLICY,
+        online_workers=ONLINE_WORKERS, online_requests_per_minute=ONLINE_REQUESTS_PER_MINUTE,
+        initial_slots=sum(starting_limit(endpoint.max_concurrent, ADAPTIVE_CONCURRENCY) for endpoint in endpoints),
+        # Every endpoint's limit grows by AIMD_INCREASE per round of its own submissions
+        slot_increase=AIMD_INCREASE * len(endpoints) if ADAPTIVE_CONCURRENCY else 0.0,
+    )
+    estimate["endpoints"] = len(endpoints)
+    return plans, estimate
+
+def print_run_plan(plans: list, estimate: dict):
+    """Print the per-book plan and totals returned by plan_gcs_pdfs."""
+    print("\n" + "=" * 60)
+    in_flight = f"up to {estimate['slots']} operations in flight"
+    if estimate["initial_slots"] < estimate["slots"]:
+        in_flight += f" (adaptive, starting at {estimate['initial_slots']})"
+    print(f"🗺️  Run Plan ({in_flight} on {estimate['endpoints']} processors, {SCHEDULING_POLICY} scheduling):")
+    for plan in plans:
+        line = (f"  {plan.korean_name} -> {plan.english_name}: {plan.pending}/{plan.files} files to process, "
+                f"{plan.pages} pages, {plan.bytes / 1024 / 1024:.1f} MB, {len(plan.requests)} operations")
+        if plan.online:
+            line += f", {len(plan.online)} online"
+        if plan.done:
+            line += f", {plan.done} already done"
+        if plan.in_flight:
+            line += f", {plan.in_flight} in flight"
+        if plan.dead_letter:
+            line += f", {plan.dead_letter} dead-lettered"
+        print(line)
+        for pdf, part_count in plan.split:
+            print(f"    ✂️  Will split {pdf.filename} ({pdf.size / 1024 / 1024:.1f} MB, "
+                  f"{pdf.page_count} pages) into {part_count} parts")
+        for pdf, reason in plan.rejected:
+            print(f"    🚫 Will reject {pdf.filename}: {reason}")
+        if plan.estimated:
+            print(f"    ⚠️  Page counts of {len(plan.estimated)} files are estimated from their size")
+
+    print(f"\n📚 Books: {len(plans)}")
+    print(f"📄 Files to process: {sum(plan.pending for plan in plans)} of {sum(plan.files for plan in plans)} "
+          f"({sum(len(plan.online) for plan in plans)} online, {sum(len(plan.split) for plan in plans)} split, "
+          f"{sum(len(plan.rejected) for plan in plans)} rejected)")
+    print(f"📑 Pages: {estimate['pages']} ({sum(plan.bytes for plan in plans) / 1024 / 1024 / 1024:.2f} GB)")
+    print(f"⚙️  Batch operations: {sum(len(plan.requests) for plan in plans)} "
+          f"({estimate['slot_seconds'] / 3600:.1f} slot-hours)")
+    print(f"⏱️  Estimated wall-clock time: {estimate['wall_seconds'] / 3600:.1f} h "
+          f"(batch {estimate['batch_seconds'] / 3600:.1f} h, online {estimate['online_seconds'] / 3600:.1f} h)")
+    print(f"💵 Estimated OCR cost: ${estimate['cost']:.2f}")
 
 # --- Run the script ---
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Batch OCR of the commentary PDFs with Document AI.")
+    parser.add_argument("--plan", action="store_true",
+                        help="Print the files, pages, operations, time and cost of a run without submitting anything")
+    parser.add_argument("--assemble", action="store_true",
+                        help="Only assemble the per-book texts from the outputs of earlier runs")
+    parser.add_argument("--incremental", action="store_true", default=INCREMENTAL_MODE,
+                        help="Only process new or changed PDFs and prune outputs of deleted ones")
+    parser.add_argument("--reconcile", action="store_true",
+                        help="Only report missing, partial and orphaned outputs")
+    parser.add_argument("--resubmit", action="store_true",
+                        help="Reconcile, then run again for the missing and partial files")
+    args = parser.parse_args()
+
     # Validate environment variable for authentication
     if "GOOGLE_APPLICATION_CREDENTIALS" not in os.environ:
         print("ERROR: GOOGLE_APPLICATION_CREDENTIALS environment variable is not set.")
@@ -554,10 +2324,22 @@ if __name__ == "__main__":
         print("ERROR: Please update the PROJECT_ID, PROCESSOR_LOCATION, and PROCESSOR_ID variables in the script with your actual values.")
         exit(1)
 
-    batch_transcribe_gcs_pdfs(
-        PROJECT_ID,
-        PROCESSOR_LOCATION,
-        PROCESSOR_ID,
-        GCS_INPUT_URI,
-        GCS_OUTPUT_URI,
-    )
+    if args.plan:
+        print_run_plan(*plan_gcs_pdfs(PROJECT_ID, GCS_INPUT_URI, GCS_OUTPUT_URI, incremental=args.incremental,
+                                      endpoints=PROCESSOR_ENDPOINTS))
+    elif args.assemble:
+        assemble_all_books(PROJECT_ID, GCS_OUTPUT_URI)
+    elif args.reconcile and not args.resubmit:
+        reconcile_gcs_pdfs(PROJECT_ID, GCS_INPUT_URI, GCS_OUTPUT_URI)
+    else:
+        if args.resubmit:
+            reconcile_gcs_pdfs(PROJECT_ID, GCS_INPUT_URI, GCS_OUTPUT_URI, resubmit=True)
+        batch_transcribe_gcs_pdfs(
+            PROJECT_ID,
+            PROCESSOR_LOCATION,
+            PROCESSOR_ID,
+            GCS_INPUT_URI,
+            GCS_OUTPUT_URI,
+            incremental=args.incremental,
+            endpoints=PROCESSOR_ENDPOINTS,
+        )
@@ -6,6 +6,8 @@ from google.cloud import storage
 from google.api_core.client_options import ClientOptions
 from google.api_core import exceptions as google_exceptions
 import concurrent.futures
+from quota_limiter import get_quota_limiter
+from processor_pool import ProcessorEndpoint, endpoint_resource
 
 # --- Bible Book Name Mapping ---
 KOREAN_TO_ENGLISH_BOOKS = {
@@ -418,16 +420,23 @@ def submit_batch_process_with_retry(client, request, filename, max_retries=5):
     Returns:
         bool: True if successful, False if failed after all retries
     """
+    # Shared with every other process on this host (including main.py runs,
+    # which lease per processor endpoint), so workers wait for quota here
+    # instead of backing off after a 429
+    limiter = get_quota_limiter(endpoint_resource(ProcessorEndpoint(PROCESSOR_ID, PROCESSOR_LOCATION)))
     for attempt in range(max_retries + 1):
         try:
-            # Submit the batch process request
-            operation = client.batch_process_documents(request)
-            
-            # Wait for the operation to complete
-            print(f"  ⏳ Waiting for Document AI operation to complete for {filename}...")
-            operation.result(timeout=1800)  # 30-minute timeout per file
-            print(f"  ✅ Operation completed for {filename}")
-            return True
+            with limiter.operation_slot():
+                limiter.acquire_request()
+
+                # Submit the batch process request
+                operation = client.batch_process_documents(request)
+                
+                # Wait for the operation to complete
+                print(f"  ⏳ Waiting for Document AI operation to complete for {filename}...")
+                operation.result(timeout=1800)  # 30-minute timeout per file
+                print(f"  ✅ Operation completed for {filename}")
+                return True
             
         except google_exceptions.TooManyRequests as e:
             if attempt < max_retries:
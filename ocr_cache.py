@@ -0,0 +1,168 @@
+import json
+import time
+import hashlib
+import sqlite3
+import threading
+
+from output_catalog import shard_index
+
+# Local SQLite file mapping PDF content to finished OCR results
+OCR_CACHE_PATH = "ocr_cache.sqlite"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    content_key TEXT NOT NULL,
+    processor TEXT NOT NULL,
+    ocr_config TEXT NOT NULL,
+    source_uri TEXT NOT NULL,
+    shard_uris TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    PRIMARY KEY (content_key, processor, ocr_config)
+);
+"""
+
+
+def blob_content_key(blob):
+    """
+    Return a key identifying the bytes of a GCS object, or None if unknown.
+
+    MD5 is used when GCS has one; composite objects only carry a CRC32C,
+    which is combined with the size to make collisions unlikely.
+    """
+    if blob.md5_hash:
+        return f"md5:{blob.md5_hash}"
+    if blob.crc32c:
+        return f"crc32c:{blob.crc32c}:{blob.size}"
+    return None
+
+
+def ocr_config_key(process_options):
+    """Return a stable digest of the ProcessOptions (OcrConfig, hints) of a run."""
+    if process_options is None:
+        return "default"
+    return hashlib.sha256(type(process_options).serialize(process_options)).hexdigest()[:16]
+
+
+class OcrResultCache:
+    """
+    Content-addressed record of finished OCR results.
+
+    Results are keyed by (content key, processor and version, OCR config
+    digest), so the same bytes uploaded under another name or prefix reuse
+    the existing output, while a different processor version or OCR
+    configuration is processed again. Only complete, single-document
+    results (shards of one Document in shard order) are recorded.
+
+    The connection is shared between worker threads and guarded by a lock.
+    """
+
+    def __init__(self, path: str, processor: str, ocr_config: str):
+        self.path = path
+        self.processor = processor
+        self.ocr_config = ocr_config
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        with self._lock, self._conn:
+            self._conn.executescript(_SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+    def lookup(self, content_key: str):
+        """
+        Return the shard URIs of a cached result, or None on a miss.
+        """
+        if not content_key:
+            return None
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT shard_uris FROM results WHERE content_key = ? AND processor = ? AND ocr_config = ?",
+                (content_key, self.processor, self.ocr_config),
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def record(self, content_key: str, source_uri: str, shard_uris):
+        """Remember where the result for some content lives."""
+        if not content_key or not shard_uris:
+            return
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO results"
+                " (content_key, processor, ocr_config, source_uri, shard_uris, created_at)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (content_key, self.processor, self.ocr_config, source_uri,
+                 json.dumps(sorted(shard_uris, key=shard_index), ensure_ascii=False), time.time()),
+            )
+
+    def forget(self, content_key: str):
+        """Drop a cached result, e.g. because its shards no longer exist."""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "DELETE FROM results WHERE content_key = ? AND processor = ? AND ocr_config = ?",
+                (content_key, self.processor, self.ocr_config),
+            )
+
+
+def link_cached_result(storage_client, shard_uris, destination_bucket, destination_prefix: str, stem: str):
+    """
+    Copy the shards of a cached result into a new output directory.
+
+    The copies are server-side and named like Document AI output
+    ({stem}-{n}.json), so the directory is handled like a fresh result.
+    Copies (instead of references) keep the result valid if the original
+    outputs are later flattened, moved or deleted.
+
+    Returns:
+        str: The destination directory (object prefix ending in '/').
+
+    Raises:
+        Exception: If a shard cannot be copied (e.g. it no longer exists).
+    """
+    copied = []
+    try:
+        for shard_uri in shard_uris:
+            bucket_name, blob_name = shard_uri.replace("gs://", "", 1).split("/", 1)
+            source_bucket = storage_client.bucket(bucket_name)
+            copy = source_bucket.copy_blob(
+                source_bucket.blob(blob_name),
+                destination_bucket,
+                f"{destination_prefix}{stem}-{shard_index(blob_name)}.json",
+            )
+            copied.append(copy)
+    except Exception:
+        # Leave no partial result behind
+        for copy in copied:
+            try:
+                copy.delete()
+            except Exception:
+                pass
+        raise
+    return destination_prefix
+
+
+def forget_content(path: str, content_keys):
+    """
+    Drop the cached results of some content under every processor and OCR
+    configuration, e.g. because reconciliation found their outputs incomplete.
+
+    Returns:
+        int: Number of results dropped.
+    """
+    keys = [key for key in content_keys if key]
+    if not keys:
+        return 0
+    conn = sqlite3.connect(path, timeout=30)
+    try:
+        with conn:
+            conn.executescript(_SCHEMA)
+            return sum(conn.execute("DELETE FROM results WHERE content_key = ?", (key,)).rowcount for key in keys)
+    finally:
+        conn.close()
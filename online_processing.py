@@ -0,0 +1,88 @@
+import os
+import concurrent.futures
+
+from google.cloud import documentai_v1beta3 as documentai
+
+def is_online_candidate(pdf, max_pages: int, max_bytes: int):
+    """
+    Return True if a PDF has at most ``max_pages`` pages and ``max_bytes``
+    bytes, i.e. is small enough for synchronous processing.
+
+    Estimated page counts are not trusted: a file that turns out to be over
+    the online page limit would fail outright instead of being batched.
+    """
+    return (not pdf.page_count_estimated and
+            0 < pdf.page_count <= max_pages and
+            0 < pdf.size <= max_bytes)
+
+
+class OnlineProcessor:
+    """
+    Runs process_document for small PDFs on a thread pool and writes each
+    result to the output bucket the way a batch operation would.
+
+    The result of one file lands in the output directory it is given (see
+    main.ONLINE_OUTPUT_DIRECTORY) as ``{stem}-0.json``, so flattening,
+    cataloguing and the manifest treat it like any other Document AI output
+    directory.
+
+    Requests draw from a QuotaLimiter (requests per minute, shared by every
+    process on the host); they do not use batch operation slots.
+    """
+
+    def __init__(self, client, processor_name: str, output_bucket, limiter,
+                 process_options=None, max_workers: int = 8):
+        self.client = client
+        self.processor_name = processor_name
+        self.output_bucket = output_bucket
+        self.limiter = limiter
+        self.process_options = process_options
+        self._pool = concurrent.futures.ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="docai-online"
+        )
+
+    def process(self, pdf, output_dir: str):
+        """
+        Process one PDF synchronously and upload its Document JSON.
+
+        Args:
+            pdf (PdfInfo): The file to process.
+            output_dir (str): Object prefix (ending in '/') for the result.
+
+        Returns:
+            dict: Same shape as a batch operation result: "operation_name"
+                  (None), "outputs" {source URI: output directory URI} and
+                  "failures" {}.
+        """
+        request = documentai.ProcessRequest(
+            name=self.processor_name,
+            gcs_document=documentai.GcsDocument(gcs_uri=pdf.uri, mime_type="application/pdf"),
+            process_options=self.process_options,
+        )
+        self.limiter.acquire_request()
+        result = self.client.process_document(request=request)
+
+        stem = os.path.splitext(pdf.filename)[0]
+        self.output_bucket.blob(f"{output_dir}{stem}-0.json").upload_from_string(
+            documentai.Document.to_json(result.document),
+            content_type="application/json",
+        )
+        return {
+            "operation_name": None,
+            "outputs": {pdf.uri: f"gs://{self.output_bucket.name}/{output_dir}"},
+            "failures": {},
+        }
+
+    def submit(self, pdf, output_dir: str):
+        """Schedule process(pdf, output_dir); returns a concurrent.futures.Future."""
+        return self._pool.submit(self.process, pdf, output_dir)
+
+    def shutdown(self, wait: bool = True):
+        self._pool.shutdown(wait=wait)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.shutdown(wait=exc_type is None)
+        return False
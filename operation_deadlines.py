@@ -0,0 +1,150 @@
+import math
+import bisect
+import threading
+import collections
+
+from request_scheduling import OPERATION_STARTUP_SECONDS, SECONDS_PER_PAGE
+
+# --- Size Classes ---
+# Requests are grouped by page count (inclusive upper bounds) when their
+# latencies are compared; requests above the last bound form one more class
+SIZE_CLASS_PAGES = (10, 50, 200, 500, 1000)
+
+# Latencies (seconds from submission to completion) kept per size class
+LATENCY_WINDOW = 200
+
+# --- Deadlines ---
+# A batch operation is given DEADLINE_FACTOR times its expected duration,
+# clamped to [MIN_DEADLINE_SECONDS, MAX_DEADLINE_SECONDS]. The expected
+# duration is startup + pages x seconds per page, fitted to the last
+# FIT_WINDOW finished operations once MIN_FIT_SAMPLES of them are known; until
+# then the request_scheduling cost model is used.
+DEADLINE_FACTOR = 4.0
+MIN_DEADLINE_SECONDS = 180
+MAX_DEADLINE_SECONDS = 6 * 60 * 60
+FIT_WINDOW = 500
+MIN_FIT_SAMPLES = 10
+PRIOR_STARTUP_SECONDS = OPERATION_STARTUP_SECONDS
+PRIOR_SECONDS_PER_PAGE = SECONDS_PER_PAGE
+
+# --- Hedging ---
+# An operation still running past the HEDGE_PERCENTILE latency of its size
+# class gets a duplicate; a class needs MIN_HEDGE_SAMPLES latencies first
+HEDGE_PERCENTILE = 95
+MIN_HEDGE_SAMPLES = 20
+
+
+def size_class(pages: int):
+    """Return the label of the size class a request of ``pages`` pages falls in."""
+    index = bisect.bisect_left(SIZE_CLASS_PAGES, pages)
+    if index == len(SIZE_CLASS_PAGES):
+        return f"over_{SIZE_CLASS_PAGES[-1]}"
+    return f"upto_{SIZE_CLASS_PAGES[index]}"
+
+
+def percentile(values, percent: float):
+    """Nearest-rank percentile of ``values`` (which must not be empty)."""
+    ordered = sorted(values)
+    rank = max(1, math.ceil(percent / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+class OperationLatencies:
+    """
+    Latencies of finished batch operations, used to give each request a
+    deadline that fits its size and to decide when a slow one is hedged.
+
+    Thread-safe; every operation worker records into and reads from the
+    same instance (see configure_operation_latencies).
+    """
+
+    def __init__(self, deadline_factor: float = None, min_deadline: float = None, max_deadline: float = None,
+                 hedge_percentile: float = None, min_hedge_samples: int = None):
+        # Defaults to the module settings at construction time
+        self.deadline_factor = DEADLINE_FACTOR if deadline_factor is None else deadline_factor
+        self.min_deadline = MIN_DEADLINE_SECONDS if min_deadline is None else min_deadline
+        self.max_deadline = MAX_DEADLINE_SECONDS if max_deadline is None else max_deadline
+        self.hedge_percentile = HEDGE_PERCENTILE if hedge_percentile is None else hedge_percentile
+        self.min_hedge_samples = MIN_HEDGE_SAMPLES if min_hedge_samples is None else min_hedge_samples
+        self.prior_startup = PRIOR_STARTUP_SECONDS
+        self.prior_seconds_per_page = PRIOR_SECONDS_PER_PAGE
+        self.min_fit_samples = MIN_FIT_SAMPLES
+        self._lock = threading.Lock()
+        self._by_class = collections.defaultdict(lambda: collections.deque(maxlen=LATENCY_WINDOW))
+        self._samples = collections.deque(maxlen=FIT_WINDOW)
+
+    def record(self, pages: int, seconds: float):
+        """Record that an operation over ``pages`` pages took ``seconds``."""
+        with self._lock:
+            self._by_class[size_class(pages)].append(seconds)
+            self._samples.append((pages, seconds))
+
+    def throughput(self):
+        """
+        Return the fitted (startup seconds, seconds per page).
+
+        A least-squares line through the recent (pages, seconds) samples; the
+        prior cost model is returned while there are too few samples or they
+        do not show time growing with pages.
+        """
+        with self._lock:
+            samples = list(self._samples)
+        if len(samples) < self.min_fit_samples:
+            return self.prior_startup, self.prior_seconds_per_page
+        mean_pages = sum(pages for pages, _ in samples) / len(samples)
+        mean_seconds = sum(seconds for _, seconds in samples) / len(samples)
+        variance = sum((pages - mean_pages) ** 2 for pages, _ in samples)
+        if variance == 0:
+            # Every request had the same size; charge the whole time per page
+            return 0.0, mean_seconds / max(1.0, mean_pages)
+        slope = sum((pages - mean_pages) * (seconds - mean_seconds) for pages, seconds in samples) / variance
+        if slope <= 0:
+            return self.prior_startup, self.prior_seconds_per_page
+        return max(0.0, mean_seconds - slope * mean_pages), slope
+
+    def expected_seconds(self, pages: int):
+        """Expected duration of an operation over ``pages`` pages."""
+        startup, seconds_per_page = self.throughput()
+        return startup + seconds_per_page * pages
+
+    def deadline(self, pages: int):
+        """Seconds an operation over ``pages`` pages may run before it is given up on."""
+        deadline = self.deadline_factor * self.expected_seconds(pages)
+        return min(self.max_deadline, max(self.min_deadline, deadline))
+
+    def hedge_after(self, pages: int):
+        """
+        Return the HEDGE_PERCENTILE latency of the size class of ``pages``,
+        or None while the class has too few samples to hedge on.
+        """
+        with self._lock:
+            latencies = list(self._by_class.get(size_class(pages), ()))
+        if len(latencies) < max(1, self.min_hedge_samples):
+            return None
+        return percentile(latencies, self.hedge_percentile)
+
+
+# --- Process-Wide Latencies ---
+_latencies = OperationLatencies()
+_latencies_lock = threading.Lock()
+
+
+def configure_operation_latencies(**settings):
+    """
+    Start a fresh set of observed latencies for this process.
+
+    Args:
+        **settings: Overrides passed to OperationLatencies (e.g. max_deadline).
+
+    Returns:
+        OperationLatencies: The new process-wide instance.
+    """
+    global _latencies
+    with _latencies_lock:
+        _latencies = OperationLatencies(**settings)
+        return _latencies
+
+
+def get_operation_latencies():
+    """Return the process-wide OperationLatencies."""
+    return _latencies
@@ -0,0 +1,241 @@
+import heapq
+import itertools
+import threading
+import concurrent.futures
+
+# --- Project-Wide Operation Limit ---
+# Document AI allows a fixed number of concurrent batch operations per project
+# (5 for theologpt). Every executor in this process draws from the same
+# semaphore so that two books running side by side cannot exceed the quota.
+DEFAULT_PROJECT_OPERATION_LIMIT = 5
+
+_project_semaphore = threading.BoundedSemaphore(DEFAULT_PROJECT_OPERATION_LIMIT)
+_project_limit = DEFAULT_PROJECT_OPERATION_LIMIT
+_project_lock = threading.Lock()
+
+
+def configure_project_operation_limit(limit: int):
+    """
+    Set the number of Document AI operations allowed in flight across the process.
+
+    Should be called before any executor starts submitting work; executors
+    created afterwards pick up the new semaphore.
+
+    Args:
+        limit (int): Maximum number of concurrent operations for the project.
+    """
+    global _project_semaphore, _project_limit
+    if limit < 1:
+        raise ValueError("Project operation limit must be at least 1")
+    with _project_lock:
+        _project_semaphore = threading.BoundedSemaphore(limit)
+        _project_limit = limit
+
+
+def get_project_operation_limit():
+    """Return the currently configured project-wide operation limit."""
+    return _project_limit
+
+
+def get_project_semaphore():
+    """Return the semaphore shared by every executor in this process."""
+    return _project_semaphore
+
+
+# --- Concurrent Operation Executor ---
+class OperationExecutor:
+    """
+    Keeps up to N long-running operations in flight and yields them as they finish.
+
+    Each submitted task is expected to start an operation and block until it
+    completes (e.g. ``batch_process_documents`` followed by ``result()``). The
+    task only runs while it holds a slot of the project-wide semaphore, so the
+    number of operations in flight never exceeds the project quota even when
+    several executors are active at once. With a ``limiter``
+    (quota_limiter.QuotaLimiter) the task also holds a host-wide lease, which
+    extends the same bound to other processes on the machine.
+
+    With ``slots`` (e.g. a processor_pool.ProcessorPool) a task starts only
+    once ``slots.acquire()`` has returned a slot, which is passed to the task
+    as its ``slot`` keyword argument; the task then owns it and gives it back
+    with ``slots.release(*slot)``. Slots that come and go at run time (an
+    adaptive concurrency limit) thus bound the tasks started, not only the
+    tasks waiting.
+
+    Queued tasks wait in a priority queue: whenever a slot frees up, the task
+    with the highest ``priority`` starts (ties in submission order), so work
+    queued late can still overtake work queued earlier. With ``max_queued``
+    the queue is bounded: submit() waits until a task leaves the queue, so a
+    producer that runs ahead of the quota is held back.
+
+    Usage:
+        with OperationExecutor(max_in_flight=5) as executor:
+            executor.submit(run_operation, request, tag=("01_Genesis", 1), priority=cost)
+            for tag, future in executor.as_completed():
+                ...
+    """
+
+    def __init__(self, max_in_flight: int = None, semaphore=None, limiter=None, max_queued: int = None,
+                 slots=None):
+        if max_in_flight is None:
+            max_in_flight = get_project_operation_limit()
+        self.max_in_flight = max_in_flight
+        self._semaphore = semaphore or get_project_semaphore()
+        self._limiter = limiter
+        self._slots = slots
+        self._pool = concurrent.futures.ThreadPoolExecutor(
+            max_workers=max_in_flight, thread_name_prefix="docai-op"
+        )
+        self._pending = {}
+        self._queue = []
+        self._sequence = itertools.count()
+        self._lock = threading.Lock()
+        self._queue_space = threading.Condition(self._lock)
+        self.max_queued = max_queued
+        self._in_flight = 0
+
+    @property
+    def in_flight(self):
+        """Number of tasks currently holding a project slot."""
+        return self._in_flight
+
+    @property
+    def pending(self):
+        """Number of tasks submitted but not yet collected."""
+        with self._lock:
+            return len(self._pending)
+
+    @property
+    def queued(self):
+        """Number of submitted tasks still waiting for a slot."""
+        with self._lock:
+            return len(self._queue)
+
+    def _run_next(self):
+        # The task is chosen only once a slot is held, so it is the best one
+        # queued at the moment the slot freed up
+        with self._semaphore:
+            lease_id = self._limiter.acquire_slot() if self._limiter is not None else None
+            slot = self._slots.acquire() if self._slots is not None else None
+            with self._lock:
+                _, _, fn, args, kwargs, future = heapq.heappop(self._queue)
+                self._in_flight += 1
+                self._queue_space.notify()
+            if slot is not None:
+                kwargs = dict(kwargs, slot=slot)
+            try:
+                if future.set_running_or_notify_cancel():
+                    try:
+                        future.set_result(fn(*args, **kwargs))
+                    except BaseException as e:
+                        future.set_exception(e)
+                elif slot is not None:
+                    self._slots.release(*slot)
+            finally:
+                with self._lock:
+                    self._in_flight -= 1
+                if lease_id is not None:
+                    self._limiter.release_slot(lease_id)
+
+    def submit(self, fn, *args, tag=None, priority: float = 0, **kwargs):
+        """
+        Schedule ``fn(*args, **kwargs)`` to run once a project slot is free.
+
+        Blocks while ``max_queued`` tasks are already waiting for a slot.
+
+        Args:
+            fn: Callable that starts an operation and waits for it.
+            tag: Arbitrary value returned alongside the future by as_completed().
+            priority (float): Tasks with a higher priority start first.
+
+        Returns:
+            concurrent.futures.Future: Future for the task result.
+        """
+        future = concurrent.futures.Future()
+        with self._lock:
+            if self.max_queued is not None:
+                self._queue_space.wait_for(lambda: len(self._queue) < self.max_queued)
+            heapq.heappush(self._queue, (-priority, next(self._sequence), fn, args, kwargs, future))
+            self._pending[future] = tag
+        # One worker run per queued task; each picks the best task when it gets a slot
+        self._pool.submit(self._run_next)
+        return future
+
+    def track(self, future, tag=None):
+        """
+        Collect an externally created future through as_completed().
+
+        Used for operations that are already running (e.g. reattached after a
+        restart): they need no worker thread, only to be collected.
+        """
+        with self._lock:
+            self._pending[future] = tag
+        return future
+
+    def reserve_slot_until(self, future):
+        """
+        Hold one project slot until ``future`` is done, if a slot is free.
+
+        Operations started by an earlier process still count against the
+        project quota, so their slots are taken before new work is queued.
+
+        Returns:
+            bool: True if a slot was reserved.
+        """
+        semaphore = self._semaphore
+        limiter = self._limiter
+        if not semaphore.acquire(blocking=False):
+            return False
+        lease_id = None
+        if limiter is not None:
+            lease_id = limiter.try_acquire_slot()
+            if lease_id is None:
+                semaphore.release()
+                return False
+        with self._lock:
+            self._in_flight += 1
+
+        def _release(_):
+            with self._lock:
+                self._in_flight -= 1
+            if lease_id is not None:
+                limiter.release_slot(lease_id)
+            semaphore.release()
+
+        future.add_done_callback(_release)
+        return True
+
+    def as_completed(self, timeout=None):
+        """
+        Yield (tag, future) pairs in completion order.
+
+        Tasks submitted while iterating are picked up as well, so callers may
+        feed more work from inside the loop.
+        """
+        while True:
+            with self._lock:
+                futures = list(self._pending)
+            if not futures:
+                return
+            done, _ = concurrent.futures.wait(
+                futures, timeout=timeout, return_when=concurrent.futures.FIRST_COMPLETED
+            )
+            if not done:
+                raise concurrent.futures.TimeoutError(
+                    f"{len(futures)} operations still pending after {timeout} seconds"
+                )
+            for future in done:
+                with self._lock:
+                    tag = self._pending.pop(future)
+                yield tag, future
+
+    def shutdown(self, wait: bool = True):
+        """Stop accepting work and optionally wait for running tasks."""
+        self._pool.shutdown(wait=wait)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.shutdown(wait=exc_type is None)
+        return False
@@ -0,0 +1,131 @@
+import asyncio
+import threading
+
+# Polling starts fast (small files finish within a minute) and slows down
+# geometrically for long operations, so hundreds of waits cost few API calls
+MIN_POLL_INTERVAL = 5.0
+MAX_POLL_INTERVAL = 120.0
+POLL_INTERVAL_GROWTH = 1.5
+
+# Number of get_operation calls allowed at the same time
+MAX_CONCURRENT_POLLS = 8
+
+# A watch gives up (and fails with the last error) after this many transient
+# polling errors in a row; the operation itself is not affected by them
+MAX_CONSECUTIVE_POLL_ERRORS = 10
+
+
+class OperationPoller:
+    """
+    One asyncio event loop, on a background thread, that watches long-running
+    operations by name.
+
+    Callers from any thread call watch(name) and receive a
+    concurrent.futures.Future resolved with the final status once the
+    operation is done. Because operations are identified by name only, the
+    same poller reattaches to operations started by an earlier process.
+
+    ``fetch_status(name)`` is a blocking callable returning a dict with at
+    least a "done" key; it runs in the loop's default thread pool. A poll
+    that raises one of ``transient_errors`` (e.g. a 503 or a dropped
+    connection) is reported and retried on the usual schedule; the watch
+    only fails after ``max_consecutive_errors`` of them in a row, or on any
+    other exception.
+    """
+
+    def __init__(self, fetch_status, min_interval: float = None,
+                 max_interval: float = None, growth: float = POLL_INTERVAL_GROWTH,
+                 max_concurrent_polls: int = MAX_CONCURRENT_POLLS,
+                 transient_errors: tuple = (ConnectionError, TimeoutError),
+                 max_consecutive_errors: int = None):
+        self.fetch_status = fetch_status
+        self.transient_errors = transient_errors
+        self.max_consecutive_errors = (MAX_CONSECUTIVE_POLL_ERRORS if max_consecutive_errors is None
+                                       else max_consecutive_errors)
+        self.poll_errors = 0
+        # Intervals default to the module settings at construction time
+        self.min_interval = MIN_POLL_INTERVAL if min_interval is None else min_interval
+        self.max_interval = MAX_POLL_INTERVAL if max_interval is None else max_interval
+        self.growth = growth
+        self.polls = 0
+        self._watches = {}
+        # Re-entrant: a watch that finishes immediately runs _forget on the caller's thread
+        self._lock = threading.RLock()
+        self._loop = asyncio.new_event_loop()
+        self._poll_slots = None
+        self._max_concurrent_polls = max_concurrent_polls
+        self._thread = threading.Thread(target=self._run_loop, name="docai-poller", daemon=True)
+        self._thread.start()
+
+    def _run_loop(self):
+        asyncio.set_event_loop(self._loop)
+        self._poll_slots = asyncio.Semaphore(self._max_concurrent_polls)
+        self._loop.run_forever()
+
+    async def _watch(self, name: str, first_interval: float):
+        interval = first_interval
+        errors = 0
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                async with self._poll_slots:
+                    status = await self._loop.run_in_executor(None, self.fetch_status, name)
+            except self.transient_errors as e:
+                errors += 1
+                self.poll_errors += 1
+                if errors >= self.max_consecutive_errors:
+                    raise
+                print(f"  ⚠️  Polling {name} failed ({errors} in a row): {e}")
+                status = {}
+            else:
+                errors = 0
+            self.polls += 1
+            if status.get("done"):
+                return status
+            interval = min(self.max_interval, interval * self.growth)
+
+    def watch(self, name: str, first_interval: float = None):
+        """
+        Start watching an operation (or join an existing watch of it).
+
+        Args:
+            name (str): Full operation name.
+            first_interval (float): Delay before the first poll; defaults to
+                                    the minimum interval.
+
+        Returns:
+            concurrent.futures.Future: Resolved with the final status dict.
+        """
+        with self._lock:
+            future = self._watches.get(name)
+            if future is None:
+                interval = self.min_interval if first_interval is None else first_interval
+                future = asyncio.run_coroutine_threadsafe(self._watch(name, interval), self._loop)
+                self._watches[name] = future
+                future.add_done_callback(lambda _, name=name: self._forget(name))
+            return future
+
+    def _forget(self, name: str):
+        with self._lock:
+            self._watches.pop(name, None)
+
+    @property
+    def watching(self):
+        """Number of operations currently being watched."""
+        with self._lock:
+            return len(self._watches)
+
+    def close(self):
+        """Stop the event loop; unfinished watches are cancelled."""
+        with self._lock:
+            for future in self._watches.values():
+                future.cancel()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout=5)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
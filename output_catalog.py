@@ -0,0 +1,177 @@
+import re
+import json
+import time
+
+# Catalog objects live next to the outputs: {output_prefix}_catalog/{book}.json
+CATALOG_DIRECTORY = "_catalog/"
+
+SHARD_INDEX_PATTERN = re.compile(r"-(\d+)\.json$")
+
+
+def catalog_object_name(output_prefix: str, english_book_name: str):
+    """Return the object name of a book's catalog."""
+    return f"{output_prefix}{CATALOG_DIRECTORY}{english_book_name}.json"
+
+
+def shard_index(blob_name: str):
+    """Return the shard number of a Document AI output file (name-<n>.json)."""
+    match = SHARD_INDEX_PATTERN.search(blob_name)
+    return int(match.group(1)) if match else 0
+
+
+# --- Building Entries ---
+def list_output_shards(bucket, output_dirs):
+    """
+    List the JSON shards in a set of Document AI output directories.
+
+    The directories of one book share a common prefix, so a single listing
+    of that prefix covers all of them.
+
+    Args:
+        bucket: Output bucket.
+        output_dirs (list): Output directory object prefixes (ending in '/').
+
+    Returns:
+        dict: Output directory -> shard object names in shard order.
+    """
+    shards = {output_dir: [] for output_dir in output_dirs}
+    if not shards:
+        return shards
+
+    common = output_dirs[0]
+    for output_dir in output_dirs[1:]:
+        while not output_dir.startswith(common):
+            common = common[:-1]
+    common = common[:common.rfind('/') + 1]
+
+    for blob in bucket.list_blobs(prefix=common):
+        if not blob.name.endswith('.json'):
+            continue
+        directory = blob.name[:blob.name.rfind('/') + 1]
+        if directory in shards:
+            shards[directory].append(blob.name)
+
+    for names in shards.values():
+        names.sort(key=shard_index)
+    return shards
+
+
+def build_file_entry(bucket_name: str, source_uri: str, parts, shards: dict):
+    """
+    Build the catalog entry of one source PDF.
+
+    Args:
+        bucket_name (str): Output bucket name.
+        source_uri (str): GCS URI of the source PDF.
+        parts (list): (output directory, first page, last page) tuples; one
+                      tuple for a whole file, several for a split file.
+                      Page numbers may be None when unknown.
+        shards (dict): Output directory -> shard object names.
+
+    Returns:
+        dict: The catalog entry.
+    """
+    entry_parts = []
+    for output_dir, first_page, last_page in sorted(parts, key=lambda part: part[1] or 0):
+        entry_parts.append({
+            "page_start": first_page,
+            "page_end": last_page,
+            "shards": [f"gs://{bucket_name}/{name}" for name in shards.get(output_dir, [])],
+        })
+
+    page_starts = [part["page_start"] for part in entry_parts if part["page_start"] is not None]
+    page_ends = [part["page_end"] for part in entry_parts if part["page_end"] is not None]
+    return {
+        "source_uri": source_uri,
+        "page_start": min(page_starts) if page_starts else None,
+        "page_end": max(page_ends) if len(page_ends) == len(entry_parts) else None,
+        "parts": entry_parts,
+    }
+
+
+# --- Reading and Writing ---
+def read_book_catalog(bucket, output_prefix: str, english_book_name: str):
+    """
+    Read a book's catalog.
+
+    Returns:
+        tuple: (catalog dict, object generation or 0 if it does not exist yet)
+    """
+    blob = bucket.blob(catalog_object_name(output_prefix, english_book_name))
+    try:
+        blob.reload()
+    except Exception:
+        return {"book": english_book_name, "files": {}}, 0
+    return json.loads(blob.download_as_bytes()), blob.generation
+
+
+def write_book_catalog(bucket, output_prefix: str, english_book_name: str, file_entries: dict,
+                       retries: int = 5, removed_files=()):
+    """
+    Merge file entries into a book's catalog object.
+
+    The update is a read-modify-write guarded by the object generation, so
+    two runs updating the same book cannot silently overwrite each other.
+
+    Args:
+        bucket: Output bucket.
+        output_prefix (str): Base output prefix.
+        english_book_name (str): English name of the book.
+        file_entries (dict): File number (int) -> entry from build_file_entry.
+        removed_files: File numbers (int) whose entries are dropped, e.g.
+                       because their source PDF was deleted.
+
+    Returns:
+        str: GCS URI of the catalog object.
+    """
+    name = catalog_object_name(output_prefix, english_book_name)
+    for attempt in range(retries):
+        catalog, generation = read_book_catalog(bucket, output_prefix, english_book_name)
+        if generation == 0 and not file_entries:
+            # Nothing to remove from a catalog that does not exist
+            return f"gs://{bucket.name}/{name}"
+        for file_index in removed_files:
+            catalog["files"].pop(f"{file_index:03d}", None)
+        for file_index, entry in file_entries.items():
+            catalog["files"][f"{file_index:03d}"] = entry
+        catalog["updated_at"] = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+        try:
+            bucket.blob(name).upload_from_string(
+                json.dumps(catalog, ensure_ascii=False, indent=1),
+                content_type="application/json",
+                if_generation_match=generation,
+            )
+            return f"gs://{bucket.name}/{name}"
+        except Exception as e:
+            # 412 Precondition Failed: someone else updated the catalog first
+            if "412" not in str(e) or attempt == retries - 1:
+                raise
+    return f"gs://{bucket.name}/{name}"
+
+
+# --- Resolving ---
+def resolve_book_shards(bucket, output_prefix: str, english_book_name: str, file_index: int = None, page: int = None):
+    """
+    Resolve a book (optionally one file, optionally one page) to shard URIs.
+
+    Args:
+        bucket: Output bucket.
+        output_prefix (str): Base output prefix.
+        english_book_name (str): English name of the book.
+        file_index (int): Source file number, or None for every file.
+        page (int): Page of the source file, or None for every page.
+
+    Returns:
+        list: (file number, page_start, page_end, shard URIs) tuples in reading order.
+    """
+    catalog, _ = read_book_catalog(bucket, output_prefix, english_book_name)
+    resolved = []
+    for key in sorted(catalog["files"]):
+        if file_index is not None and int(key) != file_index:
+            continue
+        for part in catalog["files"][key]["parts"]:
+            if page is not None and part["page_start"] is not None:
+                if not part["page_start"] <= page <= (part["page_end"] or page):
+                    continue
+            resolved.append((int(key), part["page_start"], part["page_end"], part["shards"]))
+    return resolved
@@ -0,0 +1,243 @@
+import os
+import json
+import threading
+import concurrent.futures
+from dataclasses import dataclass
+
+# Number of rewrites running at the same time
+FLATTEN_WORKERS = 16
+
+# GCS batch requests accept at most 100 calls
+DELETE_BATCH_SIZE = 100
+
+# Local file remembering rewrite tokens of copies that have not finished yet
+REWRITE_TOKEN_PATH = ".rewrite_tokens.json"
+
+
+@dataclass
+class PlannedRename:
+    """One output shard to be moved to its flattened name."""
+    source_name: str
+    destination_name: str
+    file_index: int = None
+
+
+# --- Planning ---
+def flattened_filename(blob_name: str, english_book_name: str, shard_sources: dict = None):
+    """
+    Work out the flattened file name of one Document AI output shard.
+
+    Args:
+        blob_name (str): Object name of the shard.
+        english_book_name (str): English name of the book to use as prefix.
+        shard_sources (dict): Output directory (object prefix) -> source file number.
+
+    Returns:
+        tuple: (new file name, source file number or None)
+    """
+    original_filename = blob_name.split('/')[-1]
+    file_parts = blob_name.split('/')
+    output_dir = blob_name[:-len(original_filename)]
+
+    if shard_sources and output_dir in shard_sources:
+        # The operation told us which PDF this shard came from
+        file_index = shard_sources[output_dir]
+        return f"{english_book_name}_file{file_index:03d}_{original_filename}", file_index
+
+    if len(file_parts) >= 3 and file_parts[-2].startswith('file_'):
+        # Extract file number from directory name (e.g., file_001)
+        file_num = file_parts[-2].split('_')[1]
+        return f"{english_book_name}_file{file_num}_{original_filename}", None
+
+    # Fallback to simple prefix
+    return f"{english_book_name}_{original_filename}", None
+
+
+def plan_renames(blobs, output_prefix: str, english_book_name: str, shard_sources: dict = None,
+                 exclude_prefixes=()):
+    """
+    Plan every move of a book's outputs before any object is touched.
+
+    Objects under ``exclude_prefixes`` (e.g. the output directory of an
+    operation that was cancelled but is still writing) are left alone.
+
+    Returns:
+        tuple: (list of PlannedRename, list of directory marker names to delete)
+    """
+    renames = []
+    markers = []
+    exclude_prefixes = tuple(exclude_prefixes)
+    for blob in blobs:
+        if exclude_prefixes and blob.name.startswith(exclude_prefixes):
+            continue
+        if blob.name.endswith('/'):
+            markers.append(blob.name)
+            continue
+        new_filename, file_index = flattened_filename(blob.name, english_book_name, shard_sources)
+        renames.append(PlannedRename(blob.name, f"{output_prefix}{new_filename}", file_index))
+    return renames, markers
+
+
+# --- Resumable Rewrites ---
+class RewriteTokenStore:
+    """
+    Thread-safe JSON file of rewrite tokens for copies still in progress.
+
+    A large or cross-location rewrite returns a token after each call. Saving
+    it lets a later run continue the copy where it stopped instead of
+    starting over.
+    """
+
+    def __init__(self, path: str = REWRITE_TOKEN_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._tokens = {}
+        if path and os.path.exists(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    self._tokens = json.load(f)
+            except (OSError, ValueError):
+                self._tokens = {}
+
+    @staticmethod
+    def _key(source_name, destination_name):
+        return f"{source_name}\n{destination_name}"
+
+    def get(self, source_name, destination_name):
+        with self._lock:
+            return self._tokens.get(self._key(source_name, destination_name))
+
+    def set(self, source_name, destination_name, token):
+        with self._lock:
+            key = self._key(source_name, destination_name)
+            if token:
+                self._tokens[key] = token
+            elif self._tokens.pop(key, None) is None:
+                return  # Single-call copies never touch the file
+            self._write()
+
+    def _write(self):
+        if not self.path:
+            return
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(self._tokens, f, ensure_ascii=False)
+        os.replace(temp_path, self.path)
+
+
+def rewrite_object(bucket, rename: PlannedRename, token_store: RewriteTokenStore):
+    """
+    Copy one object to its new name, resuming an interrupted rewrite if possible.
+
+    Returns:
+        PlannedRename: The rename that was completed.
+    """
+    source = bucket.blob(rename.source_name)
+    destination = bucket.blob(rename.destination_name)
+    token = token_store.get(rename.source_name, rename.destination_name)
+
+    while True:
+        try:
+            token, _, _ = destination.rewrite(source, token=token)
+        except Exception:
+            if token is None:
+                raise
+            # The saved token expired or belongs to a changed object; start over
+            token_store.set(rename.source_name, rename.destination_name, None)
+            token, _, _ = destination.rewrite(source)
+        token_store.set(rename.source_name, rename.destination_name, token)
+        if token is None:
+            return rename
+
+
+_token_stores = {}
+_token_stores_lock = threading.Lock()
+
+
+def get_rewrite_token_store(path: str = REWRITE_TOKEN_PATH):
+    """
+    Return the process-wide RewriteTokenStore of ``path``.
+
+    Books flattened at the same time must share one store: separate stores
+    over the same file would overwrite each other's tokens.
+    """
+    with _token_stores_lock:
+        store = _token_stores.get(path)
+        if store is None:
+            store = _token_stores[path] = RewriteTokenStore(path)
+        return store
+
+
+# --- Batched Deletes ---
+def delete_in_batches(client, bucket, names, batch_size: int = DELETE_BATCH_SIZE):
+    """
+    Delete objects using GCS batch requests of up to ``batch_size`` calls.
+
+    Returns:
+        int: Number of delete calls sent.
+    """
+    sent = 0
+    for start in range(0, len(names), batch_size):
+        chunk = names[start:start + batch_size]
+        try:
+            with client.batch(raise_exception=False):
+                for name in chunk:
+                    bucket.delete_blob(name)
+        except TypeError:
+            # Older clients have no raise_exception flag
+            with client.batch():
+                for name in chunk:
+                    bucket.delete_blob(name)
+        sent += len(chunk)
+    return sent
+
+
+# --- Flattening Engine ---
+def flatten_book_outputs(
+    client,
+    bucket,
+    output_prefix: str,
+    english_book_name: str,
+    shard_sources: dict = None,
+    max_workers: int = FLATTEN_WORKERS,
+    token_store: RewriteTokenStore = None,
+    exclude_prefixes=(),
+):
+    """
+    Move every output shard of a book to its flattened name.
+
+    All renames are planned from one listing, the copies run concurrently,
+    and the originals plus directory markers are removed with batched deletes.
+    A source is only deleted once its copy has completed.
+
+    Args:
+        client: google.cloud.storage.Client used for batch requests.
+        bucket: Output bucket.
+        output_prefix (str): Base output prefix.
+        english_book_name (str): English name of the book.
+        shard_sources (dict): Output directory (object prefix) -> source file number.
+        max_workers (int): Number of concurrent rewrites.
+        token_store (RewriteTokenStore): Where rewrite tokens are kept.
+        exclude_prefixes: Object prefixes whose objects are not moved.
+
+    Returns:
+        tuple: (completed renames, failed renames as (rename, error) pairs)
+    """
+    token_store = token_store or get_rewrite_token_store()
+    book_output_prefix = f"{output_prefix}{english_book_name}/"
+    blobs = list(bucket.list_blobs(prefix=book_output_prefix))
+    renames, markers = plan_renames(blobs, output_prefix, english_book_name, shard_sources, exclude_prefixes)
+
+    completed = []
+    failed = []
+    if renames:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as pool:
+            futures = {pool.submit(rewrite_object, bucket, rename, token_store): rename for rename in renames}
+            for future in concurrent.futures.as_completed(futures):
+                try:
+                    completed.append(future.result())
+                except Exception as e:
+                    failed.append((futures[future], e))
+
+    delete_in_batches(client, bucket, [rename.source_name for rename in completed] + markers)
+    return completed, failed
@@ -0,0 +1,133 @@
+import concurrent.futures
+from dataclasses import dataclass
+
+from ocr_cache import blob_content_key
+
+# pypdf is optional: without it page counts are estimated from the object size
+try:
+    from pypdf import PdfReader
+except ImportError:  # pragma: no cover - depends on the environment
+    PdfReader = None
+
+# Average size of one scanned commentary page, used when the PDF cannot be read
+ESTIMATED_BYTES_PER_PAGE = 250_000
+
+# Number of PDFs whose headers are read at the same time
+PAGE_COUNT_WORKERS = 8
+
+
+@dataclass
+class PdfInfo:
+    """Size and page count of one input PDF in GCS."""
+    uri: str
+    size: int
+    page_count: int
+    page_count_estimated: bool = False
+    file_index: int = None
+    # Set on the parts produced by splitting an oversize PDF
+    source_uri: str = None
+    page_offset: int = 0
+    # Why the file cannot be processed at all (e.g. password protected), if known
+    problem: str = None
+    # Identifies the bytes of the object (see ocr_cache.blob_content_key)
+    content_key: str = None
+
+    @property
+    def filename(self):
+        return self.uri.split('/')[-1]
+
+
+def estimate_page_count(size: int):
+    """Estimate the page count of a scanned PDF from its size in bytes."""
+    return max(1, -(-size // ESTIMATED_BYTES_PER_PAGE))
+
+
+def inspect_pdf(blob):
+    """
+    Read the page count of a PDF stored in GCS and detect unusable files.
+
+    The blob is opened as a seekable stream, so pypdf only fetches the
+    trailer, cross-reference table and page tree instead of the whole file.
+
+    Args:
+        blob: google.cloud.storage.Blob of the PDF.
+
+    Returns:
+        tuple: (number of pages or None if unknown, problem or None)
+    """
+    if PdfReader is None:
+        return None, None
+    try:
+        with blob.open("rb") as stream:
+            reader = PdfReader(stream)
+            # Files with an empty user password open fine; others cannot be OCRed
+            if reader.is_encrypted and not reader.decrypt(""):
+                return None, "password protected"
+            return len(reader.pages), None
+    except Exception as e:
+        print(f"    ⚠️  Could not read page count of {blob.name}: {e}")
+        return None, None
+
+
+def read_pdf_page_count(blob):
+    """
+    Read the page count of a PDF stored in GCS.
+
+    Returns:
+        int: Number of pages, or None if the PDF could not be read.
+    """
+    return inspect_pdf(blob)[0]
+
+
+def describe_pdf_blob(blob, bucket_name: str, file_index: int = None):
+    """
+    Build a PdfInfo for a PDF blob, reading its page count when possible.
+
+    Args:
+        blob: google.cloud.storage.Blob of the PDF (size must be loaded).
+        bucket_name (str): The GCS bucket name.
+        file_index (int): 1-based position of the file within its book.
+
+    Returns:
+        PdfInfo: Description of the PDF.
+    """
+    size = blob.size or 0
+    page_count, problem = inspect_pdf(blob) if size else (None, "empty object")
+    estimated = page_count is None
+    if estimated:
+        page_count = estimate_page_count(size)
+    return PdfInfo(
+        uri=f"gs://{bucket_name}/{blob.name}",
+        size=size,
+        page_count=page_count,
+        page_count_estimated=estimated,
+        file_index=file_index,
+        problem=problem,
+        content_key=blob_content_key(blob),
+    )
+
+
+def describe_pdf_blobs(blobs, bucket_name: str, file_indexes=None, max_workers: int = PAGE_COUNT_WORKERS):
+    """
+    Describe several PDF blobs concurrently.
+
+    Args:
+        blobs: PDF blobs to describe.
+        bucket_name (str): The GCS bucket name.
+        file_indexes (list): File number of each blob; defaults to numbering
+                             the blobs 1..N in the given order.
+
+    Returns:
+        list: PdfInfo objects in the same order as ``blobs``.
+    """
+    blobs = list(blobs)
+    if not blobs:
+        return []
+    if file_indexes is None:
+        file_indexes = range(1, len(blobs) + 1)
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = [
+            pool.submit(describe_pdf_blob, blob, bucket_name, file_index)
+            for blob, file_index in zip(blobs, file_indexes)
+        ]
+        return [future.result() for future in futures]
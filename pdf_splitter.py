@@ -0,0 +1,224 @@
+import os
+import re
+import json
+import tempfile
+
+from pdf_info import PdfInfo, PdfReader
+
+try:
+    from pypdf import PdfWriter
+except ImportError:  # pragma: no cover - depends on the environment
+    PdfWriter = None
+
+# Parts are planned at this fraction of the byte limit, because pages are not
+# all the same size and a part must not end up just over the limit
+SPLIT_SIZE_SAFETY = 0.85
+
+SHARD_INDEX_PATTERN = re.compile(r"-(\d+)\.json$")
+
+
+# --- Planning ---
+def plan_page_ranges(pdf: PdfInfo, limits):
+    """
+    Plan page ranges so that each part stays under the per-document limits.
+
+    Args:
+        pdf (PdfInfo): The oversize PDF.
+        limits: ProcessorLimits with max_pages_per_document and max_bytes_per_document.
+
+    Returns:
+        list: (first_page, last_page) tuples, 1-based and inclusive.
+    """
+    parts_for_pages = -(-pdf.page_count // limits.max_pages_per_document)
+    parts_for_bytes = -(-pdf.size // int(limits.max_bytes_per_document * SPLIT_SIZE_SAFETY))
+    part_count = max(1, parts_for_pages, parts_for_bytes)
+
+    pages_per_part = -(-pdf.page_count // part_count)
+    ranges = []
+    first_page = 1
+    while first_page <= pdf.page_count:
+        last_page = min(pdf.page_count, first_page + pages_per_part - 1)
+        ranges.append((first_page, last_page))
+        first_page = last_page + 1
+    return ranges
+
+
+# --- Splitting ---
+def _write_part(reader, first_page: int, last_page: int, path: str):
+    writer = PdfWriter()
+    for page_number in range(first_page - 1, last_page):
+        writer.add_page(reader.pages[page_number])
+    with open(path, "wb") as f:
+        writer.write(f)
+    return os.path.getsize(path)
+
+
+def _split_range(reader, first_page, last_page, path, max_bytes):
+    """Write a page range, halving it until every piece is under max_bytes."""
+    size = _write_part(reader, first_page, last_page, path)
+    if size <= max_bytes or first_page == last_page:
+        return [(first_page, last_page, size)]
+    middle = (first_page + last_page) // 2
+    return (_split_range(reader, first_page, middle, path, max_bytes) +
+            _split_range(reader, middle + 1, last_page, path, max_bytes))
+
+
+def split_pdf_to_gcs(bucket, pdf: PdfInfo, limits, staging_prefix: str):
+    """
+    Split an oversize PDF into page-range parts and upload them to GCS.
+
+    Args:
+        bucket: google.cloud.storage.Bucket holding the PDF.
+        pdf (PdfInfo): The oversize PDF.
+        limits: ProcessorLimits the parts must respect.
+        staging_prefix (str): Object prefix where the parts are uploaded.
+
+    Returns:
+        list: PdfInfo objects for the parts, carrying the original URI in
+              source_uri and the number of preceding pages in page_offset.
+    """
+    if PdfReader is None or PdfWriter is None:
+        raise RuntimeError("pypdf is required to split oversize PDFs (pip install pypdf)")
+
+    blob_name = pdf.uri.replace(f"gs://{bucket.name}/", "", 1)
+    stem = os.path.splitext(pdf.filename)[0]
+    parts = []
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        source_path = os.path.join(temp_dir, "source.pdf")
+        bucket.blob(blob_name).download_to_filename(source_path)
+        reader = PdfReader(source_path)
+        pdf.page_count = len(reader.pages)
+        pdf.page_count_estimated = False
+
+        part_path = os.path.join(temp_dir, "part.pdf")
+        for first_page, last_page in plan_page_ranges(pdf, limits):
+            for part_first, part_last, _ in _split_range(
+                reader, first_page, last_page, part_path, limits.max_bytes_per_document
+            ):
+                # Rewrite the final piece so the file on disk matches this range
+                size = _write_part(reader, part_first, part_last, part_path)
+                part_name = f"{staging_prefix}{stem}_p{part_first:04d}-{part_last:04d}.pdf"
+                bucket.blob(part_name).upload_from_filename(part_path, content_type="application/pdf")
+                parts.append(PdfInfo(
+                    uri=f"gs://{bucket.name}/{part_name}",
+                    size=size,
+                    page_count=part_last - part_first + 1,
+                    file_index=pdf.file_index,
+                    source_uri=pdf.uri,
+                    page_offset=part_first - 1,
+                ))
+
+    return parts
+
+
+def delete_split_parts(bucket, parts):
+    """Remove the staged part PDFs once their outputs have been stitched."""
+    for part in parts:
+        try:
+            bucket.blob(part.uri.replace(f"gs://{bucket.name}/", "", 1)).delete()
+        except Exception:
+            pass  # Ignore errors when removing staged parts
+
+
+# --- Stitching ---
+def _shard_index(blob_name: str):
+    match = SHARD_INDEX_PATTERN.search(blob_name)
+    return int(match.group(1)) if match else 0
+
+
+def _text_segments(node):
+    """Yield every textAnchor segment in a Document (or part of one)."""
+    if isinstance(node, dict):
+        for key, value in node.items():
+            if key == "textAnchor" and isinstance(value, dict):
+                yield from value.get("textSegments", [])
+            else:
+                yield from _text_segments(value)
+    elif isinstance(node, list):
+        for item in node:
+            yield from _text_segments(item)
+
+
+def _rebase_text_anchors(document: dict, text_offset: int):
+    """
+    Move anchors that index the part's whole text onto the stitched text.
+
+    Document AI usually anchors a shard's layout in the text of the whole
+    (part) document, which shows as anchors running past the shard's own
+    text. Those are shifted by the difference between the shard's old and
+    new textOffset; shard-relative anchors are left as they are.
+    """
+    old_offset = int(document.get("shardInfo", {}).get("textOffset", 0) or 0)
+    segments = list(_text_segments(document))
+    ends = [int(segment.get("endIndex", 0)) for segment in segments]
+    if not old_offset or not ends or max(ends) <= len(document.get("text", "")):
+        return
+    shift = text_offset - old_offset
+    for segment in segments:
+        segment["startIndex"] = str(int(segment.get("startIndex", 0)) + shift)
+        segment["endIndex"] = str(int(segment.get("endIndex", 0)) + shift)
+
+
+def stitch_part_outputs(bucket, part_outputs, destination_prefix: str, stem: str):
+    """
+    Stitch the OCR outputs of split parts back into one sharded Document.
+
+    Every part shard is rewritten as a shard of the original document: page
+    numbers are shifted by the part's page offset, shards are renumbered in
+    page order and shardInfo.textOffset is made global. Text anchors that
+    index the part's whole text are moved onto the stitched text by the same
+    amount (see _rebase_text_anchors); shard-relative anchors stay unchanged.
+    Only one shard is held in memory at a time.
+
+    Args:
+        bucket: google.cloud.storage.Bucket holding the outputs.
+        part_outputs (list): (page_offset, output directory object prefix)
+                             tuples, one per part.
+        destination_prefix (str): Object prefix for the stitched shards.
+        stem (str): File name stem of the original PDF.
+
+    Returns:
+        list: Object names of the stitched shards.
+    """
+    shard_names = []
+    for page_offset, output_dir in sorted(part_outputs):
+        names = [
+            blob.name for blob in bucket.list_blobs(prefix=output_dir)
+            if blob.name.endswith('.json')
+        ]
+        for name in sorted(names, key=_shard_index):
+            shard_names.append((page_offset, name))
+
+    stitched = []
+    text_offset = 0
+    shard_count = len(shard_names)
+    for shard_index, (page_offset, name) in enumerate(shard_names):
+        document = json.loads(bucket.blob(name).download_as_bytes())
+
+        for page in document.get("pages", []):
+            page["pageNumber"] = int(page.get("pageNumber", 0)) + page_offset
+
+        _rebase_text_anchors(document, text_offset)
+        document["shardInfo"] = {
+            "shardIndex": str(shard_index),
+            "shardCount": str(shard_count),
+            "textOffset": str(text_offset),
+        }
+        text_offset += len(document.get("text", ""))
+
+        new_name = f"{destination_prefix}{stem}-{shard_index}.json"
+        bucket.blob(new_name).upload_from_string(
+            json.dumps(document, ensure_ascii=False),
+            content_type="application/json",
+        )
+        stitched.append(new_name)
+
+    # The per-part outputs are now redundant
+    for _, name in shard_names:
+        try:
+            bucket.blob(name).delete()
+        except Exception:
+            pass  # Ignore errors when removing part outputs
+
+    return stitched
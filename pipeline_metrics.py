@@ -0,0 +1,402 @@
+import os
+import json
+import time
+import threading
+import contextlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# --- Metrics Output ---
+# JSON-lines log of every timing span and event (one object per line)
+METRICS_LOG_PATH = "ocr_metrics.jsonl"
+
+# Prometheus text exposition file, rewritten every METRICS_EXPORT_INTERVAL_SECONDS;
+# point node_exporter's textfile collector at its directory to scrape it
+METRICS_PROMETHEUS_PATH = "ocr_metrics.prom"
+METRICS_EXPORT_INTERVAL_SECONDS = 15.0
+
+# Upper bounds (seconds) of the duration histogram buckets; Document AI waits
+# range from seconds (online requests) to hours (large batch operations)
+DURATION_BUCKETS = (0.1, 0.5, 1, 2.5, 5, 15, 30, 60, 120, 300, 600, 1800, 3600, 7200, 21600)
+
+# Prefix of every exported metric name
+METRIC_PREFIX = "ocr_"
+
+# HELP lines of the metrics the pipeline records (name without prefix or suffix)
+METRIC_HELP = {
+    "requests_submitted": "Requests accepted by Document AI, by path (batch or online).",
+    "documents_submitted": "Documents (files or split parts) in accepted requests.",
+    "pages_submitted": "Pages in accepted requests.",
+    "bytes_submitted": "Bytes of the documents in accepted requests.",
+    "quota_errors": "Submissions rejected with a quota error.",
+    "submission_retries": "Resubmissions after quota errors (batch) or retryable failures (requeue).",
+    "failures": "Failed documents, by stage and failure class.",
+    "requests_finished": "Requests collected, by outcome.",
+    "cache_hits": "Files whose OCR result was reused from the content cache.",
+    "books_finished": "Books whose outputs were published.",
+    "operation_slots": "Concurrent batch operations allowed to this process.",
+    "operations_in_flight": "Batch operation slots held by this process.",
+    "requests_pending": "Requests queued or running but not yet collected.",
+    "requests_queued": "Requests waiting for an operation slot.",
+    "operations_watched": "Operations the poller is waiting on.",
+    "host_operation_slots_in_use": "Batch operation slots of a processor leased by every process on the host.",
+    "endpoint_operation_slots": "Concurrent batch operations allowed on a processor.",
+    "endpoint_operations_in_flight": "Batch operation slots this process holds on a processor.",
+    "endpoint_concurrency_limit": "Batch operations currently allowed in flight on a processor (adaptive).",
+    "endpoint_submissions": "Batch requests accepted by a processor.",
+    "endpoint_errors": "Batch submissions to a processor that failed.",
+    "stage_workers": "Worker threads of a pipeline stage.",
+    "stage_workers_busy": "Workers of a pipeline stage handling an item.",
+    "stage_queue_depth": "Items waiting in a pipeline stage's queue.",
+    "stage_errors": "Items whose pipeline stage handler failed.",
+    "hedges": "Slow batch operations past the p95 of their size class, by whether a duplicate was submitted.",
+    "hedges_won": "Duplicated batch requests whose duplicate finished first.",
+    "deadlines_expired": "Batch operations cancelled at their deadline, by size class.",
+    "file": "Time from queueing a document to its result.",
+    "submit": "batch_process_documents calls.",
+    "quota_wait": "Waits for the shared submission rate limit.",
+    "operation_wait": "Waits for a batch operation to finish after submission.",
+    "list_subdirectories": "Listing and indexing of the book directories.",
+    "list_pdfs": "Listing of one book directory.",
+    "catalog": "Writing one book's catalog.",
+    "stitch": "Stitching one book's split files.",
+    "flatten": "Flattening one book's outputs.",
+    "assemble": "Assembling one book's text from its shards.",
+    "stage": "Handling of one item by a pipeline stage.",
+    "stage_backpressure": "Waits for room in a full pipeline stage queue.",
+    "assemble_all": "Assembling every book's text (--assemble).",
+}
+
+
+def _label_key(labels: dict):
+    return tuple(sorted((name, str(value)) for name, value in labels.items() if value is not None))
+
+
+def _format_labels(key, extra=()):
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (
+        (name, value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"'))
+        for name, value in pairs
+    )
+    return "{" + ",".join(f'{name}="{value}"' for name, value in escaped) + "}"
+
+
+def _format_value(value: float):
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class PipelineMetrics:
+    """
+    Counters, gauges and duration histograms of one OCR run, with a JSON-lines
+    event log and a Prometheus text export.
+
+    Every method is thread-safe, so executor workers, the poller thread and
+    the main thread record into the same instance. Metric names are given
+    without METRIC_PREFIX; labels are keyword arguments (None values are
+    dropped).
+
+    Usage:
+        metrics = PipelineMetrics(log_path="ocr_metrics.jsonl", prometheus_path="ocr_metrics.prom")
+        with metrics.span("flatten", book="01_Genesis"):
+            ...
+        metrics.inc("pages_submitted", 120, path="batch")
+        metrics.gauge_function("operations_in_flight", lambda: executor.in_flight)
+        metrics.close()
+    """
+
+    def __init__(self, log_path: str = None, prometheus_path: str = None,
+                 export_interval: float = METRICS_EXPORT_INTERVAL_SECONDS):
+        self.prometheus_path = prometheus_path
+        self.export_interval = export_interval
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._gauges = {}
+        self._gauge_functions = {}
+        self._histograms = {}
+        self._log = open(log_path, "a", encoding="utf-8") if log_path else None
+        self._server = None
+        self._stop = threading.Event()
+        self._exporter = None
+        if prometheus_path and export_interval:
+            self._exporter = threading.Thread(target=self._export_loop, name="metrics-export", daemon=True)
+            self._exporter.start()
+
+    # --- Recording ---
+    def inc(self, name: str, value: float = 1, **labels):
+        """Add ``value`` to a counter (exported as {prefix}{name}_total)."""
+        key = _label_key(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def set_gauge(self, name: str, value: float, **labels):
+        """Set a gauge to ``value``."""
+        with self._lock:
+            self._gauges.setdefault(name, {})[_label_key(labels)] = value
+
+    def gauge_function(self, name: str, function, **labels):
+        """
+        Export a gauge read from ``function()`` whenever metrics are exported,
+        e.g. the number of operations an executor holds in flight.
+
+        Passing None as the function removes the gauge.
+        """
+        key = _label_key(labels)
+        with self._lock:
+            series = self._gauge_functions.setdefault(name, {})
+            if function is None:
+                series.pop(key, None)
+            else:
+                series[key] = function
+
+    def observe(self, name: str, seconds: float, **labels):
+        """Add one duration to a histogram (exported as {prefix}{name}_seconds)."""
+        key = _label_key(labels)
+        with self._lock:
+            histogram = self._histograms.setdefault(name, {}).get(key)
+            if histogram is None:
+                histogram = {"buckets": [0] * len(DURATION_BUCKETS), "count": 0, "sum": 0.0}
+                self._histograms[name][key] = histogram
+            for i, bound in enumerate(DURATION_BUCKETS):
+                if seconds <= bound:
+                    histogram["buckets"][i] += 1
+            histogram["count"] += 1
+            histogram["sum"] += seconds
+
+    def event(self, name: str, **fields):
+        """Write one event to the JSON-lines log."""
+        if self._log is None:
+            return
+        record = {"time": round(time.time(), 3), "event": name}
+        record.update({key: value for key, value in fields.items() if value is not None})
+        line = json.dumps(record, ensure_ascii=False, default=str)
+        with self._lock:
+            if not self._log.closed:
+                self._log.write(line + "\n")
+                self._log.flush()
+
+    def record_span(self, name: str, seconds: float, outcome: str = "ok", **labels):
+        """
+        Record a finished timing span measured by the caller.
+
+        The duration goes to the ``{name}`` histogram (labelled with the
+        outcome) and to the log together with every label.
+        """
+        self.observe(name, seconds, outcome=outcome)
+        self.event("span", span=name, seconds=round(seconds, 4), outcome=outcome, **labels)
+
+    @contextlib.contextmanager
+    def span(self, name: str, **labels):
+        """
+        Time the body of a with-block as a span (see record_span).
+
+        The outcome is "error" if the body raises; the exception propagates.
+        """
+        started = time.monotonic()
+        try:
+            yield
+        except BaseException:
+            self.record_span(name, time.monotonic() - started, outcome="error", **labels)
+            raise
+        self.record_span(name, time.monotonic() - started, **labels)
+
+    # --- Reading ---
+    def snapshot(self):
+        """
+        Return every counter, gauge and histogram count/sum as plain values.
+
+        Returns:
+            dict: "counters", "gauges" and "histograms", each name ->
+                  {label string: value}.
+        """
+        with self._lock:
+            counters = {name: dict(series) for name, series in self._counters.items()}
+            gauges = {name: dict(series) for name, series in self._gauges.items()}
+            functions = {name: dict(series) for name, series in self._gauge_functions.items()}
+            histograms = {
+                name: {key: {"count": h["count"], "sum": h["sum"]} for key, h in series.items()}
+                for name, series in self._histograms.items()
+            }
+        for name, series in functions.items():
+            for key, function in series.items():
+                gauges.setdefault(name, {})[key] = self._read_gauge(function)
+
+        def _by_label(metrics):
+            return {name: {_format_labels(key): value for key, value in series.items()}
+                    for name, series in metrics.items()}
+
+        return {
+            "counters": _by_label(counters),
+            "gauges": _by_label(gauges),
+            "histograms": _by_label(histograms),
+        }
+
+    @staticmethod
+    def _read_gauge(function):
+        try:
+            return float(function())
+        except Exception:
+            return float("nan")
+
+    # --- Prometheus Export ---
+    def render_prometheus(self):
+        """Return every metric in the Prometheus text exposition format."""
+        with self._lock:
+            histograms = {
+                name: {key: {"buckets": list(h["buckets"]), "count": h["count"], "sum": h["sum"]}
+                       for key, h in series.items()}
+                for name, series in self._histograms.items()
+            }
+            counters = {name: dict(series) for name, series in self._counters.items()}
+            gauges = {name: dict(series) for name, series in self._gauges.items()}
+            functions = {name: dict(series) for name, series in self._gauge_functions.items()}
+
+        lines = []
+
+        def _header(name, metric_name, metric_type):
+            if name in METRIC_HELP:
+                lines.append(f"# HELP {metric_name} {METRIC_HELP[name]}")
+            lines.append(f"# TYPE {metric_name} {metric_type}")
+
+        for name in sorted(counters):
+            metric_name = f"{METRIC_PREFIX}{name}_total"
+            _header(name, metric_name, "counter")
+            for key, value in sorted(counters[name].items()):
+                lines.append(f"{metric_name}{_format_labels(key)} {_format_value(value)}")
+
+        for name in sorted(set(gauges) | set(functions)):
+            metric_name = f"{METRIC_PREFIX}{name}"
+            _header(name, metric_name, "gauge")
+            values = dict(gauges.get(name, {}))
+            for key, function in functions.get(name, {}).items():
+                values[key] = self._read_gauge(function)
+            for key, value in sorted(values.items()):
+                lines.append(f"{metric_name}{_format_labels(key)} {_format_value(value)}")
+
+        for name in sorted(histograms):
+            metric_name = f"{METRIC_PREFIX}{name}_seconds"
+            _header(name, metric_name, "histogram")
+            for key, histogram in sorted(histograms[name].items()):
+                for bound, count in zip(DURATION_BUCKETS, histogram["buckets"]):
+                    lines.append(f"{metric_name}_bucket{_format_labels(key, [('le', _format_value(bound))])} {count}")
+                lines.append(f"{metric_name}_bucket{_format_labels(key, [('le', '+Inf')])} {histogram['count']}")
+                lines.append(f"{metric_name}_sum{_format_labels(key)} {_format_value(histogram['sum'])}")
+                lines.append(f"{metric_name}_count{_format_labels(key)} {histogram['count']}")
+
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path: str = None):
+        """
+        Write the Prometheus text export to a file.
+
+        The file is replaced atomically, so a scraper never reads half of it.
+        """
+        path = path or self.prometheus_path
+        if not path:
+            return
+        temporary_path = f"{path}.tmp"
+        with open(temporary_path, "w", encoding="utf-8") as f:
+            f.write(self.render_prometheus())
+        os.replace(temporary_path, path)
+
+    def _export_loop(self):
+        while not self._stop.wait(self.export_interval):
+            try:
+                self.write_prometheus()
+            except OSError as e:
+                print(f"⚠️  Could not write metrics to {self.prometheus_path}: {e}")
+
+    def serve(self, port: int, host: str = "127.0.0.1"):
+        """
+        Serve the Prometheus text export on http://{host}:{port}/metrics from
+        a background thread.
+
+        Returns:
+            int: The port actually bound (useful when ``port`` is 0).
+        """
+        metrics = self
+
+        class _MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] not in ("/", "/metrics"):
+                    self.send_error(404)
+                    return
+                body = metrics.render_prometheus().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass  # Scrapes would drown the pipeline's own output
+
+        self._server = ThreadingHTTPServer((host, port), _MetricsHandler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, name="metrics-http", daemon=True).start()
+        return self._server.server_address[1]
+
+    def close(self):
+        """Write the final Prometheus export, stop the exporter and server, and close the log."""
+        self._stop.set()
+        if self._exporter is not None:
+            self._exporter.join(timeout=5)
+        if self.prometheus_path:
+            try:
+                self.write_prometheus()
+            except OSError as e:
+                print(f"⚠️  Could not write metrics to {self.prometheus_path}: {e}")
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+        with self._lock:
+            if self._log is not None:
+                self._log.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+
+# --- Process-Wide Metrics ---
+# Helpers record into this instance; until configure_metrics is called it
+# only keeps values in memory
+_metrics = PipelineMetrics()
+_metrics_lock = threading.Lock()
+
+
+def configure_metrics(log_path: str = METRICS_LOG_PATH, prometheus_path: str = METRICS_PROMETHEUS_PATH,
+                      port: int = None, export_interval: float = METRICS_EXPORT_INTERVAL_SECONDS):
+    """
+    Replace the process-wide metrics with a fresh instance writing to the given outputs.
+
+    Args:
+        log_path (str): JSON-lines log of spans and events, or None.
+        prometheus_path (str): Prometheus text file, or None.
+        port (int): Serve /metrics on this local port, or None.
+        export_interval (float): Seconds between rewrites of the Prometheus file.
+
+    Returns:
+        PipelineMetrics: The new shared instance.
+    """
+    global _metrics
+    with _metrics_lock:
+        _metrics.close()
+        _metrics = PipelineMetrics(log_path, prometheus_path, export_interval)
+        if port is not None:
+            _metrics.serve(port)
+        return _metrics
+
+
+def get_metrics():
+    """Return the process-wide metrics."""
+    return _metrics
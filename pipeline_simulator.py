@@ -0,0 +1,912 @@
+import io
+import os
+import time
+import base64
+import random
+import hashlib
+import argparse
+import tempfile
+import threading
+import contextlib
+import unicodedata
+import collections
+from types import SimpleNamespace
+from dataclasses import dataclass
+
+from google.api_core import exceptions as google_exceptions
+from google.cloud import documentai_v1beta3 as documentai
+from google.longrunning import operations_pb2
+from google.protobuf import any_pb2
+from google.rpc import status_pb2
+
+import main
+import quota_limiter
+import operation_poller
+import processor_pool
+import operation_deadlines
+import adaptive_concurrency
+from gcp_clients import install_clients
+from job_manifest import JobManifest
+from quota_limiter import QuotaLimiter
+from processor_pool import ProcessorEndpoint, endpoint_resource
+from pipeline_metrics import get_metrics
+from request_scheduling import SCHEDULING_POLICIES
+
+# --- Simulation Settings ---
+# Simulated seconds that pass per real second. Every modelled latency is in
+# simulated seconds, and the pipeline's own waits (poll intervals, rate
+# limits, retry delays) are scaled by the same factor during a run.
+TIME_SCALE = 60.0
+
+# Number of book directories in the synthetic corpus
+SIMULATED_BOOKS = 66
+
+# Seed of the corpus and of every random draw of the fakes
+SIMULATION_SEED = 7
+
+# How often the harness samples the operation slots in use (real seconds)
+SAMPLE_INTERVAL_SECONDS = 0.05
+
+# Output of the pipeline (its progress prints) during a simulated run
+SIMULATION_LOG_PATH = "simulation.log"
+
+SIMULATED_BUCKET = "ocr-simulation"
+SIMULATED_PROJECT = "simulated-project"
+SIMULATED_LOCATION = "us"
+SIMULATED_PROCESSOR = "simulated-ocr"
+
+
+@dataclass
+class LatencyModel:
+    """
+    Latencies and error rates of the fake services, in simulated seconds.
+
+    Defaults are rough figures for a single-region bucket and the Document
+    AI OCR processor; tune them to match what real runs log.
+    """
+    request_overhead: float = 0.04          # Any GCS JSON API call
+    bytes_per_second: float = 100e6         # GCS upload / download throughput
+    list_page_seconds: float = 0.15         # One page of a listing
+    list_page_size: int = 1000
+    rewrite_seconds: float = 0.12           # Server-side copy of one object
+    rewrite_bytes_per_call: int = 256 * 1024 * 1024
+    batch_request_seconds: float = 0.15     # One GCS batch request (up to 100 calls)
+    submit_seconds: float = 0.6             # batch_process_documents
+    get_operation_seconds: float = 0.1
+    operation_startup_seconds: float = 30.0 # Queueing and setup of a batch operation
+    seconds_per_page: float = 0.5           # OCR time per page in a batch operation
+    operation_jitter: float = 0.2           # +/- fraction applied to operation durations
+    online_seconds: float = 2.0             # process_document overhead
+    online_seconds_per_page: float = 0.4
+    quota_error_rate: float = 0.02          # Fraction of submissions rejected with 429
+    max_concurrent_operations: int = 5      # Server-side concurrent batch operation quota
+    max_file_bytes: int = 52428800          # "File too large" above this size
+    online_max_pages: int = 15
+    pages_per_shard: int = 100              # Pages per output JSON shard
+
+
+class SimulationClock:
+    """Converts between simulated and real time."""
+
+    def __init__(self, time_scale: float = TIME_SCALE):
+        self.time_scale = time_scale
+        self._started = time.monotonic()
+
+    def now(self):
+        """Simulated seconds since the clock was created."""
+        return (time.monotonic() - self._started) * self.time_scale
+
+    def sleep(self, seconds: float):
+        """Block for a duration given in simulated seconds."""
+        if seconds > 0:
+            time.sleep(seconds / self.time_scale)
+
+
+class ApiCallCounter:
+    """Thread-safe count of API calls by method name."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = collections.Counter()
+
+    def count(self, method: str, calls: int = 1):
+        with self._lock:
+            self._counts[method] += calls
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self._counts)
+
+
+# --- Synthetic PDFs ---
+_pdf_cache = {}
+
+
+def synthetic_pdf(page_count: int):
+    """
+    Return the bytes of a minimal, valid PDF with blank pages.
+
+    The bytes stand in for a scanned PDF: pypdf reads its page count and can
+    split it, while the object's reported size is modelled separately.
+    """
+    if page_count in _pdf_cache:
+        return _pdf_cache[page_count]
+    kids = " ".join(f"{number} 0 R" for number in range(3, page_count + 3))
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        f"<< /Type /Pages /Kids [{kids}] /Count {page_count} >>".encode(),
+    ]
+    objects.extend(b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] >>" for _ in range(page_count))
+
+    data = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(data))
+        data += b"%d 0 obj\n" % number + body + b"\nendobj\n"
+    xref_offset = len(data)
+    data += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    data += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    data += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref_offset)
+    _pdf_cache[page_count] = bytes(data)
+    return _pdf_cache[page_count]
+
+
+# --- Fake GCS ---
+@dataclass
+class StoredObject:
+    data: bytes
+    size: int
+    generation: int
+    md5_hash: str
+    crc32c: str
+    page_count: int = None
+    too_large: bool = False
+
+
+class FakeObjectStore:
+    """Objects of every simulated bucket; shared by the fake GCS and Document AI."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buckets = collections.defaultdict(dict)
+        self._generation = 1_000_000
+
+    def put(self, bucket_name: str, name: str, data: bytes, size: int = None, md5_hash: str = None,
+            page_count: int = None, too_large: bool = False, if_generation_match: int = None):
+        with self._lock:
+            objects = self._buckets[bucket_name]
+            if if_generation_match is not None:
+                current = objects[name].generation if name in objects else 0
+                if current != if_generation_match:
+                    raise google_exceptions.PreconditionFailed(
+                        f"At least one of the pre-conditions you specified did not hold: {name}"
+                    )
+            self._generation += 1
+            stored = StoredObject(
+                data=data,
+                size=len(data) if size is None else size,
+                generation=self._generation,
+                md5_hash=md5_hash or base64.b64encode(hashlib.md5(data).digest()).decode(),
+                crc32c=base64.b64encode(hashlib.sha1(data).digest()[:4]).decode(),
+                page_count=page_count,
+                too_large=too_large,
+            )
+            objects[name] = stored
+            return stored
+
+    def get(self, bucket_name: str, name: str):
+        with self._lock:
+            return self._buckets[bucket_name].get(name)
+
+    def delete(self, bucket_name: str, name: str):
+        with self._lock:
+            return self._buckets[bucket_name].pop(name, None) is not None
+
+    def names(self, bucket_name: str, prefix: str = ""):
+        with self._lock:
+            return sorted(name for name in self._buckets[bucket_name] if name.startswith(prefix))
+
+
+class FakeBlob:
+    """Stand-in for google.cloud.storage.Blob."""
+
+    def __init__(self, bucket, name: str, stored: StoredObject = None):
+        self.bucket = bucket
+        self.name = name
+        self._set_properties(stored)
+
+    def _set_properties(self, stored):
+        self.size = stored.size if stored else None
+        self.generation = stored.generation if stored else None
+        self.md5_hash = stored.md5_hash if stored else None
+        self.crc32c = stored.crc32c if stored else None
+
+    @property
+    def _client(self):
+        return self.bucket.client
+
+    def _stored(self):
+        stored = self._client.store.get(self.bucket.name, self.name)
+        if stored is None:
+            raise google_exceptions.NotFound(f"No such object: {self.bucket.name}/{self.name}")
+        return stored
+
+    def reload(self):
+        self._client.call("storage.objects.get")
+        self._set_properties(self._stored())
+
+    def exists(self):
+        self._client.call("storage.objects.get")
+        return self._client.store.get(self.bucket.name, self.name) is not None
+
+    def download_as_bytes(self):
+        data = self._stored().data
+        self._client.call("storage.objects.get", len(data))
+        return data
+
+    def download_to_filename(self, filename: str):
+        with open(filename, "wb") as f:
+            f.write(self.download_as_bytes())
+
+    def open(self, mode: str = "rb"):
+        if mode != "rb":
+            raise ValueError("The simulated blob only supports reading")
+        # A seekable reader fetches metadata first, then the ranges it needs
+        return io.BytesIO(self.download_as_bytes())
+
+    def upload_from_string(self, data, content_type: str = None, if_generation_match: int = None):
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        self._client.call("storage.objects.insert", len(data))
+        self._set_properties(self._client.store.put(
+            self.bucket.name, self.name, data, if_generation_match=if_generation_match
+        ))
+
+    def upload_from_filename(self, filename: str, content_type: str = None):
+        with open(filename, "rb") as f:
+            self.upload_from_string(f.read(), content_type=content_type)
+
+    def delete(self):
+        self._client.call("storage.objects.delete")
+        if not self._client.store.delete(self.bucket.name, self.name):
+            raise google_exceptions.NotFound(f"No such object: {self.bucket.name}/{self.name}")
+
+    def rewrite(self, source, token: str = None):
+        """Copy in calls of at most rewrite_bytes_per_call bytes, like the rewrite API."""
+        stored = source._stored()
+        done = int(token) if token else 0
+        chunk = min(stored.size - done, self._client.latency.rewrite_bytes_per_call)
+        self._client.call("storage.objects.rewrite", extra_seconds=self._client.latency.rewrite_seconds)
+        done += chunk
+        if done < stored.size:
+            return str(done), done, stored.size
+        self._set_properties(self._client.store.put(
+            self.bucket.name, self.name, stored.data, size=stored.size, md5_hash=stored.md5_hash,
+            page_count=stored.page_count, too_large=stored.too_large,
+        ))
+        return None, done, stored.size
+
+
+class FakeBucket:
+    """Stand-in for google.cloud.storage.Bucket."""
+
+    def __init__(self, client, name: str):
+        self.client = client
+        self.name = name
+        self.metageneration = 1
+
+    def reload(self):
+        self.client.call("storage.buckets.get")
+
+    def blob(self, name: str):
+        return FakeBlob(self, name)
+
+    def list_blobs(self, prefix: str = None, delimiter: str = None):
+        return self.client.list_blobs(self, prefix=prefix, delimiter=delimiter)
+
+    def copy_blob(self, blob, destination_bucket, new_name: str):
+        stored = blob._stored()
+        self.client.call("storage.objects.copy", extra_seconds=self.client.latency.rewrite_seconds)
+        copy = destination_bucket.blob(new_name)
+        copy._set_properties(self.client.store.put(
+            destination_bucket.name, new_name, stored.data, size=stored.size,
+            md5_hash=stored.md5_hash, page_count=stored.page_count, too_large=stored.too_large,
+        ))
+        return copy
+
+    def delete_blob(self, name: str):
+        batch = self.client._current_batch()
+        if batch is not None:
+            batch.append((self.name, name))
+            return
+        self.blob(name).delete()
+
+
+class FakeBlobIterator:
+    """Listing result; like HTTPIterator, ``prefixes`` fills in while iterating."""
+
+    def __init__(self, client, bucket, prefix: str, delimiter: str):
+        self.client = client
+        self.bucket = bucket
+        self.prefix = prefix or ""
+        self.delimiter = delimiter
+        self.prefixes = set()
+
+    def __iter__(self):
+        items = []
+        for name in self.client.store.names(self.bucket.name, self.prefix):
+            rest = name[len(self.prefix):]
+            if self.delimiter and self.delimiter in rest:
+                prefix = self.prefix + rest.split(self.delimiter, 1)[0] + self.delimiter
+                if prefix not in self.prefixes:
+                    self.prefixes.add(prefix)
+                    items.append(None)  # Prefixes fill listing pages too
+                continue
+            items.append(name)
+
+        page_size = self.client.latency.list_page_size
+        for start in range(0, max(len(items), 1), page_size):
+            self.client.call("storage.objects.list", extra_seconds=self.client.latency.list_page_seconds)
+            for name in items[start:start + page_size]:
+                if name is None:
+                    continue
+                stored = self.client.store.get(self.bucket.name, name)
+                if stored is not None:
+                    yield FakeBlob(self.bucket, name, stored)
+
+
+class FakeStorageClient:
+    """
+    Stand-in for google.cloud.storage.Client backed by a FakeObjectStore.
+
+    Every call sleeps for its modelled latency (plus transfer time) and is
+    counted by JSON API method name, e.g. "storage.objects.list".
+    """
+
+    def __init__(self, store: FakeObjectStore, clock: SimulationClock, latency: LatencyModel,
+                 counter: ApiCallCounter):
+        self.store = store
+        self.clock = clock
+        self.latency = latency
+        self.counter = counter
+        self._local = threading.local()
+
+    def call(self, method: str, transferred: int = 0, extra_seconds: float = 0.0):
+        self.counter.count(method)
+        self.clock.sleep(self.latency.request_overhead + extra_seconds +
+                         transferred / self.latency.bytes_per_second)
+
+    def bucket(self, name: str):
+        return FakeBucket(self, name)
+
+    def get_bucket(self, name: str):
+        bucket = self.bucket(name)
+        bucket.reload()
+        return bucket
+
+    def list_blobs(self, bucket_or_name, prefix: str = None, delimiter: str = None):
+        bucket = bucket_or_name if isinstance(bucket_or_name, FakeBucket) else self.bucket(bucket_or_name)
+        return FakeBlobIterator(self, bucket, prefix, delimiter)
+
+    def _current_batch(self):
+        return getattr(self._local, "batch", None)
+
+    @contextlib.contextmanager
+    def batch(self, raise_exception: bool = True):
+        """Collect delete_blob calls and send them as one batch request."""
+        self._local.batch = []
+        try:
+            yield self
+            deletes = self._local.batch
+        finally:
+            self._local.batch = None
+        self.counter.count("storage.batch")
+        self.counter.count("storage.objects.delete", len(deletes))
+        self.clock.sleep(self.latency.batch_request_seconds)
+        for bucket_name, name in deletes:
+            if not self.store.delete(bucket_name, name) and raise_exception:
+                raise google_exceptions.NotFound(f"No such object: {bucket_name}/{name}")
+
+
+# --- Fake Document AI ---
+@dataclass
+class SimulatedOperation:
+    name: str
+    accepted_at: float
+    done_at: float
+    output_uri: str
+    documents: list
+    metadata: bytes = None
+    error: status_pb2.Status = None
+
+
+def _split_uri(uri: str):
+    bucket_name, name = uri.replace("gs://", "", 1).split("/", 1)
+    return bucket_name, name
+
+
+def _page_text(stem: str, page_number: int):
+    return f"[{stem} page {page_number}]\n"
+
+
+class FakeDocumentAIClient:
+    """
+    Stand-in for DocumentProcessorServiceClient.
+
+    Batch operations run for startup + seconds_per_page * pages (simulated)
+    and write one JSON shard per pages_per_shard pages to
+    ``<output>/<operation id>/<document index>/`` when they finish. Files
+    flagged too large, or over max_file_bytes, fail with "File too large";
+    a fraction of submissions, and any submission beyond the concurrent
+    operation quota, fail with ResourceExhausted. A cancelled operation
+    ends at once without outputs.
+    """
+
+    def __init__(self, store: FakeObjectStore, clock: SimulationClock, latency: LatencyModel,
+                 counter: ApiCallCounter, rng: random.Random):
+        self.store = store
+        self.clock = clock
+        self.latency = latency
+        self.counter = counter
+        self.rng = rng
+        self._lock = threading.Lock()
+        self._operations = {}
+        self._next_operation = 1
+        self.quota_errors = 0
+        self.too_large_errors = 0
+
+    def _call(self, method: str, seconds: float):
+        self.counter.count(f"documentai.{method}")
+        self.clock.sleep(seconds)
+
+    @staticmethod
+    def processor_path(project: str, location: str, processor: str):
+        return f"projects/{project}/locations/{location}/processors/{processor}"
+
+    def get_processor(self, name: str = None, request=None):
+        self._call("get_processor", self.latency.get_operation_seconds)
+        return SimpleNamespace(name=name, default_processor_version=f"{name}/processorVersions/simulated")
+
+    def running_operations(self):
+        now = self.clock.now()
+        with self._lock:
+            return sum(1 for operation in self._operations.values() if operation.done_at > now)
+
+    def busy_seconds(self, until: float):
+        """Simulated operation-seconds spent running up to ``until``."""
+        with self._lock:
+            return sum(max(0.0, min(operation.done_at, until) - operation.accepted_at)
+                       for operation in self._operations.values())
+
+    def _document_failure(self, uri: str):
+        stored = self.store.get(*_split_uri(uri))
+        if stored is None:
+            return 5, f"Document not found: {uri}"
+        if stored.too_large or stored.size > self.latency.max_file_bytes:
+            with self._lock:
+                self.too_large_errors += 1
+            actual_size = max(stored.size, self.latency.max_file_bytes + 1)
+            return 3, f"File too large. Limit: {self.latency.max_file_bytes}, actual size: {actual_size}"
+        return None
+
+    def _pages(self, uri: str):
+        stored = self.store.get(*_split_uri(uri))
+        return (stored.page_count or 1) if stored else 0
+
+    def batch_process_documents(self, request=None):
+        self._call("batch_process_documents", self.latency.submit_seconds)
+        with self._lock:
+            now = self.clock.now()
+            running = sum(1 for operation in self._operations.values() if operation.done_at > now)
+            if running >= self.latency.max_concurrent_operations or self.rng.random() < self.latency.quota_error_rate:
+                self.quota_errors += 1
+                raise google_exceptions.ResourceExhausted(
+                    "Quota exceeded for quota metric 'Concurrent batch process requests'"
+                )
+            operation_id = self._next_operation
+            self._next_operation += 1
+
+        documents = [document.gcs_uri for document in request.input_documents.gcs_documents.documents]
+        pages = sum(self._pages(uri) for uri in documents)
+        duration = self.latency.operation_startup_seconds + self.latency.seconds_per_page * pages
+        duration *= 1 + self.rng.uniform(-self.latency.operation_jitter, self.latency.operation_jitter)
+        name = f"projects/{SIMULATED_PROJECT}/locations/{SIMULATED_LOCATION}/operations/{operation_id}"
+        output_uri = request.document_output_config.gcs_output_config.gcs_uri.rstrip('/') + '/'
+        with self._lock:
+            self._operations[name] = SimulatedOperation(
+                name=name, accepted_at=now, done_at=now + duration,
+                output_uri=f"{output_uri}{operation_id}/", documents=documents,
+            )
+        return SimpleNamespace(operation=operations_pb2.Operation(name=name))
+
+    def _write_shards(self, uri: str, output_dir: str):
+        bucket_name, prefix = _split_uri(output_dir)
+        stem = os.path.splitext(uri.rsplit('/', 1)[-1])[0]
+        page_count = self._pages(uri)
+        shard_pages = self.latency.pages_per_shard
+        shard_count = max(1, -(-page_count // shard_pages))
+        text_offset = 0
+        for shard in range(shard_count):
+            numbers = range(shard * shard_pages + 1, min(page_count, (shard + 1) * shard_pages) + 1)
+            document = documentai.Document(uri=uri, mime_type="application/pdf",
+                                           shard_info=documentai.Document.ShardInfo(
+                                               shard_index=shard, shard_count=shard_count,
+                                               text_offset=text_offset))
+            self._fill_pages(document, stem, numbers)
+            text_offset += len(document.text)
+            self.store.put(bucket_name, f"{prefix}{stem}-{shard}.json",
+                           documentai.Document.to_json(document).encode("utf-8"))
+
+    @staticmethod
+    def _fill_pages(document, stem: str, page_numbers):
+        text = []
+        start = 0
+        for page_number in page_numbers:
+            page_text = _page_text(stem, page_number)
+            segment = documentai.Document.TextAnchor.TextSegment(
+                start_index=start, end_index=start + len(page_text)
+            )
+            document.pages.append(documentai.Document.Page(
+                page_number=page_number,
+                layout=documentai.Document.Page.Layout(
+                    text_anchor=documentai.Document.TextAnchor(text_segments=[segment])
+                ),
+            ))
+            text.append(page_text)
+            start += len(page_text)
+        document.text = "".join(text)
+
+    def _finish(self, operation: SimulatedOperation):
+        statuses = []
+        for index, uri in enumerate(operation.documents):
+            failure = self._document_failure(uri)
+            output_dir = f"{operation.output_uri}{index}"
+            if failure is None:
+                self._write_shards(uri, output_dir + '/')
+                status = status_pb2.Status(code=0)
+            else:
+                status = status_pb2.Status(code=failure[0], message=failure[1])
+                output_dir = ""
+            statuses.append(documentai.BatchProcessMetadata.IndividualProcessStatus(
+                input_gcs_source=uri, status=status, output_gcs_destination=output_dir,
+            ))
+        metadata = documentai.BatchProcessMetadata(
+            state=documentai.BatchProcessMetadata.State.SUCCEEDED,
+            individual_process_statuses=statuses,
+        )
+        if statuses and all(status.status.code for status in statuses):
+            operation.error = status_pb2.Status(code=3, message=statuses[0].status.message)
+        operation.metadata = documentai.BatchProcessMetadata.serialize(metadata)
+
+    def get_operation(self, request=None):
+        self._call("get_operation", self.latency.get_operation_seconds)
+        with self._lock:
+            operation = self._operations.get(request.name)
+        if operation is None:
+            raise google_exceptions.NotFound(f"Operation {request.name} not found")
+
+        done = self.clock.now() >= operation.done_at
+        if done and operation.metadata is None:
+            with self._lock:
+                # Outputs appear once, when the operation is first seen finished
+                if operation.metadata is None:
+                    self._finish(operation)
+        metadata = operation.metadata if done else documentai.BatchProcessMetadata.serialize(
+            documentai.BatchProcessMetadata(state=documentai.BatchProcessMetadata.State.RUNNING)
+        )
+        result = operations_pb2.Operation(
+            name=operation.name,
+            done=done,
+            metadata=any_pb2.Any(
+                type_url="type.googleapis.com/google.cloud.documentai.v1beta3.BatchProcessMetadata",
+                value=metadata,
+            ),
+        )
+        if done and operation.error is not None:
+            result.error.CopyFrom(operation.error)
+        return result
+
+    def cancel_operation(self, request=None):
+        self._call("cancel_operation", self.latency.get_operation_seconds)
+        with self._lock:
+            operation = self._operations.get(request.name)
+            if operation is None:
+                raise google_exceptions.NotFound(f"Operation {request.name} not found")
+            if operation.metadata is None and self.clock.now() < operation.done_at:
+                # Stops without writing any outputs
+                operation.done_at = self.clock.now()
+                operation.error = status_pb2.Status(code=1, message="Operation was cancelled")
+                operation.metadata = documentai.BatchProcessMetadata.serialize(documentai.BatchProcessMetadata(
+                    state=documentai.BatchProcessMetadata.State.CANCELLED,
+                ))
+
+    def process_document(self, request=None):
+        uri = request.gcs_document.gcs_uri
+        page_count = self._pages(uri)
+        self._call("process_document",
+                   self.latency.online_seconds + self.latency.online_seconds_per_page * page_count)
+        if self.rng.random() < self.latency.quota_error_rate:
+            with self._lock:
+                self.quota_errors += 1
+            raise google_exceptions.ResourceExhausted("Quota exceeded for quota metric 'Online process requests'")
+        failure = self._document_failure(uri)
+        if failure is not None:
+            raise google_exceptions.InvalidArgument(failure[1])
+        if page_count > self.latency.online_max_pages:
+            raise google_exceptions.InvalidArgument(
+                f"Document pages exceed the limit: {page_count} pages, limit {self.latency.online_max_pages}"
+            )
+        document = documentai.Document(uri=uri, mime_type="application/pdf")
+        self._fill_pages(document, os.path.splitext(uri.rsplit('/', 1)[-1])[0], range(1, page_count + 1))
+        return SimpleNamespace(document=document)
+
+
+# --- Synthetic Corpus ---
+def synthetic_book_folders(book_count: int = SIMULATED_BOOKS):
+    """Book folder names: the known commentary folders, then unmapped extras."""
+    folders = sorted(main.KOREAN_TO_ENGLISH_BOOKS)[:book_count]
+    folders += [f"부록_{number:02d}" for number in range(1, book_count - len(folders) + 1)]
+    return folders
+
+
+def build_synthetic_corpus(store: FakeObjectStore, rng: random.Random, input_prefix: str,
+                           book_count: int = SIMULATED_BOOKS, too_large_rate: float = 0.02,
+                           duplicate_rate: float = 0.03):
+    """
+    Upload a synthetic commentary corpus into the fake bucket.
+
+    Each book gets 2-12 PDFs: about a quarter small enough for the online
+    path, most of a few hundred pages, and some over the page or byte limits
+    so they get split. Names are stored NFD-normalized, like the macOS
+    uploads of the real bucket. A few files are flagged to fail with "File
+    too large" although their listed size fits, and a few repeat the bytes
+    of an earlier file.
+
+    Returns:
+        dict: "books", "files" and "pages" counts.
+    """
+    files = 0
+    pages = 0
+    hashes = []
+    for folder in synthetic_book_folders(book_count):
+        title = folder.split("_", 1)[-1]
+        for number in range(1, rng.randint(2, 12) + 1):
+            kind = rng.random()
+            if kind < 0.25:
+                page_count = rng.randint(2, 15)
+            elif kind < 0.9:
+                page_count = int(min(480, max(40, rng.lognormvariate(5.4, 0.5))))
+            else:
+                page_count = rng.randint(500, 1500)
+            size = int(page_count * rng.uniform(60_000, 180_000))
+            md5_hash = None
+            if hashes and rng.random() < duplicate_rate:
+                md5_hash, page_count, size = rng.choice(hashes)
+            name = unicodedata.normalize("NFD", f"{input_prefix}{folder}/{title}_주석_{number:02d}.pdf")
+            stored = store.put(
+                SIMULATED_BUCKET, name, synthetic_pdf(page_count), size=size,
+                md5_hash=md5_hash or base64.b64encode(hashlib.md5(name.encode()).digest()).decode(),
+                page_count=page_count, too_large=rng.random() < too_large_rate,
+            )
+            hashes.append((stored.md5_hash, page_count, size))
+            files += 1
+            pages += page_count
+    return {"books": book_count, "files": files, "pages": pages}
+
+
+# --- Harness ---
+@contextlib.contextmanager
+def _patched(module, **values):
+    saved = {name: getattr(module, name) for name in values}
+    for name, value in values.items():
+        setattr(module, name, value)
+    try:
+        yield
+    finally:
+        for name, value in saved.items():
+            setattr(module, name, value)
+
+
+@contextlib.contextmanager
+def _scaled_pipeline_settings(time_scale: float):
+    """Run the pipeline's own waits and rates on the simulation clock."""
+    with _patched(operation_poller,
+                  MIN_POLL_INTERVAL=operation_poller.MIN_POLL_INTERVAL / time_scale,
+                  MAX_POLL_INTERVAL=operation_poller.MAX_POLL_INTERVAL / time_scale), \
+            _patched(quota_limiter, WAIT_INTERVAL_SECONDS=quota_limiter.WAIT_INTERVAL_SECONDS / time_scale), \
+            _patched(processor_pool,
+                     WAIT_INTERVAL_SECONDS=processor_pool.WAIT_INTERVAL_SECONDS / time_scale,
+                     ENDPOINT_COOLDOWN_SECONDS=processor_pool.ENDPOINT_COOLDOWN_SECONDS / time_scale), \
+            _patched(adaptive_concurrency,
+                     AIMD_DECREASE_COOLDOWN_SECONDS=adaptive_concurrency.AIMD_DECREASE_COOLDOWN_SECONDS / time_scale), \
+            _patched(operation_deadlines,
+                     MIN_DEADLINE_SECONDS=operation_deadlines.MIN_DEADLINE_SECONDS / time_scale,
+                     PRIOR_STARTUP_SECONDS=operation_deadlines.PRIOR_STARTUP_SECONDS / time_scale,
+                     PRIOR_SECONDS_PER_PAGE=operation_deadlines.PRIOR_SECONDS_PER_PAGE / time_scale), \
+            _patched(main,
+                     MAX_SUBMISSIONS_PER_MINUTE=main.MAX_SUBMISSIONS_PER_MINUTE * time_scale,
+                     ONLINE_REQUESTS_PER_MINUTE=main.ONLINE_REQUESTS_PER_MINUTE * time_scale,
+                     QUOTA_RETRY_DELAY_SECONDS=main.QUOTA_RETRY_DELAY_SECONDS / time_scale,
+                     OPERATION_TIMEOUT_SECONDS=main.OPERATION_TIMEOUT_SECONDS / time_scale):
+        yield
+
+
+@contextlib.contextmanager
+def _working_directory(path: str):
+    previous = os.getcwd()
+    os.chdir(path)
+    try:
+        yield
+    finally:
+        os.chdir(previous)
+
+
+class SlotSampler:
+    """Samples the batch operation slots leased by the pipeline on a background thread."""
+
+    def __init__(self, limiter: QuotaLimiter, interval: float = SAMPLE_INTERVAL_SECONDS):
+        self.limiter = limiter
+        self.interval = interval
+        self.samples = []
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="slot-sampler", daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.samples.append(self.limiter.slots_in_use())
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._stop.set()
+        self._thread.join()
+        return False
+
+    @property
+    def mean(self):
+        return sum(self.samples) / len(self.samples) if self.samples else 0.0
+
+
+def run_simulation(book_count: int = SIMULATED_BOOKS, time_scale: float = TIME_SCALE,
+                   seed: int = SIMULATION_SEED, latency: LatencyModel = None,
+                   log_path: str = SIMULATION_LOG_PATH, verbose: bool = False,
+                   policy: str = None):
+    """
+    Run batch_transcribe_gcs_pdfs against fake GCS and Document AI.
+
+    The real pipeline code runs unchanged; only the clients served by
+    gcp_clients are replaced. Local state (manifest, quota database, OCR
+    cache, listing cache) goes to a temporary directory, so a simulation
+    never touches the state of real runs.
+
+    Args:
+        book_count (int): Number of book directories in the synthetic corpus.
+        time_scale (float): Simulated seconds per real second.
+        seed (int): Seed of the corpus and of the fakes' random draws.
+        latency (LatencyModel): Latencies and error rates of the fakes.
+        log_path (str): File receiving the pipeline's progress output.
+        verbose (bool): Print the pipeline's output instead of logging it.
+        policy (str): Scheduling policy to run with; defaults to main.SCHEDULING_POLICY.
+
+    Returns:
+        dict: Corpus counts, wall time (real and simulated seconds), slot
+              utilization, operation errors, manifest states and API calls.
+    """
+    rng = random.Random(seed)
+    latency = latency or LatencyModel()
+    clock = SimulationClock(time_scale)
+    counter = ApiCallCounter()
+    store = FakeObjectStore()
+    input_prefix = unicodedata.normalize("NFD", main.GCS_INPUT_PREFIX)
+    corpus = build_synthetic_corpus(store, rng, input_prefix, book_count)
+    storage_client = FakeStorageClient(store, clock, latency, counter)
+    documentai_client = FakeDocumentAIClient(store, clock, latency, counter, rng)
+    log_path = os.path.abspath(log_path)
+
+    with tempfile.TemporaryDirectory() as work_dir, _working_directory(work_dir), \
+            _scaled_pipeline_settings(time_scale), \
+            _patched(main, SCHEDULING_POLICY=policy or main.SCHEDULING_POLICY), open(log_path, "w", encoding="utf-8") as log:
+        install_clients(storage_client, documentai_client)
+        main._bucket_indexes.clear()
+        # The pipeline runs one endpoint (the simulated processor) with the default limits
+        observer = QuotaLimiter(main.QUOTA_DB_PATH, resource=endpoint_resource(
+            ProcessorEndpoint(SIMULATED_PROCESSOR, SIMULATED_LOCATION)
+        ))
+        try:
+            output = contextlib.nullcontext() if verbose else contextlib.redirect_stdout(log)
+            started = time.monotonic()
+            simulated_start = clock.now()
+            with SlotSampler(observer) as sampler, output:
+                main.batch_transcribe_gcs_pdfs(
+                    SIMULATED_PROJECT, SIMULATED_LOCATION, SIMULATED_PROCESSOR,
+                    f"gs://{SIMULATED_BUCKET}/{main.GCS_INPUT_PREFIX}",
+                    f"gs://{SIMULATED_BUCKET}/{main.GCS_OUTPUT_PREFIX}",
+                    manifest_path=main.MANIFEST_PATH,
+                )
+            wall_seconds = time.monotonic() - started
+            simulated_end = clock.now()
+        finally:
+            observer.close()
+            install_clients(None, None)
+            main._bucket_indexes.clear()
+
+        states = collections.Counter()
+        manifest = JobManifest(main.MANIFEST_PATH, f"gs://{SIMULATED_BUCKET}/{main.GCS_OUTPUT_PREFIX}")
+        try:
+            for counts in manifest.summary().values():
+                states.update({state: n for state, n in counts.items() if state != "outputs"})
+        finally:
+            manifest.close()
+
+    # Real seconds spent per stage, summed over every span of the run
+    histograms = get_metrics().snapshot()["histograms"]
+    stage_seconds = {
+        stage: sum(values["sum"] for values in series.values())
+        for stage, series in histograms.items()
+    }
+
+    simulated_seconds = simulated_end - simulated_start
+    capacity = latency.max_concurrent_operations * simulated_seconds
+    return {
+        "corpus": corpus,
+        "wall_seconds": wall_seconds,
+        "simulated_seconds": simulated_seconds,
+        "slots_held_mean": sampler.mean,
+        "slot_utilization": sampler.mean / latency.max_concurrent_operations,
+        "server_utilization": documentai_client.busy_seconds(simulated_end) / capacity if capacity else 0.0,
+        "quota_errors": documentai_client.quota_errors,
+        "too_large_errors": documentai_client.too_large_errors,
+        "states": dict(states),
+        "api_calls": counter.snapshot(),
+        "stage_seconds": stage_seconds,
+    }
+
+
+def print_simulation_report(report: dict):
+    """Print the result of run_simulation."""
+    corpus = report["corpus"]
+    print("\n" + "=" * 60)
+    print("📊 Simulation Report:")
+    print(f"📚 Corpus: {corpus['books']} books, {corpus['files']} PDFs, {corpus['pages']} pages")
+    print(f"⏱️  Wall time: {report['wall_seconds']:.1f} s real, "
+          f"{report['simulated_seconds'] / 3600:.2f} h simulated")
+    print(f"🎛️  Operation slots held: {report['slots_held_mean']:.2f} on average "
+          f"({report['slot_utilization']:.0%}); server busy {report['server_utilization']:.0%}")
+    print(f"🚦 Quota errors: {report['quota_errors']}, \"File too large\": {report['too_large_errors']}")
+    print("📁 Files by state: " + ", ".join(f"{state} {n}" for state, n in sorted(report["states"].items())))
+    print("⏲️  Time in stages (real seconds, summed over spans):")
+    for stage, seconds in sorted(report["stage_seconds"].items()):
+        print(f"  - {stage}: {seconds:.1f}")
+    print("📞 API calls:")
+    for method, calls in sorted(report["api_calls"].items()):
+        print(f"  - {method}: {calls}")
+    print(f"  Total: {sum(report['api_calls'].values())}")
+
+
+# --- Run the simulator ---
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Run the OCR pipeline against simulated GCS and Document AI services."
+    )
+    parser.add_argument("--books", type=int, default=SIMULATED_BOOKS, help="Number of synthetic books")
+    parser.add_argument("--time-scale", type=float, default=TIME_SCALE,
+                        help="Simulated seconds per real second")
+    parser.add_argument("--seed", type=int, default=SIMULATION_SEED, help="Random seed")
+    parser.add_argument("--quota-error-rate", type=float, default=LatencyModel.quota_error_rate,
+                        help="Fraction of submissions rejected with a quota error")
+    parser.add_argument("--policy", choices=SCHEDULING_POLICIES, default=main.SCHEDULING_POLICY,
+                        help="Order in which queued requests take operation slots")
+    parser.add_argument("--verbose", action="store_true", help="Show the pipeline's own output")
+    args = parser.parse_args()
+
+    report = run_simulation(
+        book_count=args.books,
+        time_scale=args.time_scale,
+        seed=args.seed,
+        latency=LatencyModel(quota_error_rate=args.quota_error_rate),
+        verbose=args.verbose,
+        policy=args.policy,
+    )
+    print_simulation_report(report)
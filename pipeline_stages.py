@@ -0,0 +1,144 @@
+import time
+import queue
+import threading
+import concurrent.futures
+
+from pipeline_metrics import get_metrics
+
+# Items allowed to wait in a stage's queue, per worker, when no queue size is given
+STAGE_QUEUE_PER_WORKER = 2
+
+_STOP = object()
+
+
+class PipelineStage:
+    """
+    Worker threads that take items from a bounded queue and hand each to ``handler``.
+
+    Stages are chained by calling the next stage's put() from a handler.
+    put() blocks while the queue is full, so a stage that falls behind slows
+    down the stage feeding it instead of letting work pile up (backpressure).
+    A handler that raises is reported and recorded in ``failures``; the
+    stage carries on with the next item.
+
+    Every item is timed as a "stage" span; the queue depth and busy workers
+    are exported as gauges while the stage runs.
+
+    Usage:
+        assemble = PipelineStage("assemble", assemble_one, workers=2)
+        publish = PipelineStage("publish", lambda book: assemble.put(publish_one(book)), workers=4)
+        publish.feed(books)
+        publish.join()
+        assemble.close()
+        assemble.join()
+    """
+
+    def __init__(self, name: str, handler, workers: int = 1, queue_size: int = None):
+        if workers < 1:
+            raise ValueError(f"Stage {name} needs at least one worker")
+        self.name = name
+        self.handler = handler
+        self.workers = workers
+        self.failures = []
+        # Resolves once every worker has exited after close()
+        self.finished = concurrent.futures.Future()
+        self._queue = queue.Queue(maxsize=queue_size or workers * STAGE_QUEUE_PER_WORKER)
+        self._lock = threading.Lock()
+        self._busy = 0
+        self._running = workers
+        self._closed = False
+
+        metrics = get_metrics()
+        metrics.gauge_function("stage_queue_depth", self._queue.qsize, stage=name)
+        metrics.gauge_function("stage_workers_busy", lambda: self._busy, stage=name)
+        metrics.set_gauge("stage_workers", workers, stage=name)
+        self._threads = [
+            threading.Thread(target=self._work, name=f"stage-{name}-{i}", daemon=True)
+            for i in range(workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    @property
+    def queued(self):
+        """Items waiting for a worker."""
+        return self._queue.qsize()
+
+    def put(self, item):
+        """Queue one item, waiting while the queue is full."""
+        if self._closed:
+            raise RuntimeError(f"Stage {self.name} is closed")
+        started = time.monotonic()
+        self._queue.put(item)
+        waited = time.monotonic() - started
+        if waited > 0.01:
+            get_metrics().observe("stage_backpressure", waited, stage=self.name)
+
+    def feed(self, items):
+        """
+        Queue ``items`` from a background thread, then close the stage.
+
+        Returns:
+            threading.Thread: The feeding thread.
+        """
+        def _feed():
+            try:
+                for item in items:
+                    self.put(item)
+            finally:
+                self.close()
+
+        thread = threading.Thread(target=_feed, name=f"stage-{self.name}-feed", daemon=True)
+        thread.start()
+        return thread
+
+    def close(self):
+        """Accept no more items; workers exit once the queue is drained."""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+        for _ in self._threads:
+            self._queue.put(_STOP)
+
+    def join(self, timeout: float = None):
+        """
+        Wait until the stage is closed and every queued item was handled.
+
+        Returns:
+            list: (item, exception) of every item whose handler raised.
+        """
+        self.finished.result(timeout)
+        return self.failures
+
+    def _work(self):
+        metrics = get_metrics()
+        try:
+            while True:
+                item = self._queue.get()
+                if item is _STOP:
+                    return
+                with self._lock:
+                    self._busy += 1
+                started = time.monotonic()
+                outcome = "ok"
+                try:
+                    self.handler(item)
+                except Exception as e:
+                    outcome = "error"
+                    with self._lock:
+                        self.failures.append((item, e))
+                    metrics.inc("stage_errors", stage=self.name)
+                    print(f"  ❌ {self.name} stage failed: {e}")
+                finally:
+                    with self._lock:
+                        self._busy -= 1
+                    metrics.observe("stage", time.monotonic() - started, stage=self.name, outcome=outcome)
+        finally:
+            with self._lock:
+                self._running -= 1
+                last = self._running == 0
+            if last:
+                metrics.gauge_function("stage_queue_depth", None, stage=self.name)
+                metrics.gauge_function("stage_workers_busy", None, stage=self.name)
+                self.finished.set_result(None)
@@ -0,0 +1,257 @@
+import time
+import threading
+from dataclasses import dataclass
+
+from adaptive_concurrency import AimdLimit
+from quota_limiter import BATCH_RESOURCE, QUOTA_DB_PATH, QuotaLimiter
+
+# An endpoint whose submissions fail this many times in a row is taken out of
+# rotation for ENDPOINT_COOLDOWN_SECONDS, then tried again
+ENDPOINT_FAILURE_THRESHOLD = 3
+ENDPOINT_COOLDOWN_SECONDS = 300
+
+# How often a caller waiting for a free endpoint re-checks the shared leases (seconds)
+WAIT_INTERVAL_SECONDS = 1.0
+
+
+@dataclass(frozen=True)
+class ProcessorEndpoint:
+    """
+    One Document AI processor that batch operations can be sent to.
+
+    With adaptive concurrency, ``max_concurrent`` is the ceiling the
+    endpoint's AIMD limit may grow to.
+    """
+    processor_id: str
+    location: str
+    max_concurrent: int = 5
+    requests_per_minute: float = 30
+
+    @property
+    def key(self):
+        return f"{self.location}/{self.processor_id}"
+
+
+def endpoint_resource(endpoint: ProcessorEndpoint):
+    """Name of the QuotaLimiter resource holding an endpoint's slots and request budget."""
+    return f"{BATCH_RESOURCE}:{endpoint.key}"
+
+
+def operation_location(operation_name: str):
+    """
+    Return the region of an operation from its name
+    ("projects/{project}/locations/{location}/operations/{id}"), or None.
+    """
+    parts = operation_name.split("/")
+    if "locations" in parts[:-1]:
+        return parts[parts.index("locations") + 1]
+    return None
+
+
+class EndpointState:
+    """Client, shared limiter, concurrency limit and health of one endpoint in a ProcessorPool."""
+
+    def __init__(self, endpoint: ProcessorEndpoint, client, processor_name: str, limiter: QuotaLimiter,
+                 concurrency: AimdLimit, condition: threading.Condition):
+        self.endpoint = endpoint
+        self.client = client
+        self.processor_name = processor_name
+        self.limiter = limiter
+        self.concurrency = concurrency
+        self.in_flight = 0
+        self.consecutive_errors = 0
+        self.disabled_until = 0.0
+        self._condition = condition
+
+    @property
+    def load(self):
+        return self.in_flight / max(1, self.concurrency.limit)
+
+    def available(self, now: float, limit: int = None):
+        limit = self.concurrency.limit if limit is None else limit
+        return self.disabled_until <= now and self.in_flight < limit
+
+    def record_success(self):
+        """A submission was accepted: the concurrency limit may grow."""
+        with self._condition:
+            if self.concurrency.increase(self.in_flight):
+                self._condition.notify_all()
+
+    def record_overload(self):
+        """
+        A submission hit a quota or 429 error: the concurrency limit is cut.
+
+        Returns:
+            bool: True if the limit went down.
+        """
+        with self._condition:
+            return self.concurrency.decrease(self.in_flight)
+
+
+class ProcessorPool:
+    """
+    Spreads batch operations over several processor endpoints.
+
+    Every endpoint has its own concurrency and submission-rate budget, kept in
+    a QuotaLimiter (so other processes on the host share it too). acquire()
+    hands out a slot on the least-loaded healthy endpoint; an endpoint whose
+    submissions keep failing is skipped for a cool-down period.
+
+    How many operations an endpoint may run is an AIMD limit (see
+    adaptive_concurrency) below its ``max_concurrent``: submissions report
+    quota errors and successes through the endpoint's record_overload() and
+    record_success().
+
+    Usage:
+        pool = ProcessorPool(project_id, endpoints, get_documentai_client)
+        state, lease_id = pool.acquire()
+        try:
+            ... submit to state.client / state.processor_name ...
+            pool.record_result(state)
+        finally:
+            pool.release(state, lease_id)
+    """
+
+    def __init__(self, project_id: str, endpoints, client_factory, quota_db_path: str = QUOTA_DB_PATH,
+                 failure_threshold: int = None, cooldown_seconds: float = None, adaptive: bool = True):
+        if not endpoints:
+            raise ValueError("At least one processor endpoint is needed")
+        self.client_factory = client_factory
+        # Defaults to the module settings at construction time
+        self.failure_threshold = ENDPOINT_FAILURE_THRESHOLD if failure_threshold is None else failure_threshold
+        self.cooldown_seconds = ENDPOINT_COOLDOWN_SECONDS if cooldown_seconds is None else cooldown_seconds
+        self._condition = threading.Condition()
+        self.states = []
+        for endpoint in endpoints:
+            client = client_factory(endpoint.location)
+            self.states.append(EndpointState(
+                endpoint,
+                client,
+                client.processor_path(project_id, endpoint.location, endpoint.processor_id),
+                QuotaLimiter(quota_db_path, endpoint.max_concurrent, endpoint.requests_per_minute,
+                             endpoint_resource(endpoint)),
+                AimdLimit(endpoint.key, endpoint.max_concurrent, adaptive=adaptive),
+                self._condition,
+            ))
+
+    @property
+    def primary(self):
+        """The first endpoint (used for online requests and the cache key)."""
+        return self.states[0]
+
+    @property
+    def capacity(self):
+        """Most operations ever allowed in flight across every endpoint."""
+        return sum(state.endpoint.max_concurrent for state in self.states)
+
+    @property
+    def concurrency_limit(self):
+        """Operations currently allowed in flight across every endpoint."""
+        return sum(state.concurrency.limit for state in self.states)
+
+    def _candidates(self, now: float, location: str = None, ceiling: bool = False):
+        candidates = [
+            state for state in self.states
+            if state.available(now, state.endpoint.max_concurrent if ceiling else None)
+            and (location is None or state.endpoint.location == location)
+        ]
+        return sorted(candidates, key=lambda state: (state.load, state.in_flight))
+
+    def _take(self, state: EndpointState):
+        lease_id = state.limiter.try_acquire_slot()
+        if lease_id is not None:
+            state.in_flight += 1
+        return lease_id
+
+    def acquire(self, timeout: float = None):
+        """
+        Wait for a slot on the least-loaded healthy endpoint.
+
+        Returns:
+            tuple: (EndpointState, lease id) to pass to release().
+
+        Raises:
+            TimeoutError: If no slot was free within ``timeout`` seconds.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._condition:
+            while True:
+                now = time.monotonic()
+                for state in self._candidates(now):
+                    lease_id = self._take(state)
+                    if lease_id is not None:
+                        return state, lease_id
+                if deadline is not None and now >= deadline:
+                    raise TimeoutError(f"No processor endpoint had a free slot within {timeout} seconds")
+                wait = WAIT_INTERVAL_SECONDS
+                if deadline is not None:
+                    wait = min(wait, deadline - now)
+                self._condition.wait(wait)
+
+    def release(self, state: EndpointState, lease_id: str):
+        """Give back a slot taken by acquire() or reserve_until()."""
+        state.limiter.release_slot(lease_id)
+        with self._condition:
+            state.in_flight -= 1
+            self._condition.notify_all()
+
+    def record_result(self, state: EndpointState, error=None):
+        """
+        Record whether a submission to an endpoint succeeded.
+
+        Returns:
+            bool: True if this error took the endpoint out of rotation.
+        """
+        with self._condition:
+            if error is None:
+                state.consecutive_errors = 0
+                return False
+            state.consecutive_errors += 1
+            if state.consecutive_errors < self.failure_threshold:
+                return False
+            state.consecutive_errors = 0
+            state.disabled_until = time.monotonic() + self.cooldown_seconds
+            # Waiters may now be able to use another endpoint
+            self._condition.notify_all()
+            return True
+
+    def reserve_until(self, operation_name: str, future):
+        """
+        Hold a slot for an operation started by an earlier run until ``future`` is done.
+
+        The operation name only tells the region, so the slot is taken on the
+        least-loaded endpoint there. The operation is running whatever the
+        concurrency limit says, so only ``max_concurrent`` bounds it.
+
+        Returns:
+            bool: True if a slot was reserved.
+        """
+        location = operation_location(operation_name)
+        with self._condition:
+            for state in self._candidates(time.monotonic(), location, ceiling=True):
+                lease_id = self._take(state)
+                if lease_id is not None:
+                    break
+            else:
+                return False
+        future.add_done_callback(lambda _: self.release(state, lease_id))
+        return True
+
+    def client_for_operation(self, operation_name: str):
+        """Return the client of the region an operation runs in."""
+        location = operation_location(operation_name)
+        for state in self.states:
+            if state.endpoint.location == location:
+                return state.client
+        return self.client_factory(location) if location else self.primary.client
+
+    def close(self):
+        for state in self.states:
+            state.limiter.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
@@ -0,0 +1,302 @@
+import os
+import time
+import uuid
+import socket
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+# Shared state file; every process on the host that uses the same path draws
+# from the same budget
+QUOTA_DB_PATH = "ocr_quota.sqlite"
+
+# A lease not refreshed for this long belongs to a dead process and is reclaimed (seconds)
+LEASE_TTL_SECONDS = 120
+
+# How often waiting callers re-check the shared state (seconds)
+WAIT_INTERVAL_SECONDS = 1.0
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS leases (
+    lease_id TEXT PRIMARY KEY,
+    resource TEXT NOT NULL,
+    host TEXT NOT NULL,
+    pid INTEGER NOT NULL,
+    acquired_at REAL NOT NULL,
+    expires_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS token_buckets (
+    resource TEXT PRIMARY KEY,
+    tokens REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+"""
+
+
+class QuotaTimeout(Exception):
+    """Raised when a slot or request token could not be obtained in time."""
+
+
+def _pid_alive(pid: int):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class QuotaLimiter:
+    """
+    Host-wide limiter for Document AI quota, backed by a SQLite file.
+
+    Two budgets are enforced for every process and thread that opens the
+    same database:
+
+    - concurrent operations: a lease table with at most ``max_concurrent``
+      rows. Leases are refreshed by a heartbeat thread, and leases of dead
+      processes (expired, or a vanished pid on this host) are reclaimed.
+    - requests per minute: a token bucket refilled continuously at
+      ``requests_per_minute`` with a burst of the same size.
+
+    All updates run inside ``BEGIN IMMEDIATE`` transactions, so the SQLite
+    write lock serializes them across processes.
+
+    Usage:
+        limiter = QuotaLimiter(max_concurrent=5, requests_per_minute=30)
+        with limiter.operation_slot():
+            limiter.acquire_request()
+            operation = client.batch_process_documents(request)
+            ...
+    """
+
+    def __init__(self, path: str = QUOTA_DB_PATH, max_concurrent: int = 5,
+                 requests_per_minute: float = 30, resource: str = "documentai-batch",
+                 lease_ttl: float = LEASE_TTL_SECONDS):
+        self.path = path
+        self.max_concurrent = max_concurrent
+        self.requests_per_minute = requests_per_minute
+        self.resource = resource
+        self.lease_ttl = lease_ttl
+        self.host = socket.gethostname()
+        self.pid = os.getpid()
+        self._local = threading.local()
+        self._held = set()
+        self._held_lock = threading.Lock()
+        self._heartbeat_stop = threading.Event()
+        self._heartbeat_thread = None
+        self._connection().executescript(_SCHEMA)
+
+    # --- SQLite plumbing ---
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def _transaction(self):
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        else:
+            conn.execute("COMMIT")
+
+    def _reclaim_stale(self, conn, now: float):
+        conn.execute("DELETE FROM leases WHERE expires_at < ?", (now,))
+        rows = conn.execute(
+            "SELECT lease_id, pid FROM leases WHERE host = ? AND pid != ?", (self.host, self.pid)
+        ).fetchall()
+        for lease_id, pid in rows:
+            if not _pid_alive(pid):
+                conn.execute("DELETE FROM leases WHERE lease_id = ?", (lease_id,))
+
+    # --- Concurrent operations ---
+    def try_acquire_slot(self):
+        """
+        Take an operation slot if one is free, without waiting.
+
+        Returns:
+            str: Lease id, or None if every slot is taken.
+        """
+        now = time.time()
+        with self._transaction() as conn:
+            self._reclaim_stale(conn, now)
+            (in_use,) = conn.execute(
+                "SELECT COUNT(*) FROM leases WHERE resource = ?", (self.resource,)
+            ).fetchone()
+            if in_use >= self.max_concurrent:
+                return None
+            lease_id = uuid.uuid4().hex
+            conn.execute(
+                "INSERT INTO leases (lease_id, resource, host, pid, acquired_at, expires_at)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (lease_id, self.resource, self.host, self.pid, now, now + self.lease_ttl),
+            )
+        with self._held_lock:
+            self._held.add(lease_id)
+        self._ensure_heartbeat()
+        return lease_id
+
+    def acquire_slot(self, timeout: float = None):
+        """
+        Wait for an operation slot.
+
+        Returns:
+            str: Lease id to pass to release_slot().
+
+        Raises:
+            QuotaTimeout: If no slot became free within ``timeout`` seconds.
+        """
+        deadline = None if timeout is None else time.time() + timeout
+        while True:
+            lease_id = self.try_acquire_slot()
+            if lease_id is not None:
+                return lease_id
+            if deadline is not None and time.time() >= deadline:
+                raise QuotaTimeout(f"No {self.resource} slot free after {timeout} seconds")
+            time.sleep(WAIT_INTERVAL_SECONDS)
+
+    def release_slot(self, lease_id: str):
+        """Give an operation slot back."""
+        with self._held_lock:
+            self._held.discard(lease_id)
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM leases WHERE lease_id = ?", (lease_id,))
+
+    @contextmanager
+    def operation_slot(self, timeout: float = None):
+        """Hold an operation slot for the duration of the block."""
+        lease_id = self.acquire_slot(timeout)
+        try:
+            yield lease_id
+        finally:
+            self.release_slot(lease_id)
+
+    def slots_in_use(self):
+        """Number of operation slots currently leased by any process."""
+        with self._transaction() as conn:
+            self._reclaim_stale(conn, time.time())
+            (in_use,) = conn.execute(
+                "SELECT COUNT(*) FROM leases WHERE resource = ?", (self.resource,)
+            ).fetchone()
+        return in_use
+
+    def _ensure_heartbeat(self):
+        if self._heartbeat_thread is not None and self._heartbeat_thread.is_alive():
+            return
+        self._heartbeat_stop.clear()
+        self._heartbeat_thread = threading.Thread(
+            target=self._heartbeat, name="quota-heartbeat", daemon=True
+        )
+        self._heartbeat_thread.start()
+
+    def _heartbeat(self):
+        while not self._heartbeat_stop.wait(self.lease_ttl / 3):
+            with self._held_lock:
+                held = list(self._held)
+            if not held:
+                continue
+            expires_at = time.time() + self.lease_ttl
+            try:
+                with self._transaction() as conn:
+                    conn.executemany(
+                        "UPDATE leases SET expires_at = ? WHERE lease_id = ?",
+                        [(expires_at, lease_id) for lease_id in held],
+                    )
+            except sqlite3.Error as e:
+                print(f"  ⚠️  Quota heartbeat failed: {e}")
+
+    # --- Requests per minute ---
+    def try_acquire_request(self, cost: float = 1.0):
+        """
+        Take request tokens from the shared bucket if available.
+
+        Returns:
+            float: 0 if the tokens were taken, otherwise the seconds to wait
+                   before enough tokens will have accumulated.
+        """
+        rate = self.requests_per_minute / 60.0
+        capacity = float(self.requests_per_minute)
+        bucket = f"{self.resource}:rpm"
+        now = time.time()
+        with self._transaction() as conn:
+            row = conn.execute(
+                "SELECT tokens, updated_at FROM token_buckets WHERE resource = ?", (bucket,)
+            ).fetchone()
+            if row is None:
+                tokens = capacity
+            else:
+                tokens = min(capacity, row[0] + (now - row[1]) * rate)
+            if tokens >= cost:
+                tokens -= cost
+                wait = 0.0
+            else:
+                wait = (cost - tokens) / rate
+            conn.execute(
+                "INSERT OR REPLACE INTO token_buckets (resource, tokens, updated_at) VALUES (?, ?, ?)",
+                (bucket, tokens, now),
+            )
+        return wait
+
+    def acquire_request(self, cost: float = 1.0, timeout: float = None):
+        """
+        Wait until a request may be sent under the requests-per-minute budget.
+
+        Raises:
+            QuotaTimeout: If the tokens did not become available in time.
+        """
+        deadline = None if timeout is None else time.time() + timeout
+        while True:
+            wait = self.try_acquire_request(cost)
+            if wait == 0:
+                return
+            if deadline is not None and time.time() + wait > deadline:
+                raise QuotaTimeout(f"Request budget for {self.resource} exhausted")
+            time.sleep(min(wait, 5.0))
+
+    def close(self):
+        """Stop the heartbeat and release every slot this process still holds."""
+        self._heartbeat_stop.set()
+        with self._held_lock:
+            held = list(self._held)
+        for lease_id in held:
+            self.release_slot(lease_id)
+
+
+# --- Process-Wide Limiters ---
+# One limiter per quota resource (e.g. batch operations, online requests)
+BATCH_RESOURCE = "documentai-batch"
+ONLINE_RESOURCE = "documentai-online"
+
+_limiters = {}
+_limiter_lock = threading.Lock()
+
+
+def configure_quota_limiter(path: str = QUOTA_DB_PATH, max_concurrent: int = 5,
+                            requests_per_minute: float = 30, resource: str = BATCH_RESOURCE):
+    """
+    Create the limiter shared by every caller in this process for one resource.
+
+    Returns:
+        QuotaLimiter: The new shared limiter.
+    """
+    with _limiter_lock:
+        if resource in _limiters:
+            _limiters[resource].close()
+        _limiters[resource] = QuotaLimiter(path, max_concurrent, requests_per_minute, resource)
+        return _limiters[resource]
+
+
+def get_quota_limiter(resource: str = BATCH_RESOURCE):
+    """Return the shared limiter of a resource, creating one with the defaults if needed."""
+    with _limiter_lock:
+        if resource not in _limiters:
+            _limiters[resource] = QuotaLimiter(resource=resource)
+        return _limiters[resource]
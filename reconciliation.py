@@ -0,0 +1,281 @@
+import re
+import json
+import time
+import collections
+import concurrent.futures
+from dataclasses import asdict, dataclass, field
+
+from bucket_index import normalize_name
+from book_assembly import TEXT_DIRECTORY
+from output_catalog import CATALOG_DIRECTORY, shard_index
+from pdf_info import PAGE_COUNT_WORKERS, describe_pdf_blobs
+
+# Catalogs and page tables downloaded at the same time
+RECONCILE_WORKERS = 16
+
+# Where the full report is written (JSON)
+RECONCILIATION_REPORT_PATH = "reconciliation.json"
+
+# --- Statuses ---
+# ok:      every output the source should have is there
+# partial: some outputs exist, but shards are missing or pages are short
+# missing: no output at all
+STATUS_OK = "ok"
+STATUS_PARTIAL = "partial"
+STATUS_MISSING = "missing"
+
+# {book}_file{NNN}_{source stem}-{shard}.json, see output_flattening
+_FLATTENED_PATTERN = re.compile(r"^(?P<book>.+?)_file(?P<file>\d+)_(?P<stem>.+)-\d+\.json$")
+
+
+@dataclass
+class SourceStatus:
+    """How completely one input PDF is covered by outputs."""
+    book: str
+    source_uri: str
+    status: str = STATUS_MISSING
+    file_index: int = None
+    shards: int = 0
+    missing_shards: int = 0
+    input_pages: int = None
+    output_pages: int = None
+    reason: str = ""
+    # URIs of the outputs found for the source
+    outputs: list = field(default_factory=list)
+
+
+@dataclass
+class ReconciliationReport:
+    """Result of reconcile_outputs."""
+    sources: list = field(default_factory=list)
+    # (object URI, reason) of outputs that belong to no current input PDF
+    orphans: list = field(default_factory=list)
+    seconds: float = 0.0
+
+    def with_status(self, status: str):
+        return [source for source in self.sources if source.status == status]
+
+    @property
+    def missing(self):
+        return self.with_status(STATUS_MISSING)
+
+    @property
+    def partial(self):
+        return self.with_status(STATUS_PARTIAL)
+
+    def counts(self):
+        """Return the number of sources per status and of orphaned outputs."""
+        counts = collections.Counter(source.status for source in self.sources)
+        return {STATUS_OK: counts[STATUS_OK], STATUS_PARTIAL: counts[STATUS_PARTIAL],
+                STATUS_MISSING: counts[STATUS_MISSING], "orphaned": len(self.orphans)}
+
+    def write(self, path: str = RECONCILIATION_REPORT_PATH):
+        """Write the report as JSON."""
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({
+                "seconds": round(self.seconds, 3),
+                "counts": self.counts(),
+                "sources": [asdict(source) for source in self.sources if source.status != STATUS_OK],
+                "orphans": [{"uri": uri, "reason": reason} for uri, reason in self.orphans],
+            }, f, ensure_ascii=False, indent=1)
+        return path
+
+
+# --- Listing ---
+def _list_names(bucket, prefix: str, suffix: str):
+    return [blob for blob in bucket.list_blobs(prefix=prefix) if blob.name.lower().endswith(suffix)]
+
+
+def _read_json(bucket, name: str):
+    return json.loads(bucket.blob(name).download_as_bytes())
+
+
+def _pages_per_file(bucket, name: str):
+    """Count the pages of each source file number in an assembled page table."""
+    pages = collections.Counter()
+    for line in bucket.blob(name).download_as_bytes().decode("utf-8").splitlines():
+        if line.strip():
+            pages[json.loads(line).get("file")] += 1
+    return pages
+
+
+def _object_name(uri: str):
+    return uri.replace("gs://", "", 1).split("/", 1)[1]
+
+
+# --- Reconciling ---
+def reconcile_outputs(input_bucket, input_prefix: str, output_bucket, output_prefix: str, book_name,
+                      count_pages: bool = True, max_workers: int = RECONCILE_WORKERS):
+    """
+    Join every input PDF with the outputs that exist for it.
+
+    The input and output prefixes are each listed once, at the same time,
+    and joined in memory on NFC-normalized names: catalog entries by source
+    URI, flattened shards by book and source file stem. Page counts of the
+    outputs come from the assembled page tables ({output}_text/); input page
+    counts are read from the PDF headers of sources whose output pages (or
+    catalogued page range) are known.
+
+    Args:
+        input_bucket: Bucket holding the source PDFs.
+        input_prefix (str): Prefix of the book directories.
+        output_bucket: Bucket holding the OCR outputs.
+        output_prefix (str): Base output prefix.
+        book_name: Callable mapping a book directory name to its English name.
+        count_pages (bool): Compare page counts (reads the PDF headers).
+        max_workers (int): Catalogs and page tables downloaded at the same time.
+
+    Returns:
+        ReconciliationReport: Status of every source and the orphaned outputs.
+    """
+    started = time.monotonic()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max(2, max_workers)) as pool:
+        inputs_future = pool.submit(_list_names, input_bucket, input_prefix, ".pdf")
+        outputs_future = pool.submit(_list_names, output_bucket, output_prefix, "")
+        input_blobs = inputs_future.result()
+        output_blobs = outputs_future.result()
+
+        # Sort the output listing by what each object is
+        catalogs = {}
+        page_tables = {}
+        flattened = collections.defaultdict(list)
+        raw_shards = collections.defaultdict(list)
+        existing = set()
+        for blob in output_blobs:
+            relative = blob.name[len(output_prefix):]
+            existing.add(blob.name)
+            if relative.startswith(CATALOG_DIRECTORY):
+                if relative.endswith(".json"):
+                    catalogs[relative[len(CATALOG_DIRECTORY):-len(".json")]] = blob.name
+            elif relative.startswith(TEXT_DIRECTORY):
+                if relative.endswith(".pages.jsonl"):
+                    page_tables[relative[len(TEXT_DIRECTORY):-len(".pages.jsonl")]] = blob.name
+            elif not relative.endswith(".json"):
+                continue
+            elif "/" in relative:
+                raw_shards[relative.split("/", 1)[0]].append(blob.name)
+            else:
+                match = _FLATTENED_PATTERN.match(normalize_name(relative))
+                if match:
+                    flattened[(match.group("book"), match.group("stem"))].append(
+                        (int(match.group("file")), blob.name))
+                else:
+                    raw_shards[None].append(blob.name)
+
+        catalog_futures = {book: pool.submit(_read_json, output_bucket, name) for book, name in catalogs.items()}
+        page_futures = {book: pool.submit(_pages_per_file, output_bucket, name) for book, name in page_tables.items()}
+
+        # Sources by normalized object name, grouped by English book name
+        sources = {}
+        source_blobs = {}
+        books = set()
+        for blob in input_blobs:
+            relative = blob.name[len(input_prefix):]
+            if "/" not in relative:
+                continue
+            book = book_name(normalize_name(relative.split("/", 1)[0]))
+            books.add(book)
+            key = normalize_name(blob.name)
+            sources[key] = SourceStatus(book, f"gs://{input_bucket.name}/{blob.name}")
+            source_blobs[key] = blob
+        by_stem = {
+            (source.book, normalize_name(key.rsplit("/", 1)[-1][:-len(".pdf")])): source
+            for key, source in sources.items()
+        }
+
+        claimed = set()
+        orphans = []
+        expected_pages = {}
+        # Catalogued outputs: the catalog lists every shard of every part
+        for book, future in catalog_futures.items():
+            try:
+                catalog = future.result()
+            except Exception as e:
+                orphans.append((f"gs://{output_bucket.name}/{catalogs[book]}", f"unreadable catalog: {e}"))
+                continue
+            for key, entry in catalog.get("files", {}).items():
+                uris = [uri for part in entry["parts"] for uri in part["shards"]]
+                source = sources.get(normalize_name(_object_name(entry["source_uri"])))
+                if source is None:
+                    reason = "book not in the input" if book not in books else "source deleted"
+                    orphans.extend((uri, reason) for uri in uris if _object_name(uri) in existing)
+                    claimed.update(_object_name(uri) for uri in uris)
+                    continue
+                source.file_index = int(key)
+                source.shards = len(uris)
+                source.missing_shards = sum(1 for uri in uris if _object_name(uri) not in existing)
+                source.outputs.extend(uri for uri in uris if _object_name(uri) in existing)
+                claimed.update(_object_name(uri) for uri in uris)
+                page_end = entry.get("page_end")
+                if page_end:
+                    expected_pages[id(source)] = page_end
+            if book not in books:
+                orphans.append((f"gs://{output_bucket.name}/{catalogs[book]}", "book not in the input"))
+
+        # Flattened outputs: matched by book and source file stem
+        for (book, stem), shards in flattened.items():
+            source = by_stem.get((book, stem))
+            if source is None:
+                reason = "book not in the input" if book not in books else "source deleted"
+                orphans.extend((f"gs://{output_bucket.name}/{name}", reason) for _, name in shards)
+                continue
+            source.file_index = source.file_index or shards[0][0]
+            source.shards += len(shards)
+            names = sorted(name for _, name in shards)
+            source.outputs.extend(f"gs://{output_bucket.name}/{name}" for name in names)
+            # Shards are numbered 0..n-1; a gap means one was lost
+            source.missing_shards += max(0, max(shard_index(name) for name in names) + 1 - len(names))
+            claimed.update(names)
+
+        # Raw Document AI shards no catalog refers to
+        for book, names in raw_shards.items():
+            reason = "not in any catalog or flattened" if book in books else "book not in the input"
+            orphans.extend((f"gs://{output_bucket.name}/{name}", reason) for name in names if name not in claimed)
+
+        page_counts = {}
+        for book, future in page_futures.items():
+            try:
+                page_counts[book] = future.result()
+            except Exception:
+                continue
+            if book not in books:
+                orphans.append((f"gs://{output_bucket.name}/{page_tables[book]}", "book not in the input"))
+
+    # Output pages per source, from the page table of its book
+    for source in sources.values():
+        pages = page_counts.get(source.book)
+        if pages is not None and source.file_index is not None and source.shards:
+            source.output_pages = pages.get(source.file_index, 0)
+
+    if count_pages:
+        keys = [key for key, source in sources.items()
+                if source.shards and (source.output_pages is not None or id(source) in expected_pages)]
+        bucket_name = input_bucket.name
+        for key, pdf in zip(keys, describe_pdf_blobs([source_blobs[key] for key in keys], bucket_name,
+                                                      max_workers=PAGE_COUNT_WORKERS)):
+            if not pdf.page_count_estimated:
+                sources[key].input_pages = pdf.page_count
+
+    for source in sources.values():
+        source.status, source.reason = _source_status(source, expected_pages.get(id(source)))
+
+    report = ReconciliationReport(
+        sources=sorted(sources.values(), key=lambda source: (source.book, source.source_uri)),
+        orphans=sorted(orphans),
+        seconds=time.monotonic() - started,
+    )
+    return report
+
+
+def _source_status(source: SourceStatus, catalog_pages: int = None):
+    """Return (status, reason) of a source from what was found for it."""
+    if source.shards == 0:
+        return STATUS_MISSING, "no outputs"
+    if source.missing_shards:
+        return STATUS_PARTIAL, f"{source.missing_shards} of {source.shards} shards missing"
+    if source.input_pages is not None:
+        if source.output_pages is not None and source.output_pages < source.input_pages:
+            return STATUS_PARTIAL, f"{source.output_pages} of {source.input_pages} pages in the outputs"
+        if catalog_pages is not None and catalog_pages < source.input_pages:
+            return STATUS_PARTIAL, f"parts cover pages up to {catalog_pages} of {source.input_pages}"
+    return STATUS_OK, ""
@@ -0,0 +1,119 @@
+from dataclasses import dataclass, field
+
+# --- Processor Limits ---
+@dataclass
+class ProcessorLimits:
+    """
+    Limits a single BatchProcessRequest (and each document in it) must respect.
+
+    The per-document byte limit matches the "File too large (max size:
+    52428800)" errors returned by our OCR processor; the per-request limits
+    are kept conservative so one failed request never costs too much work.
+    """
+    max_documents_per_request: int = 50
+    max_pages_per_request: int = 2000
+    max_bytes_per_request: int = 1024 * 1024 * 1024
+    max_pages_per_document: int = 500
+    max_bytes_per_document: int = 52428800
+
+    def document_fits(self, pdf):
+        """Return True if a single PDF is within the per-document limits."""
+        return (pdf.size <= self.max_bytes_per_document and
+                pdf.page_count <= self.max_pages_per_document)
+
+
+DEFAULT_PROCESSOR_LIMITS = ProcessorLimits()
+
+
+@dataclass
+class PackedRequest:
+    """A group of PDFs that will be sent together in one BatchProcessRequest."""
+    documents: list = field(default_factory=list)
+    total_pages: int = 0
+    total_bytes: int = 0
+
+    def can_add(self, pdf, limits: ProcessorLimits):
+        return (len(self.documents) < limits.max_documents_per_request and
+                self.total_pages + pdf.page_count <= limits.max_pages_per_request and
+                self.total_bytes + pdf.size <= limits.max_bytes_per_request)
+
+    def add(self, pdf):
+        self.documents.append(pdf)
+        self.total_pages += pdf.page_count
+        self.total_bytes += pdf.size
+
+    @property
+    def uris(self):
+        return [pdf.uri for pdf in self.documents]
+
+
+# --- Packing ---
+def pack_pdfs(pdfs, limits: ProcessorLimits = DEFAULT_PROCESSOR_LIMITS):
+    """
+    Group PDFs into as few requests as possible without exceeding the limits.
+
+    Uses first-fit decreasing by page count (then size): the big volumes are
+    placed first and the many small commentaries fill the remaining room.
+    PDFs that exceed a per-document limit are returned in requests of their
+    own so they cannot take the rest of a request down with them.
+
+    Args:
+        pdfs (list): PdfInfo objects to pack.
+        limits (ProcessorLimits): Limits to respect.
+
+    Returns:
+        list: PackedRequest objects, each ordered by file index.
+    """
+    requests = []
+    ordered = sorted(pdfs, key=lambda pdf: (pdf.page_count, pdf.size), reverse=True)
+
+    for pdf in ordered:
+        if not limits.document_fits(pdf):
+            oversize = PackedRequest()
+            oversize.add(pdf)
+            requests.append(oversize)
+            continue
+
+        for request in requests:
+            if request.documents and limits.document_fits(request.documents[0]) and request.can_add(pdf, limits):
+                request.add(pdf)
+                break
+        else:
+            request = PackedRequest()
+            request.add(pdf)
+            requests.append(request)
+
+    for request in requests:
+        request.documents.sort(key=lambda pdf: pdf.file_index or 0)
+    requests.sort(key=lambda request: request.documents[0].file_index or 0)
+    return requests
+
+
+# --- Mapping Outputs Back to Sources ---
+def summarize_batch_metadata(metadata):
+    """
+    Pair every input document of a batch operation with its output or error.
+
+    Document AI writes every input document of a request to its own
+    ``<output>/<operation id>/<document index>/`` directory and reports the
+    pairing in BatchProcessMetadata.individual_process_statuses.
+
+    Args:
+        metadata: documentai.BatchProcessMetadata, or None.
+
+    Returns:
+        tuple: (outputs, failures) where outputs maps source URI -> output
+               directory URI and failures maps source URI -> error message.
+    """
+    outputs = {}
+    failures = {}
+    if metadata is None:
+        return outputs, failures
+
+    for status in metadata.individual_process_statuses:
+        source = status.input_gcs_source
+        if status.status.code == 0 and status.output_gcs_destination:
+            outputs[source] = status.output_gcs_destination.rstrip('/') + '/'
+        else:
+            failures[source] = status.status.message or f"status code {status.status.code}"
+    return outputs, failures
@@ -0,0 +1,106 @@
+import heapq
+
+# --- Cost Model ---
+# Rough duration of one batch operation: a fixed queueing/setup time plus OCR
+# time per page. Only the ratio matters for ordering; tune both from the
+# operation_wait spans of real runs for time estimates.
+OPERATION_STARTUP_SECONDS = 30.0
+SECONDS_PER_PAGE = 0.5
+
+# --- Scheduling Policies ---
+# largest_first:      longest requests of any book first; the run's tail is
+#                     made of short requests, so it ends close to
+#                     total work / slots
+# largest_book_first: every request of the largest book first, then the next
+#                     book; books finish (and are published) one after another
+# smallest_first:     shortest requests first; most files finish early
+# book_order:         requests in the order they are queued (sorted folders)
+POLICY_LARGEST_FIRST = "largest_first"
+POLICY_LARGEST_BOOK_FIRST = "largest_book_first"
+POLICY_SMALLEST_FIRST = "smallest_first"
+POLICY_BOOK_ORDER = "book_order"
+SCHEDULING_POLICIES = (
+    POLICY_LARGEST_FIRST,
+    POLICY_LARGEST_BOOK_FIRST,
+    POLICY_SMALLEST_FIRST,
+    POLICY_BOOK_ORDER,
+)
+
+
+def estimate_request_seconds(documents, startup_seconds: float = OPERATION_STARTUP_SECONDS,
+                             seconds_per_page: float = SECONDS_PER_PAGE):
+    """
+    Estimate how long one batch operation over ``documents`` keeps its slot.
+
+    Args:
+        documents (list): PdfInfo objects in the request.
+
+    Returns:
+        float: Estimated seconds.
+    """
+    return startup_seconds + seconds_per_page * sum(pdf.page_count for pdf in documents)
+
+
+def request_priority(policy: str, documents, book_pages: int = 0):
+    """
+    Return the priority of a request under a scheduling policy.
+
+    The executor runs the request with the highest priority whenever a slot
+    frees up; equal priorities run in the order they were queued.
+
+    Args:
+        policy (str): One of SCHEDULING_POLICIES.
+        documents (list): PdfInfo objects in the request.
+        book_pages (int): Pages still to process in the request's book
+                          (used by largest_book_first).
+
+    Returns:
+        float: Priority (higher runs first).
+    """
+    if policy == POLICY_LARGEST_FIRST:
+        return estimate_request_seconds(documents)
+    if policy == POLICY_LARGEST_BOOK_FIRST:
+        return book_pages
+    if policy == POLICY_SMALLEST_FIRST:
+        return -estimate_request_seconds(documents)
+    if policy == POLICY_BOOK_ORDER:
+        return 0
+    raise ValueError(f"Unknown scheduling policy: {policy} (choose from {', '.join(SCHEDULING_POLICIES)})")
+
+
+def estimate_makespan(durations, slots: int, initial_slots: int = None, increase: float = 0.0):
+    """
+    Estimate the wall-clock time of running tasks on ``slots`` parallel
+    slots, each task starting on the first slot to free up, in the given order.
+
+    With ``initial_slots`` the run starts with fewer slots and, like an
+    adaptive (AIMD) concurrency limit, gains ``increase / limit`` slots with
+    every task started, up to ``slots``.
+
+    Args:
+        durations (list): Estimated seconds of each task, in dispatch order.
+        slots (int): Most tasks that run at the same time.
+        initial_slots (int): Tasks that run at the same time at first.
+        increase (float): Slots gained per round of started tasks.
+
+    Returns:
+        float: Seconds until the last task finishes.
+    """
+    if slots < 1:
+        raise ValueError("At least one slot is needed")
+    limit = float(slots if initial_slots is None else max(1, min(slots, initial_slots)))
+    finish_times = [0.0] * min(int(limit), len(durations))
+    heapq.heapify(finish_times)
+    makespan = 0.0
+    for duration in durations:
+        start = heapq.heappop(finish_times)
+        finish = start + duration
+        makespan = max(makespan, finish)
+        heapq.heappush(finish_times, finish)
+        if increase and limit < slots:
+            previous = int(limit)
+            limit = min(float(slots), limit + increase / limit)
+            # New slots are free from the moment the limit grows
+            for _ in range(int(limit) - previous):
+                heapq.heappush(finish_times, start)
+    return makespan
@@ -0,0 +1,154 @@
+from dataclasses import dataclass, field, replace
+
+from failure_routing import preflight_pdfs
+from online_processing import is_online_candidate
+from pdf_splitter import plan_page_ranges
+from request_packing import pack_pdfs
+from request_scheduling import estimate_makespan, estimate_request_seconds, request_priority
+
+# --- Cost Model ---
+# Enterprise Document OCR list price (USD per 1,000 pages); batch and online
+# requests are billed the same
+OCR_PRICE_PER_1000_PAGES = 1.50
+
+# Rough duration of one synchronous process_document call
+ONLINE_REQUEST_SECONDS = 2.0
+ONLINE_SECONDS_PER_PAGE = 0.4
+
+
+@dataclass
+class BookPlan:
+    """What a run would do with the PDFs of one book, without doing it."""
+    korean_name: str
+    english_name: str
+    files: int = 0
+    # Files a previous run finished, dead-lettered or left in flight
+    done: int = 0
+    dead_letter: int = 0
+    in_flight: int = 0
+    # Files still to process (everything below is a subset of these)
+    pending: int = 0
+    # Pending PdfInfos whose page count is an estimate (header unreadable)
+    estimated: list = field(default_factory=list)
+    online: list = field(default_factory=list)
+    # (PdfInfo, number of parts) of every file that would be split
+    split: list = field(default_factory=list)
+    # (PdfInfo, reason) of every file the pre-flight checks reject
+    rejected: list = field(default_factory=list)
+    # request_packing.PackedRequest of every batch operation
+    requests: list = field(default_factory=list)
+
+    @property
+    def pages(self):
+        """Pages that would be billed (online and batch)."""
+        return (sum(pdf.page_count for pdf in self.online) +
+                sum(request.total_pages for request in self.requests))
+
+    @property
+    def bytes(self):
+        return (sum(pdf.size for pdf in self.online) +
+                sum(request.total_bytes for request in self.requests))
+
+
+def _planned_parts(pdf, limits):
+    """PdfInfos of the parts split_pdf_to_gcs would produce, with sizes prorated by page."""
+    parts = []
+    for first_page, last_page in plan_page_ranges(pdf, limits):
+        page_count = last_page - first_page + 1
+        parts.append(replace(
+            pdf,
+            uri=f"{pdf.uri}#pages={first_page}-{last_page}",
+            size=pdf.size * page_count // max(1, pdf.page_count),
+            page_count=page_count,
+            source_uri=pdf.uri,
+            page_offset=first_page - 1,
+        ))
+    return parts
+
+
+def plan_book(korean_name: str, english_name: str, pdf_files, limits, online_max_pages: int = None,
+              online_max_bytes: int = None, files: int = None):
+    """
+    Plan the requests of one book the way submit_subdirectory_files would
+    queue them: pre-flight, online fast path, splitting and packing.
+
+    Args:
+        pdf_files (list): PdfInfo objects of the files still to process.
+        limits (ProcessorLimits): Limits used for splitting and packing.
+        online_max_pages (int): Online fast-path page limit, or None if the
+                                fast path is disabled.
+        online_max_bytes (int): Online fast-path byte limit.
+        files (int): Number of PDFs in the book, including finished ones.
+
+    Returns:
+        BookPlan: The plan; ``done``, ``dead_letter`` and ``in_flight`` are
+                  left for the caller to fill in.
+    """
+    plan = BookPlan(korean_name, english_name, files=len(pdf_files) if files is None else files,
+                    pending=len(pdf_files))
+    plan.estimated = [pdf for pdf in pdf_files if pdf.page_count_estimated]
+
+    ready, oversize, plan.rejected = preflight_pdfs(pdf_files, limits)
+    if online_max_pages is not None:
+        plan.online = [pdf for pdf in ready if is_online_candidate(pdf, online_max_pages, online_max_bytes)]
+        ready = [pdf for pdf in ready if pdf not in plan.online]
+
+    documents = list(ready)
+    for pdf in oversize:
+        parts = _planned_parts(pdf, limits)
+        plan.split.append((pdf, len(parts)))
+        documents.extend(parts)
+
+    plan.requests = pack_pdfs(documents, limits)
+    return plan
+
+
+def estimate_run(book_plans, slots: int, requests_per_minute: float, policy: str,
+                 online_workers: int = 1, online_requests_per_minute: float = None,
+                 initial_slots: int = None, slot_increase: float = 0.0):
+    """
+    Estimate the wall-clock time and cost of running the planned books.
+
+    Batch requests are dispatched in the order the scheduling policy gives
+    them, each taking the first free slot; the submission rate limit puts a
+    floor under the time as well. With ``initial_slots`` the slots start
+    lower and grow by ``slot_increase`` per round of submissions up to
+    ``slots``, like an adaptive concurrency limit that never hits a quota
+    error. Online requests run alongside on their own workers. Retries and
+    quota errors are not modelled.
+
+    Returns:
+        dict: "batch_seconds", "online_seconds", "wall_seconds", "pages",
+              "cost" (USD), "slot_seconds" (total estimated batch work) and
+              "slots" / "initial_slots" (operations in flight at most / at first).
+    """
+    requests = []
+    for plan in book_plans:
+        book_pages = sum(request.total_pages for request in plan.requests)
+        for request in plan.requests:
+            requests.append((request_priority(policy, request.documents, book_pages), len(requests), request))
+    # Highest priority first, ties in queueing order (like OperationExecutor)
+    requests.sort(key=lambda item: (-item[0], item[1]))
+    durations = [estimate_request_seconds(request.documents) for _, _, request in requests]
+
+    batch_seconds = estimate_makespan(durations, slots, initial_slots, slot_increase) if durations else 0.0
+    if requests_per_minute:
+        batch_seconds = max(batch_seconds, len(durations) / requests_per_minute * 60)
+
+    online_files = [pdf for plan in book_plans for pdf in plan.online]
+    online_seconds = sum(ONLINE_REQUEST_SECONDS + ONLINE_SECONDS_PER_PAGE * pdf.page_count
+                         for pdf in online_files) / max(1, online_workers)
+    if online_requests_per_minute:
+        online_seconds = max(online_seconds, len(online_files) / online_requests_per_minute * 60)
+
+    pages = sum(plan.pages for plan in book_plans)
+    return {
+        "batch_seconds": batch_seconds,
+        "online_seconds": online_seconds,
+        "wall_seconds": max(batch_seconds, online_seconds),
+        "slot_seconds": sum(durations),
+        "pages": pages,
+        "cost": pages / 1000 * OCR_PRICE_PER_1000_PAGES,
+        "slots": slots,
+        "initial_slots": slots if initial_slots is None else min(slots, initial_slots),
+    }
@@ -0,0 +1,440 @@
+import io
+import re
+import json
+import tempfile
+from dataclasses import dataclass, field
+
+# Characters read from a shard per chunk; memory use is bounded by this,
+# not by the size of the shard
+READ_CHUNK_CHARS = 1 << 16
+
+# Separator written between pages in the extracted text (as pdftotext does)
+PAGE_SEPARATOR = "\f"
+
+# Each character of the spooled document text takes 4 bytes (UTF-32), so a
+# text anchor index maps straight to a file offset
+_SPOOL_ENCODING = "utf-32-le"
+_SPOOL_WIDTH = 4
+
+_STRING_SPECIAL = re.compile(r'["\\]')
+_SKIP_SPECIAL = re.compile(r'[\[\]{}"]')
+_NUMBER_OR_LITERAL = re.compile(r'[^,\]}\s]+')
+_ESCAPES = {'"': '"', '\\': '\\', '/': '/', 'b': '\b', 'f': '\f', 'n': '\n', 'r': '\r', 't': '\t'}
+
+
+class ShardFormatError(ValueError):
+    """Raised when a shard is not a Document JSON object."""
+
+
+# --- Incremental JSON Reader ---
+class _JsonReader:
+    """
+    Minimal pull reader over a JSON text stream.
+
+    Only what the extractor needs: walking object keys, reading small values,
+    skipping large values without building them, and streaming one large
+    string into a sink.
+    """
+
+    def __init__(self, stream, chunk_chars: int = READ_CHUNK_CHARS):
+        self.stream = stream
+        self.chunk_chars = chunk_chars
+        self.buffer = ""
+        self.pos = 0
+
+    def _fill(self):
+        chunk = self.stream.read(self.chunk_chars)
+        if not chunk:
+            return False
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self):
+        """Return the next non-whitespace character without consuming it."""
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in " \t\r\n":
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self._fill():
+                raise ShardFormatError("unexpected end of shard")
+
+    def expect(self, char: str):
+        if self.peek() != char:
+            raise ShardFormatError(f"expected {char!r} at {self.buffer[self.pos:self.pos + 20]!r}")
+        self.pos += 1
+
+    def next_member(self, first: bool):
+        """
+        Advance to the next key of the current object.
+
+        Returns:
+            str: The key, or None at the end of the object.
+        """
+        char = self.peek()
+        if char == '}':
+            self.pos += 1
+            return None
+        if not first:
+            self.expect(',')
+        key = self.read_string()
+        self.expect(':')
+        return key
+
+    def next_item(self, first: bool):
+        """Advance to the next item of the current array; False at its end."""
+        char = self.peek()
+        if char == ']':
+            self.pos += 1
+            return False
+        if not first:
+            self.expect(',')
+        return True
+
+    def read_string(self, sink=None):
+        """
+        Read a string value.
+
+        Args:
+            sink: Optional callable receiving the decoded string in pieces;
+                  when given, the string is never held in memory whole.
+
+        Returns:
+            str: The string, or its length in characters when a sink is used.
+        """
+        self.expect('"')
+        pieces = []
+        emit = pieces.append if sink is None else sink
+        length = 0
+        # A \uD8xx escape waits here for the low surrogate that completes it
+        high_surrogate = None
+        while True:
+            match = _STRING_SPECIAL.search(self.buffer, self.pos)
+            end = len(self.buffer) if match is None else match.start()
+            piece = self.buffer[self.pos:end]
+            self.pos = end
+            if piece:
+                if high_surrogate is not None:
+                    piece = high_surrogate + piece
+                    high_surrogate = None
+                length += len(piece)
+                emit(piece)
+            if match is None:
+                if not self._fill():
+                    raise ShardFormatError("unterminated string")
+                continue
+
+            if self.buffer[self.pos] == '"':
+                self.pos += 1
+                if high_surrogate is not None:
+                    length += 1
+                    emit(high_surrogate)
+                return "".join(pieces) if sink is None else length
+
+            # Escape sequence; make sure it is fully buffered
+            while len(self.buffer) - self.pos < 6 and self._fill():
+                pass
+            code = self.buffer[self.pos + 1]
+            if code != 'u':
+                self.pos += 2
+                char = _ESCAPES.get(code, code)
+            else:
+                char = chr(int(self.buffer[self.pos + 2:self.pos + 6], 16))
+                self.pos += 6
+                if 0xDC00 <= ord(char) <= 0xDFFF and high_surrogate is not None:
+                    char = chr(0x10000 + ((ord(high_surrogate) - 0xD800) << 10) + (ord(char) - 0xDC00))
+                    high_surrogate = None
+                elif 0xD800 <= ord(char) <= 0xDBFF:
+                    if high_surrogate is not None:
+                        length += 1
+                        emit(high_surrogate)
+                    high_surrogate = char
+                    continue
+            if high_surrogate is not None:
+                char = high_surrogate + char
+                high_surrogate = None
+            length += len(char)
+            emit(char)
+
+    def read_value(self):
+        """Read a small value (object, array, string, number, literal) in full."""
+        char = self.peek()
+        if char == '{':
+            self.pos += 1
+            value = {}
+            key = self.next_member(True)
+            while key is not None:
+                value[key] = self.read_value()
+                key = self.next_member(False)
+            return value
+        if char == '[':
+            self.pos += 1
+            value = []
+            first = True
+            while self.next_item(first):
+                value.append(self.read_value())
+                first = False
+            return value
+        if char == '"':
+            return self.read_string()
+        return json.loads(self._read_scalar())
+
+    def _read_scalar(self):
+        while True:
+            match = _NUMBER_OR_LITERAL.match(self.buffer, self.pos)
+            if match and match.end() < len(self.buffer):
+                self.pos = match.end()
+                return match.group(0)
+            if not self._fill():
+                if match:
+                    self.pos = match.end()
+                    return match.group(0)
+                raise ShardFormatError("unexpected end of shard")
+
+    def skip_value(self):
+        """Skip a value of any size without building it."""
+        char = self.peek()
+        if char == '"':
+            self._skip_string()
+            return
+        if char not in '[{':
+            self._read_scalar()
+            return
+
+        depth = 0
+        while True:
+            match = _SKIP_SPECIAL.search(self.buffer, self.pos)
+            if match is None:
+                self.pos = len(self.buffer)
+                if not self._fill():
+                    raise ShardFormatError("unexpected end of shard")
+                continue
+            self.pos = match.start()
+            char = match.group(0)
+            if char == '"':
+                self._skip_string()
+                continue
+            self.pos += 1
+            depth += 1 if char in '[{' else -1
+            if depth == 0:
+                return
+
+    def _skip_string(self):
+        self.pos += 1
+        while True:
+            match = _STRING_SPECIAL.search(self.buffer, self.pos)
+            if match is None:
+                self.pos = len(self.buffer)
+                if not self._fill():
+                    raise ShardFormatError("unterminated string")
+                continue
+            if match.group(0) == '"':
+                self.pos = match.end()
+                return
+            # Skip the backslash and the escaped character
+            self.pos = match.start()
+            while len(self.buffer) - self.pos < 2 and self._fill():
+                pass
+            self.pos += 2
+
+
+# --- Shard Model ---
+@dataclass
+class PageSpan:
+    """One page of a shard and the text segments that make it up."""
+    page_number: int
+    segments: list = field(default_factory=list)
+
+
+class ShardText:
+    """
+    The page structure of one Document AI output shard, read in one pass.
+
+    The document text is spooled to a temporary file (fixed-width), and only
+    page numbers, page text anchors and shardInfo are kept in memory, so a
+    shard of any size is read in constant memory. Use as a context manager;
+    page_chunks() slices page text straight from the spool.
+
+    Args:
+        source: Path of a shard, or a binary file-like object (e.g. the
+                reader returned by google.cloud.storage.Blob.open("rb")).
+    """
+
+    def __init__(self, source, chunk_chars: int = READ_CHUNK_CHARS):
+        self.pages = []
+        self.shard_index = 0
+        self.shard_count = 1
+        self.text_offset = 0
+        self.text_length = 0
+        self._spool = tempfile.TemporaryFile()
+        self._chunk_chars = chunk_chars
+        try:
+            if isinstance(source, (str, bytes)):
+                with open(source, "rb") as raw:
+                    self._parse(raw)
+            else:
+                self._parse(source)
+        except Exception:
+            self._spool.close()
+            raise
+
+    def _parse(self, raw):
+        stream = io.TextIOWrapper(raw, encoding="utf-8") if not isinstance(raw, io.TextIOBase) else raw
+        reader = _JsonReader(stream, self._chunk_chars)
+        spool = self._spool
+
+        def _spool_text(piece):
+            spool.write(piece.encode(_SPOOL_ENCODING))
+
+        reader.expect('{')
+        key = reader.next_member(True)
+        while key is not None:
+            if key == "text":
+                self.text_length = reader.read_string(sink=_spool_text)
+            elif key == "pages":
+                self._parse_pages(reader)
+            elif key == "shardInfo":
+                info = reader.read_value()
+                self.shard_index = int(info.get("shardIndex", 0))
+                self.shard_count = int(info.get("shardCount", 1))
+                self.text_offset = int(info.get("textOffset", 0))
+            else:
+                reader.skip_value()
+            key = reader.next_member(False)
+
+        self._localize_segments()
+
+    def _parse_pages(self, reader):
+        reader.expect('[')
+        first = True
+        while reader.next_item(first):
+            first = False
+            page = PageSpan(page_number=len(self.pages) + 1)
+            reader.expect('{')
+            key = reader.next_member(True)
+            while key is not None:
+                if key == "pageNumber":
+                    page.page_number = int(reader.read_value())
+                elif key == "layout":
+                    anchor = self._read_layout_anchor(reader)
+                    page.segments = [
+                        (int(segment.get("startIndex", 0)), int(segment.get("endIndex", 0)))
+                        for segment in anchor.get("textSegments", [])
+                    ]
+                else:
+                    reader.skip_value()
+                key = reader.next_member(False)
+            self.pages.append(page)
+
+    @staticmethod
+    def _read_layout_anchor(reader):
+        anchor = {}
+        reader.expect('{')
+        key = reader.next_member(True)
+        while key is not None:
+            if key == "textAnchor":
+                anchor = reader.read_value()
+            else:
+                reader.skip_value()
+            key = reader.next_member(False)
+        return anchor
+
+    def _localize_segments(self):
+        # Anchors are relative to this shard's text; some writers use offsets
+        # into the whole document instead, recognisable by running past it
+        ends = [end for page in self.pages for _, end in page.segments]
+        if self.text_offset and ends and max(ends) > self.text_length:
+            for page in self.pages:
+                page.segments = [(start - self.text_offset, end - self.text_offset)
+                                 for start, end in page.segments]
+
+    def page_chunks(self, page: PageSpan, chunk_chars: int = READ_CHUNK_CHARS):
+        """Yield the text of one page in pieces of at most chunk_chars characters."""
+        for start, end in page.segments:
+            start = max(0, start)
+            end = min(end, self.text_length)
+            while start < end:
+                count = min(chunk_chars, end - start)
+                self._spool.seek(start * _SPOOL_WIDTH)
+                yield self._spool.read(count * _SPOOL_WIDTH).decode(_SPOOL_ENCODING)
+                start += count
+
+    def close(self):
+        self._spool.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+
+# --- Writing Page Text ---
+class PageTextWriter:
+    """
+    Appends pages to a UTF-8 text file and records where each page starts.
+
+    Pages are separated by PAGE_SEPARATOR. For every page one JSON line is
+    written to the index: page number, byte and character offsets of the
+    page in the text file, and the character offset of the page in the
+    original document text (shard textOffset plus anchor start).
+    """
+
+    def __init__(self, text_file, index_file):
+        self.text_file = text_file
+        self.index_file = index_file
+        self.byte_offset = 0
+        self.char_offset = 0
+        self.pages_written = 0
+
+    def _write(self, text: str):
+        data = text.encode("utf-8")
+        self.text_file.write(data)
+        self.byte_offset += len(data)
+        self.char_offset += len(text)
+
+    def write_shard(self, shard: ShardText, page_offset: int = 0, fields: dict = None):
+        """
+        Write every page of a shard; page_offset shifts its page numbers and
+        ``fields`` (e.g. the source file number) are added to each index entry.
+        """
+        for page in shard.pages:
+            if self.pages_written:
+                self._write(PAGE_SEPARATOR)
+            entry = dict(fields or {})
+            entry.update({
+                "page": page.page_number + page_offset,
+                "byte_start": self.byte_offset,
+                "char_start": self.char_offset,
+                "document_char_start": shard.text_offset + (page.segments[0][0] if page.segments else 0),
+            })
+            for chunk in shard.page_chunks(page):
+                self._write(chunk)
+            entry["byte_end"] = self.byte_offset
+            entry["char_end"] = self.char_offset
+            self.index_file.write((json.dumps(entry) + "\n").encode("utf-8"))
+            self.pages_written += 1
+
+
+def extract_page_text(shard_sources, text_path: str, index_path: str, page_offset: int = 0):
+    """
+    Extract per-page text from the shards of one document.
+
+    Args:
+        shard_sources (list): Shard paths or binary file-like objects, in
+                              shard order.
+        text_path (str): Output UTF-8 text file (pages separated by form feeds).
+        index_path (str): Output JSON-lines page index.
+        page_offset (int): Added to every page number (for split parts).
+
+    Returns:
+        int: Number of pages written.
+    """
+    with open(text_path, "wb") as text_file, open(index_path, "wb") as index_file:
+        writer = PageTextWriter(text_file, index_file)
+        for source in shard_sources:
+            with ShardText(source) as shard:
+                writer.write_shard(shard, page_offset)
+        return writer.pages_written
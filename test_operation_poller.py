@@ -0,0 +1,41 @@
+from operation_poller import OperationPoller
+
+
+def test_transient_poll_error():
+    """A watch survives one failed poll and still resolves once the operation is done."""
+    calls = []
+
+    def fetch_status(name):
+        calls.append(name)
+        if len(calls) == 1:
+            raise ConnectionError("connection reset by peer")
+        return {"done": len(calls) >= 3}
+
+    with OperationPoller(fetch_status, min_interval=0.01, max_interval=0.02) as poller:
+        status = poller.watch("projects/p/locations/us/operations/1").result(timeout=5)
+
+    assert status["done"]
+    assert poller.poll_errors == 1
+    assert len(calls) == 3
+
+
+def test_poll_errors_in_a_row():
+    """A watch fails once max_consecutive_errors polls in a row have failed."""
+    def fetch_status(name):
+        raise ConnectionError("connection refused")
+
+    with OperationPoller(fetch_status, min_interval=0.01, max_interval=0.02, max_consecutive_errors=3) as poller:
+        try:
+            poller.watch("projects/p/locations/us/operations/2").result(timeout=5)
+        except ConnectionError:
+            pass
+        else:
+            raise AssertionError("the watch should have failed")
+
+    assert poller.poll_errors == 3
+
+
+if __name__ == "__main__":
+    test_transient_poll_error()
+    test_poll_errors_in_a_row()
+    print("✅ Operation poller tests passed")